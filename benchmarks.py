@@ -0,0 +1,92 @@
+# benchmarks.py
+import logging
+import time
+import numpy as np
+import pandas as pd
+import preprocessing_custom
+from model import train_and_save_model, predict_new_client
+from preprocessing_generic import convert_to_datetime, extract_date_features
+
+logger = logging.getLogger(__name__)
+
+def _best_time(function, repeats):
+    """Executa uma função várias vezes e devolve o melhor tempo, em segundos."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_date_features(df, bdate_column='bdate', last_seen_column='last_seen', repeats=3):
+    """Compara extract_date_features com a cadeia actual de transformações de datas.
+    
+    A cadeia actual é normalize_bdate seguida de calculate_age em 'bdate' e
+    convert_to_datetime em 'last_seen'.
+    
+    Args:
+        df: DataFrame com as colunas de datas originais.
+        bdate_column: Coluna das datas de nascimento (padrão: 'bdate').
+        last_seen_column: Coluna da última visita (padrão: 'last_seen').
+        repeats: Número de repetições; é usado o melhor tempo (padrão: 3).
+    
+    Returns:
+        dict: Tempos em segundos ('current', 'date_features') e 'speedup'.
+    """
+    def current_chain():
+        result = preprocessing_custom.normalize_bdate(df.copy(), bdate_column)
+        result = preprocessing_custom.calculate_age(result, bdate_column)
+        return convert_to_datetime(result, last_seen_column)
+    
+    def date_features():
+        result = extract_date_features(df.copy(), bdate_column)
+        return extract_date_features(result, last_seen_column)
+    
+    current = _best_time(current_chain, repeats)
+    engine = _best_time(date_features, repeats)
+    logger.debug(f"Atributos de data: cadeia actual {current:.3f}s, extract_date_features {engine:.3f}s")
+    return {'current': current, 'date_features': engine, 'speedup': current / engine if engine else float('inf')}
+
+def benchmark_knn_engines(df, selected_columns, test_file='test.csv', batch_sizes=(1000, 10000, 50000), repeats=3):
+    """Compara o motor em blocos (BlockedBruteForceKNN) com o KNeighborsClassifier padrão.
+    
+    Os dois modelos são treinados com as mesmas colunas; os lotes de consulta saem do CSV de
+    teste, com as colunas de treino e sem linhas nulas (como exige load_test_csv), repetidos
+    até ao tamanho de cada lote.
+    
+    Args:
+        df: DataFrame de treino já processado.
+        selected_columns: Colunas seleccionadas, incluindo 'result'.
+        test_file: CSV de teste de onde saem as consultas (padrão: 'test.csv').
+        batch_sizes: Tamanhos dos lotes de consulta (padrão: 1000, 10000 e 50000).
+        repeats: Número de repetições; é usado o melhor tempo (padrão: 3).
+    
+    Returns:
+        list: Um dict por lote com 'batch_size', 'sklearn', 'blocked' (segundos), 'speedup'
+            e 'agreement' (fracção de previsões iguais).
+    """
+    models = {engine: train_and_save_model(df, selected_columns, {}, engine=engine) for engine in ('sklearn', 'blocked')}
+    training_columns = models['sklearn'][5]
+    test_df = pd.read_csv(test_file, usecols=training_columns).dropna()
+    queries = test_df[training_columns].to_numpy(dtype=float)
+    
+    results = []
+    for batch_size in batch_sizes:
+        batch = np.resize(queries, (batch_size, queries.shape[1]))  # Repete as linhas de teste até ao tamanho do lote
+        predictions, seconds = {}, {}
+        for engine, (knn, scaler, *_) in models.items():
+            seconds[engine] = _best_time(lambda: predict_new_client(batch, knn, scaler, training_columns), repeats)
+            predictions[engine] = predict_new_client(batch, knn, scaler, training_columns)[0]
+        results.append({'batch_size': batch_size, 'sklearn': seconds['sklearn'], 'blocked': seconds['blocked'],
+                        'speedup': seconds['sklearn'] / seconds['blocked'] if seconds['blocked'] else float('inf'),
+                        'agreement': float((predictions['sklearn'] == predictions['blocked']).mean())})
+        logger.debug(f"Motores KNN, lote de {batch_size}: sklearn {seconds['sklearn']:.3f}s, "
+                     f"em blocos {seconds['blocked']:.3f}s")
+    return results
+
+if __name__ == '__main__':
+    import sys
+    data = pd.read_csv(sys.argv[1] if len(sys.argv) > 1 else 'train.csv')
+    report = benchmark_date_features(data)
+    print(f"Cadeia actual: {report['current']:.3f}s | extract_date_features: {report['date_features']:.3f}s | "
+          f"{report['speedup']:.1f}x mais rápido")
\ No newline at end of file
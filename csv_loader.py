@@ -0,0 +1,135 @@
+# csv_loader.py
+import logging
+import os
+import pandas as pd
+from sketches import ColumnSketch
+
+logger = logging.getLogger(__name__)
+
+FIRST_CHUNK_ROWS = 1000  # Linhas do primeiro bloco, mostrado de imediato
+CHUNK_ROWS = 50000  # Linhas dos blocos seguintes
+
+class ProgressiveCsvReader:
+    """Lê um CSV por blocos, com um primeiro bloco pequeno e resumos por coluna actualizados a cada bloco.
+
+    Iterar sobre o leitor devolve os blocos à medida que são lidos; result() junta-os num
+    DataFrame igual ao de pd.read_csv. Como o tipo de cada coluna é inferido bloco a bloco,
+    as colunas cujo tipo difere entre blocos (ex.: só booleanos no início e texto depois) são
+    relidas de uma vez no fim. close() liberta o ficheiro e os blocos, permitindo cancelar a
+    leitura a meio.
+    """
+
+    def __init__(self, file_name, first_chunk_rows=FIRST_CHUNK_ROWS, chunksize=CHUNK_ROWS, track_stats=True):
+        """Prepara a leitura (o ficheiro só é aberto ao iterar).
+
+        Args:
+            file_name: Caminho do ficheiro CSV.
+            first_chunk_rows: Linhas do primeiro bloco (padrão: 1000).
+            chunksize: Linhas de cada bloco seguinte (padrão: 50000).
+            track_stats: Mantém um ColumnSketch por coluna (padrão: True).
+        """
+        self.file_name = file_name
+        self.first_chunk_rows = first_chunk_rows
+        self.chunksize = chunksize
+        self.track_stats = track_stats
+        self.total_bytes = os.path.getsize(file_name)
+        self.bytes_read = 0
+        self.rows = 0
+        self.sketches = {}
+        self._chunks = []
+        self._dtypes = {}  # Coluna -> tipos inferidos nos vários blocos
+        self._handle = None
+        self._reader = None
+
+    def __iter__(self):
+        """Lê o ficheiro bloco a bloco.
+
+        Yields:
+            DataFrame: Próximo bloco do ficheiro.
+        """
+        self._handle = open(self.file_name, 'rb')
+        self._reader = pd.read_csv(self._handle, iterator=True)
+        size = self.first_chunk_rows
+        while self._reader is not None:
+            try:
+                chunk = self._reader.get_chunk(size)
+            except StopIteration:
+                break
+            size = self.chunksize
+            self._add(chunk)
+            yield chunk
+        self._release_file()
+
+    def _add(self, chunk):
+        """Guarda um bloco e actualiza a posição no ficheiro, os tipos e os resumos."""
+        self._chunks.append(chunk)
+        self.rows += len(chunk)
+        if self._handle is not None and not self._handle.closed:
+            self.bytes_read = min(self._handle.tell(), self.total_bytes)  # O analisador lê à frente, em buffer
+        for column in chunk.columns:
+            self._dtypes.setdefault(column, set()).add(chunk[column].dtype)
+            if self.track_stats:
+                self.sketches.setdefault(column, ColumnSketch()).update(chunk[column])
+
+    def progress(self):
+        """Fracção do ficheiro já lida (0 a 1)."""
+        return self.bytes_read / self.total_bytes if self.total_bytes else 1.0
+
+    def _mixed_columns(self):
+        """Colunas cujo tipo inferido muda entre blocos de forma que a junção não reproduz pd.read_csv."""
+        mixed = []
+        for column, dtypes in self._dtypes.items():
+            # Inteiros e decimais juntam-se como em pd.read_csv; outras misturas (ex.: bool e texto) não
+            numeric = all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+                          for dtype in dtypes)
+            if len(dtypes) > 1 and not numeric:
+                mixed.append(column)
+        return mixed
+
+    def result(self):
+        """Junta os blocos lidos num único DataFrame.
+
+        Returns:
+            DataFrame: Os dados do ficheiro, com índice 0..n-1.
+        """
+        if not self._chunks:
+            return pd.read_csv(self.file_name, nrows=0)  # Ficheiro só com cabeçalho
+        df = pd.concat(self._chunks, ignore_index=True)
+        self._chunks = []  # Os blocos deixam de ser necessários depois da junção
+        mixed = self._mixed_columns()
+        if mixed:
+            logger.debug(f"Colunas com tipos diferentes entre blocos, relidas de uma vez: {mixed}")
+            reread = pd.read_csv(self.file_name, usecols=mixed)
+            for column in mixed:
+                df[column] = reread[column]
+                self.sketches.pop(column, None)  # O resumo foi calculado com os tipos dos blocos
+        return df
+
+    def summary(self):
+        """Resume as colunas lidas até ao momento.
+
+        Returns:
+            dict: Coluna -> 'rows', 'nulls', 'mean', 'median' (só numéricas) e 'mode'.
+        """
+        summary = {}
+        for column, sketch in self.sketches.items():
+            summary[column] = {'rows': sketch.rows, 'nulls': sketch.rows - sketch.count,
+                               'mean': sketch.mean() if sketch.numeric else None,
+                               'median': sketch.median() if sketch.numeric else None, 'mode': sketch.mode()}
+        return summary
+
+    def _release_file(self):
+        """Fecha o leitor do pandas e o ficheiro."""
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def close(self):
+        """Interrompe a leitura e liberta o ficheiro, os blocos e os resumos."""
+        self._release_file()
+        self._chunks = []
+        self.sketches = {}
+        self._dtypes = {}
\ No newline at end of file
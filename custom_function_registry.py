@@ -0,0 +1,206 @@
+# custom_function_registry.py
+import ast
+import hashlib
+import linecache
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class CustomFunctionRegistry:
+    """Registo das funções personalizadas de um módulo, com recarga incremental.
+
+    Cada função é guardada separadamente com o seu código e um hash desse código.
+    Ao recarregar, apenas as funções cujo hash mudou são compiladas de novo e
+    substituídas no módulo já importado, sem reimportar o ficheiro inteiro.
+    """
+
+    def __init__(self, module):
+        """Inicializa o registo a partir de um módulo já importado.
+
+        Args:
+            module: Módulo com as funções personalizadas (ex.: preprocessing_custom).
+        """
+        self.module = module
+        self.path = module.__file__
+        self.entries = OrderedDict()  # nome -> {'source', 'hash', 'function'}
+        self._header_hash = None
+        self.reload()
+
+    @staticmethod
+    def source_hash(source):
+        """Calcula o hash SHA-256 do código fonte de uma função."""
+        normalized = source.replace("\r\n", "\n").strip()  # Ignora diferenças de terminação de linha
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def _read(self):
+        """Lê o conteúdo actual do ficheiro do módulo."""
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            return f.read()  # Preserva as terminações de linha originais
+
+    def _write(self, content):
+        """Escreve o ficheiro do módulo de forma atómica."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        if os.path.exists(self.path):
+            shutil.copymode(self.path, temp_path)  # mkstemp cria o ficheiro com 0600
+        os.replace(temp_path, self.path)
+
+    @staticmethod
+    def _match_newlines(text, content):
+        """Converte as terminações de linha do texto para as usadas no ficheiro."""
+        text = text.replace("\r\n", "\n")
+        return text.replace("\n", "\r\n") if "\r\n" in content else text
+
+    @staticmethod
+    def _function_spans(content):
+        """Devolve as funções de topo do ficheiro com as linhas (início, fim) de cada uma."""
+        tree = ast.parse(content)
+        spans = OrderedDict()
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                spans[node.name] = (start, node.end_lineno)
+        return spans
+
+    def reload(self):
+        """Sincroniza o registo com o ficheiro, recompilando só as funções alteradas.
+
+        Returns:
+            dict: Nomes das funções 'added', 'changed' e 'removed'.
+        """
+        content = self._read()
+        lines = content.splitlines(keepends=True)
+        spans = self._function_spans(content)
+        linecache.checkcache(self.path)  # Garante que inspect.getsource lê a versão actual
+
+        # Reexecuta o cabeçalho (imports e constantes) apenas se tiver mudado
+        covered = set()
+        for start, end in spans.values():
+            covered.update(range(start, end + 1))
+        header = "".join(line if i + 1 not in covered else "\n" for i, line in enumerate(lines))
+        header_hash = self.source_hash(header)
+        if header_hash != self._header_hash:
+            exec(compile(header, self.path, 'exec'), self.module.__dict__)
+            self._header_hash = header_hash
+
+        changes = {'added': [], 'changed': [], 'removed': []}
+        for name, (start, end) in spans.items():
+            source = "".join(lines[start - 1:end])
+            digest = self.source_hash(source)
+            entry = self.entries.get(name)
+            if entry is not None and entry['hash'] == digest:
+                continue  # Função inalterada: mantém o objecto já compilado
+            function = self._compile(name, source, start)
+            changes['changed' if entry is not None else 'added'].append(name)
+            self.entries[name] = {'source': source, 'hash': digest, 'function': function}
+
+        for name in [name for name in self.entries if name not in spans]:
+            del self.entries[name]
+            if hasattr(self.module, name):
+                delattr(self.module, name)
+            changes['removed'].append(name)
+
+        # Mantém a ordem do ficheiro
+        self.entries = OrderedDict((name, self.entries[name]) for name in spans)
+        logger.debug(f"Registo de funções personalizadas recarregado: {changes}")
+        return changes
+
+    def _compile(self, name, source, start_line):
+        """Compila uma única função no espaço de nomes do módulo."""
+        padded = "\n" * (start_line - 1) + source  # Mantém os números de linha do ficheiro original
+        exec(compile(padded, self.path, 'exec'), self.module.__dict__)
+        function = self.module.__dict__[name]
+        function.__source__ = source
+        return function
+
+    def names(self):
+        """Devolve os nomes das funções registadas, pela ordem do ficheiro."""
+        return list(self.entries)
+
+    def has(self, name):
+        """Indica se existe uma função registada com o nome dado."""
+        return name in self.entries
+
+    def get_function(self, name):
+        """Devolve a função compilada com o nome dado, ou None."""
+        entry = self.entries.get(name)
+        return entry['function'] if entry else None
+
+    def get_source(self, name):
+        """Devolve o código fonte da função com o nome dado, ou None."""
+        entry = self.entries.get(name)
+        return entry['source'].replace("\r\n", "\n").strip() if entry else None
+
+    def get_hash(self, name):
+        """Devolve o hash do código fonte da função com o nome dado, ou None."""
+        entry = self.entries.get(name)
+        return entry['hash'] if entry else None
+
+    def add(self, name, source):
+        """Acrescenta uma função nova ao ficheiro e compila apenas essa função.
+
+        Raises:
+            ValueError: Se a função já existir.
+            SyntaxError: Se o código for inválido.
+        """
+        if self.has(name):
+            raise ValueError(f"A função '{name}' já existe.")
+        compile(source, self.path, 'exec')  # Valida a sintaxe antes de alterar o ficheiro
+        content = self._read()
+        self._write(content.rstrip("\r\n") + self._match_newlines("\n" + source.strip() + "\n", content))
+        return self.reload()
+
+    def update(self, name, new_name, source):
+        """Substitui o código de uma função, recompilando-a apenas se o hash mudar.
+
+        Returns:
+            dict: Alterações aplicadas; vazio se o código for igual ao actual.
+
+        Raises:
+            ValueError: Se a função não existir ou o novo nome já estiver em uso.
+            SyntaxError: Se o código for inválido.
+        """
+        if not self.has(name):
+            raise ValueError(f"Função '{name}' não encontrada.")
+        if new_name != name and self.has(new_name):
+            raise ValueError(f"A função '{new_name}' já existe.")
+        if new_name == name and self.source_hash(source) == self.get_hash(name):
+            return {'added': [], 'changed': [], 'removed': []}  # Nada a recompilar
+        compile(source, self.path, 'exec')
+        self._replace_span(name, source.strip() + "\n")
+        return self.reload()
+
+    def remove(self, name):
+        """Remove uma função do ficheiro e do módulo.
+
+        Raises:
+            ValueError: Se a função não existir.
+        """
+        if not self.has(name):
+            raise ValueError(f"Função '{name}' não encontrada.")
+        self._replace_span(name, "")
+        return self.reload()
+
+    def _replace_span(self, name, replacement):
+        """Substitui no ficheiro as linhas de uma função pelo texto dado."""
+        content = self._read()
+        start, end = self._function_spans(content)[name]
+        lines = content.splitlines(keepends=True)
+        lines[start - 1:end] = [self._match_newlines(replacement, content)] if replacement else []
+        self._write("".join(lines))
+
+_registry = None
+
+def get_registry():
+    """Devolve o registo partilhado das funções de preprocessing_custom, criando-o se necessário."""
+    global _registry
+    if _registry is None:
+        import preprocessing_custom
+        _registry = CustomFunctionRegistry(preprocessing_custom)
+    return _registry
\ No newline at end of file
@@ -0,0 +1,295 @@
+# distributed_scoring.py
+import argparse
+import json
+import logging
+import multiprocessing
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import joblib
+import pandas as pd
+from model import load_model_bundle, predict_new_client
+from shared_model import SharedModel, score_csv_shared
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('>I')  # Cada mensagem é precedida pelo seu tamanho (4 bytes, big-endian)
+
+def send_message(sock, message):
+    """Envia uma mensagem JSON precedida pelo seu tamanho."""
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+def _recv_exact(sock, size):
+    """Lê exactamente `size` bytes do socket."""
+    data = bytearray()
+    while len(data) < size:
+        packet = sock.recv(size - len(data))
+        if not packet:
+            raise ConnectionError("Ligação fechada pelo outro extremo.")
+        data.extend(packet)
+    return bytes(data)
+
+def recv_message(sock):
+    """Recebe uma mensagem JSON precedida pelo seu tamanho."""
+    (size,) = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return json.loads(_recv_exact(sock, size).decode('utf-8'))
+
+class _ScoringHandler(socketserver.BaseRequestHandler):
+    """Atende pedidos de um coordenador numa ligação persistente."""
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                message = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return  # O coordenador fechou a ligação
+            if message.get('type') == 'shutdown':
+                send_message(self.request, {'type': 'ok'})
+                threading.Thread(target=server.shutdown, daemon=True).start()
+                return
+            send_message(self.request, server.score(message))
+
+class ScoringWorker(socketserver.ThreadingTCPServer):
+    """Processo de scoring que carrega o modelo uma única vez e atende partições por socket."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, model_file, host='127.0.0.1', port=0):
+        """Carrega o modelo guardado e abre o socket de escuta.
+
+        Args:
+            model_file: Caminho do ficheiro knn_model.pkl.
+            host: Endereço de escuta (padrão: '127.0.0.1').
+            port: Porta de escuta; 0 escolhe uma porta livre.
+        """
+        bundle = load_model_bundle(model_file)
+        self.knn, self.scaler, self.training_columns = bundle['knn'], bundle['scaler'], bundle['training_columns']
+        super().__init__((host, port), _ScoringHandler)
+        logger.debug(f"Worker de scoring à escuta em {self.server_address}")
+
+    def score(self, message):
+        """Calcula previsões para uma partição recebida.
+
+        Args:
+            message: Dict com 'partition', 'columns' e 'rows'.
+
+        Returns:
+            dict: Resposta com 'predictions' e 'probabilities', ou 'error'.
+        """
+        partition = message.get('partition')
+        try:
+            frame = pd.DataFrame(message['rows'], columns=message['columns'])
+            missing = [col for col in self.training_columns if col not in frame.columns]
+            if missing:
+                return {'partition': partition, 'error': f"Colunas em falta: {', '.join(missing)}", 'retry': False}
+            predictions, probabilities = predict_new_client(frame[self.training_columns].values, self.knn,
+                                                            self.scaler, self.training_columns)
+            return {'partition': partition, 'predictions': predictions.tolist(),
+                    'probabilities': [float(prob[1]) for prob in probabilities]}
+        except Exception as e:
+            logger.error(f"Erro ao calcular a partição {partition}: {str(e)}")
+            return {'partition': partition, 'error': str(e), 'retry': True}
+
+def run_worker(model_file, host='127.0.0.1', port=0, port_queue=None):
+    """Inicia um worker de scoring e atende pedidos até receber 'shutdown'.
+
+    Args:
+        model_file: Caminho do ficheiro knn_model.pkl.
+        host: Endereço de escuta (padrão: '127.0.0.1').
+        port: Porta de escuta; 0 escolhe uma porta livre.
+        port_queue: Fila opcional onde é publicada a porta efectiva (usada pelos workers locais).
+    """
+    with ScoringWorker(model_file, host, port) as server:
+        if port_queue is not None:
+            port_queue.put(server.server_address[1])
+        server.serve_forever()
+
+def start_local_workers(model_file, count):
+    """Lança workers de scoring em processos separados nesta máquina.
+
+    Args:
+        model_file: Caminho do ficheiro knn_model.pkl.
+        count: Número de workers.
+
+    Returns:
+        tuple: (processos, endereços) com os processos lançados e os pares (host, porta).
+    """
+    port_queue = multiprocessing.Queue()
+    processes = []
+    for _ in range(count):
+        process = multiprocessing.Process(target=run_worker, args=(model_file, '127.0.0.1', 0, port_queue), daemon=True)
+        process.start()
+        processes.append(process)
+    addresses = [('127.0.0.1', port_queue.get(timeout=60)) for _ in processes]
+    return processes, addresses
+
+def stop_workers(addresses, timeout=5):
+    """Pede aos workers que terminem, ignorando os que já não respondem."""
+    for address in addresses:
+        try:
+            with socket.create_connection(address, timeout=timeout) as sock:
+                send_message(sock, {'type': 'shutdown'})
+                recv_message(sock)
+        except OSError:
+            pass
+
+class PartitionError(RuntimeError):
+    """Erro de uma partição que não deve ser repetida noutro worker."""
+
+def _worker_loop(address, tasks, total, results, failures, max_retries, timeout, stop_event):
+    """Envia partições a um worker até a fila ficar vazia ou o worker falhar repetidamente."""
+    sock = None
+    consecutive_errors = 0
+    while not stop_event.is_set():
+        try:
+            partition, columns, rows, attempts = tasks.get(timeout=0.1)
+        except queue.Empty:
+            if len(results) + len(failures) >= total:
+                break
+            continue
+        try:
+            if sock is None:
+                sock = socket.create_connection(address, timeout=timeout)
+            send_message(sock, {'type': 'score', 'partition': partition, 'columns': columns, 'rows': rows})
+            response = recv_message(sock)
+            if 'error' in response:
+                if not response.get('retry', True):
+                    raise PartitionError(response['error'])
+                raise RuntimeError(response['error'])
+            results[partition] = response
+            consecutive_errors = 0
+        except PartitionError as e:
+            failures[partition] = str(e)
+            stop_event.set()  # Um erro de dados afecta todas as partições
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.warning(f"Partição {partition} falhou no worker {address} (tentativa {attempts + 1}): {str(e)}")
+            if sock is not None:
+                sock.close()
+                sock = None
+            if attempts + 1 > max_retries:
+                failures[partition] = str(e)
+            else:
+                tasks.put((partition, columns, rows, attempts + 1))  # Outro worker pode retomar a partição
+            consecutive_errors += 1
+            if consecutive_errors > max_retries:
+                logger.error(f"Worker {address} desactivado após {consecutive_errors} falhas consecutivas")
+                break
+    if sock is not None:
+        sock.close()
+
+def score_csv_distributed(file_name, workers, training_columns, partition_rows=10000, max_retries=3, timeout=60,
+                          output_file=None):
+    """Divide um CSV em partições, distribui-as pelos workers e junta as previsões pela ordem original.
+
+    Args:
+        file_name: Caminho do CSV a prever.
+        workers: Lista de endereços (host, porta) dos workers.
+        training_columns: Colunas usadas no treino (enviadas a cada worker).
+        partition_rows: Linhas por partição (padrão: 10000).
+        max_retries: Número máximo de repetições por partição (padrão: 3).
+        timeout: Tempo máximo de espera por resposta, em segundos (padrão: 60).
+        output_file: Ficheiro de saída; por defeito, '<nome>_predictions.csv'.
+
+    Returns:
+        str: Caminho do ficheiro de previsões escrito.
+
+    Raises:
+        ValueError: Se faltarem colunas de treino no CSV.
+        RuntimeError: Se alguma partição falhar depois de todas as tentativas.
+    """
+    header = pd.read_csv(file_name, nrows=0).columns
+    missing = [col for col in training_columns if col not in header]
+    if missing:
+        raise ValueError(f"Colunas em falta no CSV de teste: {', '.join(missing)}")
+
+    partitions = []
+    tasks = queue.Queue()
+    with pd.read_csv(file_name, chunksize=partition_rows) as reader:
+        for i, chunk in enumerate(reader):
+            partitions.append(chunk)
+            rows = chunk[training_columns].astype(float).values.tolist()
+            tasks.put((i, training_columns, rows, 0))
+
+    results, failures = {}, {}
+    stop_event = threading.Event()
+    threads = [threading.Thread(target=_worker_loop,
+                                args=(address, tasks, len(partitions), results, failures, max_retries, timeout, stop_event))
+               for address in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if failures or len(results) < len(partitions):
+        details = "; ".join(f"partição {p}: {msg}" for p, msg in sorted(failures.items())) or "workers indisponíveis"
+        raise RuntimeError(f"Scoring distribuído incompleto ({len(results)} de {len(partitions)} partições): {details}")
+
+    # Junta as partições pela ordem original das linhas
+    output_file = output_file or file_name.replace('.csv', '_predictions.csv')
+    for i, chunk in enumerate(partitions):
+        chunk = chunk.copy()
+        chunk['prediction'] = results[i]['predictions']
+        chunk['probability'] = results[i]['probabilities']
+        chunk.to_csv(output_file, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    logger.debug(f"Scoring distribuído concluído: {len(partitions)} partições em {len(workers)} workers")
+    return output_file
+
+def main():
+    """Ponto de entrada da linha de comandos para workers e coordenador."""
+    parser = argparse.ArgumentParser(description="Scoring distribuído do modelo KNN por sockets.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    worker_parser = subparsers.add_parser('worker', help="Inicia um worker de scoring.")
+    worker_parser.add_argument('--model', default='knn_model.pkl', help="Ficheiro knn_model.pkl.")
+    worker_parser.add_argument('--host', default='127.0.0.1')
+    worker_parser.add_argument('--port', type=int, default=5001)
+
+    coordinator_parser = subparsers.add_parser('coordinator', help="Distribui um CSV pelos workers.")
+    coordinator_parser.add_argument('csv', help="CSV a prever.")
+    coordinator_parser.add_argument('--model', default='knn_model.pkl', help="Ficheiro knn_model.pkl (para as colunas de treino).")
+    coordinator_parser.add_argument('--workers', help="Lista host:porta separada por vírgulas.")
+    coordinator_parser.add_argument('--local-workers', type=int, default=0, help="Lança N workers locais.")
+    coordinator_parser.add_argument('--shared-workers', type=int, default=0,
+                                    help="Prevê num pool de N processos locais com o modelo em memória partilhada.")
+    coordinator_parser.add_argument('--partition-rows', type=int, default=10000)
+    coordinator_parser.add_argument('--retries', type=int, default=3)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'worker':
+        run_worker(args.model, args.host, args.port)
+        return
+
+    if args.shared_workers:
+        bundle = load_model_bundle(args.model)
+        with SharedModel(bundle['knn'], bundle['scaler'], bundle['training_columns']) as shared:
+            del bundle  # O processo principal só precisa do modelo publicado
+            output_file = score_csv_shared(args.csv, shared, args.shared_workers, args.partition_rows)
+        print(f"Previsões concluídas! Resultados guardados em {output_file}")
+        return
+
+    training_columns = joblib.load(args.model.replace('knn_model.pkl', 'training_columns.pkl'))
+    addresses = []
+    if args.workers:
+        for item in args.workers.split(','):
+            host, port = item.rsplit(':', 1)
+            addresses.append((host, int(port)))
+    local_addresses = []
+    if args.local_workers:
+        _, local_addresses = start_local_workers(args.model, args.local_workers)
+        addresses.extend(local_addresses)
+    if not addresses:
+        parser.error("Indique --workers, --local-workers ou --shared-workers.")
+    try:
+        output_file = score_csv_distributed(args.csv, addresses, training_columns, args.partition_rows, args.retries)
+        print(f"Previsões concluídas! Resultados guardados em {output_file}")
+    finally:
+        stop_workers(local_addresses)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,208 @@
+# evaluation.py
+import json
+import logging
+import numpy as np
+from sklearn.metrics import confusion_matrix, precision_recall_fscore_support, roc_auc_score
+
+logger = logging.getLogger(__name__)
+
+def _votes_by_k(knn, indices, train_codes, max_k, exclude=None):
+    """Acumula os votos dos vizinhos e devolve as contagens por classe para cada k de 1 a max_k.
+
+    Num DeduplicatedKNNClassifier, os vizinhos são pontos distintos que votam com as contagens
+    das linhas que representam; `exclude` desconta a própria linha no leave-one-out.
+
+    Yields:
+        tuple: (k, contagens) com as contagens de votos (linhas x classes) dos k primeiros vizinhos.
+    """
+    if hasattr(knn, 'class_counts_'):
+        for k in range(1, max_k + 1):
+            yield k, knn.neighbor_votes(indices, n_neighbors=k, exclude=exclude)
+        return
+    neighbor_codes = train_codes[indices]
+    counts = np.zeros((neighbor_codes.shape[0], len(knn.classes_)))
+    rows = np.arange(neighbor_codes.shape[0])
+    for k in range(1, max_k + 1):
+        counts[rows, neighbor_codes[:, k - 1]] += 1
+        yield k, counts
+
+def _accuracy_by_k(votes_by_k, true_codes):
+    """Acurácia do voto maioritário para cada k, com empates entre classes resolvidos como no KNeighborsClassifier.
+
+    Returns:
+        dict: Acurácia por k.
+    """
+    return {k: float((counts.argmax(axis=1) == true_codes).mean()) for k, counts in votes_by_k}
+
+def _calibration_bins(probabilities, outcomes, n_bins):
+    """Agrupa as probabilidades previstas em intervalos e compara-as com a frequência observada."""
+    edges = np.linspace(0, 1, n_bins + 1)
+    bins = np.clip(np.digitize(probabilities, edges[1:-1]), 0, n_bins - 1)
+    calibration = []
+    for b in range(n_bins):
+        mask = bins == b
+        if mask.any():
+            calibration.append({'bin': [float(edges[b]), float(edges[b + 1])], 'count': int(mask.sum()),
+                                'mean_predicted': float(probabilities[mask].mean()),
+                                'observed': float(outcomes[mask].mean())})
+    return calibration
+
+def _leave_one_out_neighbors(knn, X_train, train_codes, max_k, sample_rows, random_state):
+    """Vizinhos de cada ponto de treino excluindo o próprio ponto (grafo de auto-vizinhança).
+
+    Com mais de `sample_rows` linhas, é usada uma amostra de pontos de consulta.
+
+    Returns:
+        tuple: (linhas consultadas, índices dos vizinhos, linha a descontar ou None).
+    """
+    n_train = X_train.shape[0]
+    if hasattr(knn, 'class_counts_'):
+        # Pontos distintos: o próprio ponto continua vizinho, mas sem a linha consultada
+        queries = np.arange(n_train) if n_train <= sample_rows else \
+            np.sort(np.random.default_rng(random_state).choice(n_train, sample_rows, replace=False))
+        _, indices = knn.kneighbors(X_train[queries], n_neighbors=max_k + 1)
+        return queries, indices, (knn.row_points_[queries], train_codes[queries])
+    if n_train <= sample_rows:
+        _, indices = knn.kneighbors(n_neighbors=max_k)  # Sem X, cada ponto não é vizinho de si próprio
+        return np.arange(n_train), indices, None
+    queries = np.sort(np.random.default_rng(random_state).choice(n_train, sample_rows, replace=False))
+    _, indices = knn.kneighbors(X_train[queries], n_neighbors=max_k + 1)
+    # Retira o próprio ponto; se um duplicado o empurrou para fora, descarta o vizinho mais distante
+    is_self = indices == queries[:, None]
+    drop = np.where(is_self.any(axis=1), is_self.argmax(axis=1), max_k)
+    keep = np.ones(indices.shape, dtype=bool)
+    keep[np.arange(len(queries)), drop] = False
+    return queries, indices[keep].reshape(len(queries), max_k), None
+
+def build_evaluation_report(knn, X_train, y_train, X_test, y_test, max_k=20, n_bins=10, leave_one_out=True,
+                            loo_sample_rows=5000, random_state=42):
+    """Calcula a avaliação completa de um KNN treinado.
+
+    A acurácia, a matriz de confusão, a precisão/revocação, o ROC-AUC e a calibração vêm de
+    knn.predict_proba, pelo que descrevem exactamente as previsões do modelo. A curva por k usa
+    uma única chamada a kneighbors com max_k vizinhos e os k primeiros para cada k: quando há
+    vizinhos empatados à mesma distância, o conjunto escolhido pode não ser o de uma pesquisa com
+    esse k, pelo que a curva é aproximada nos empates. A acurácia leave-one-out usa uma segunda
+    chamada sobre o treino.
+
+    Args:
+        knn: KNeighborsClassifier já treinado com X_train (ou DeduplicatedKNNClassifier).
+        X_train: Matriz de treino transformada (a usada no fit).
+        y_train: Etiquetas de treino.
+        X_test: Matriz de teste transformada.
+        y_test: Etiquetas de teste.
+        max_k: Maior k avaliado (padrão: 20; nunca inferior ao k do modelo).
+        n_bins: Número de intervalos de calibração (padrão: 10).
+        leave_one_out: Calcula a acurácia leave-one-out no treino (padrão: True).
+        loo_sample_rows: Máximo de pontos de treino consultados no leave-one-out (padrão: 5000).
+        random_state: Semente da amostra do leave-one-out (padrão: 42).
+
+    Returns:
+        dict: Relatório com 'accuracy', 'confusion_matrix', 'precision', 'recall', 'roc_auc',
+            'calibration', 'accuracy_by_k' (aproximada nos empates), 'loo_accuracy_by_k' e metadados.
+
+    Raises:
+        ValueError: Se o k do modelo exceder o número de linhas de treino.
+    """
+    classes = knn.classes_
+    n_classes = len(classes)
+    n_neighbors = knn.n_neighbors
+    n_train = X_train.shape[0]
+    if n_neighbors > n_train:
+        raise ValueError(f"O número de vizinhos (k={n_neighbors}) não pode exceder o número de linhas de "
+                         f"treino ({n_train}).")
+    max_k = min(max(max_k, n_neighbors), n_train)
+    loo_max_k = min(max_k, n_train - 1)  # No leave-one-out, o próprio ponto não conta como vizinho
+    train_codes = np.searchsorted(classes, np.asarray(y_train))
+    test_codes = np.searchsorted(classes, np.asarray(y_test))
+
+    # Métricas do k do modelo a partir das suas próprias previsões (os empates resolvem-se como em predict)
+    probabilities = knn.predict_proba(X_test)
+    predicted_codes = probabilities.argmax(axis=1)
+    _, indices = knn.kneighbors(X_test, n_neighbors=max_k)  # Uma só pesquisa para a curva por k
+    accuracy_by_k = _accuracy_by_k(_votes_by_k(knn, indices, train_codes, max_k), test_codes)
+
+    labels = list(range(n_classes))
+    precision, recall, _, support = precision_recall_fscore_support(test_codes, predicted_codes, labels=labels,
+                                                                    zero_division=0)
+    roc_auc = None
+    try:
+        if n_classes == 2:
+            roc_auc = float(roc_auc_score(test_codes == 1, probabilities[:, 1]))
+        else:
+            roc_auc = float(roc_auc_score(test_codes, probabilities, multi_class='ovr', labels=labels))
+    except ValueError:
+        logger.debug("ROC-AUC indisponível: o conjunto de teste não tem todas as classes")
+
+    if n_classes == 2:
+        calibration = _calibration_bins(probabilities[:, 1], (test_codes == 1).astype(float), n_bins)
+    else:
+        # Calibração da classe prevista: confiança máxima contra acerto
+        calibration = _calibration_bins(probabilities.max(axis=1), (predicted_codes == test_codes).astype(float), n_bins)
+
+    loo_accuracy_by_k = None
+    if leave_one_out and loo_max_k >= 1:
+        queries, loo_indices, exclude = _leave_one_out_neighbors(knn, X_train, train_codes, loo_max_k,
+                                                                 loo_sample_rows, random_state)
+        loo_accuracy_by_k = _accuracy_by_k(_votes_by_k(knn, loo_indices, train_codes, loo_max_k, exclude),
+                                              train_codes[queries])
+
+    names = [c.item() if hasattr(c, 'item') else c for c in classes]  # Tipos nativos, para exportar em JSON
+    report = {
+        'n_neighbors': int(n_neighbors),
+        'max_k': int(max_k),
+        'classes': names,
+        'n_test': int(len(test_codes)),
+        'accuracy': float((predicted_codes == test_codes).mean()),
+        'confusion_matrix': confusion_matrix(test_codes, predicted_codes, labels=labels).tolist(),
+        'precision': {str(name): float(value) for name, value in zip(names, precision)},
+        'recall': {str(name): float(value) for name, value in zip(names, recall)},
+        'support': {str(name): int(value) for name, value in zip(names, support)},
+        'roc_auc': roc_auc,
+        'calibration': calibration,
+        'accuracy_by_k': accuracy_by_k,
+        'best_k': max(accuracy_by_k, key=accuracy_by_k.get),
+        'loo_accuracy_by_k': loo_accuracy_by_k,
+    }
+    logger.debug(f"Avaliação calculada: acurácia {report['accuracy']:.4f}, melhor k {report['best_k']}")
+    return report
+
+def format_evaluation_report(report):
+    """Formata o relatório de avaliação como texto para a interface.
+
+    Args:
+        report: Relatório devolvido por build_evaluation_report.
+
+    Returns:
+        str: Texto com as métricas principais.
+    """
+    names = [str(name) for name in report['classes']]
+    lines = [f"Acurácia (k={report['n_neighbors']}): {report['accuracy']:.4f}"]
+    if report['roc_auc'] is not None:
+        lines.append(f"ROC-AUC: {report['roc_auc']:.4f}")
+    lines.append("Matriz de confusão (linhas: real, colunas: previsto):")
+    lines.append("    " + "  ".join(f"{name:>6}" for name in names))
+    for name, row in zip(names, report['confusion_matrix']):
+        lines.append(f"{name:>4}" + "  ".join(f"{value:>6}" for value in row))
+    for name in names:
+        lines.append(f"Classe {name}: precisão {report['precision'][name]:.3f}, revocação {report['recall'][name]:.3f}")
+    lines.append("Calibração (previsto → observado):")
+    for item in report['calibration']:
+        lines.append(f"  [{item['bin'][0]:.1f}, {item['bin'][1]:.1f}]: {item['mean_predicted']:.2f} → "
+                     f"{item['observed']:.2f} ({item['count']} linhas)")
+    lines.append(f"Acurácia por k, aproximada nos empates de distância (melhor k={report['best_k']}):")
+    for k, value in report['accuracy_by_k'].items():
+        loo = report['loo_accuracy_by_k'] or {}
+        lines.append(f"  k={k}: teste {value:.4f}" + (f", leave-one-out {loo[k]:.4f}" if k in loo else ""))
+    return "\n".join(lines)
+
+def export_evaluation_report(report, file_name):
+    """Exporta o relatório de avaliação para JSON.
+
+    Args:
+        report: Relatório devolvido por build_evaluation_report.
+        file_name: Caminho do ficheiro de saída.
+    """
+    with open(file_name, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.debug(f"Relatório de avaliação exportado para '{file_name}'")
\ No newline at end of file
@@ -0,0 +1,238 @@
+# feature_selection.py
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+from model import split_training_data, has_sparse_columns
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ('forward', 'backward')
+_DATA = {}  # Dados de cada processo do pool, definidos por _init_worker
+_STATE = OrderedDict()  # Bloco -> (colunas, distâncias acumuladas), por ordem de utilização
+
+def candidate_columns(df, exclude=('id', 'result')):
+    """Colunas que podem entrar na selecção: numéricas, densas e sem nulos.
+
+    Args:
+        df: DataFrame processado.
+        exclude: Colunas nunca consideradas (padrão: 'id' e 'result').
+
+    Returns:
+        list: Nomes das colunas candidatas.
+    """
+    return [col for col in df.columns if col not in exclude and pd.api.types.is_numeric_dtype(df[col])
+            and not isinstance(df[col].dtype, pd.SparseDtype) and not df[col].isnull().any()]
+
+def _init_worker(X_train, y_train, X_test, y_test, n_classes, n_neighbors, block_rows, cache_blocks):
+    """Guarda os dados normalizados no processo, uma única vez por worker."""
+    _DATA.update(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, n_classes=n_classes,
+                 n_neighbors=n_neighbors, block_rows=block_rows, cache_blocks=cache_blocks)
+    _STATE.clear()
+
+def _contribution(queries, column):
+    """Contribuição de uma coluna para as distâncias ao quadrado entre um bloco de consultas e o treino."""
+    difference = queries[:, column][:, None] - _DATA['X_train'][:, column][None, :]
+    return difference * difference
+
+def _block_distances(block, columns):
+    """Distâncias ao quadrado (bloco x treino) sobre `columns`, reutilizando o estado guardado do bloco.
+
+    Se o bloco já tiver o estado de um conjunto que difere numa só coluna, basta somar ou
+    subtrair a contribuição dessa coluna; caso contrário, as contribuições são somadas de raiz.
+    """
+    queries = _block_queries(block)
+    columns = frozenset(columns)
+    cached = _STATE.get(block)
+    if cached is not None and cached[0] == columns:
+        distances = cached[1]
+    elif cached is not None and len(cached[0] ^ columns) == 1:
+        (column,) = cached[0] ^ columns
+        sign = 1.0 if column in columns else -1.0
+        distances = cached[1] + sign * _contribution(queries, column)
+    else:
+        distances = np.zeros((len(queries), _DATA['X_train'].shape[0]))
+        for column in columns:
+            distances += _contribution(queries, column)
+    _STATE[block] = (columns, distances)
+    _STATE.move_to_end(block)
+    while len(_STATE) > _DATA['cache_blocks']:
+        _STATE.popitem(last=False)  # Limita a memória do estado guardado em cada processo
+    return distances
+
+def _block_queries(block):
+    """Linhas de consulta de um bloco."""
+    start = block * _DATA['block_rows']
+    return _DATA['X_test'][start:start + _DATA['block_rows']]
+
+def _correct_predictions(distances, block):
+    """Número de acertos do voto maioritário dos k vizinhos mais próximos de cada consulta do bloco."""
+    k = _DATA['n_neighbors']
+    neighbors = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    votes = np.zeros((len(distances), _DATA['n_classes']))
+    np.add.at(votes, (np.arange(len(distances))[:, None], _DATA['y_train'][neighbors]), 1)
+    start = block * _DATA['block_rows']
+    return int((votes.argmax(axis=1) == _DATA['y_test'][start:start + len(distances)]).sum())
+
+def _evaluate_block(block, base_columns, changes):
+    """Avalia, num bloco de consultas, cada alteração de uma coluna ao conjunto base.
+
+    Args:
+        block: Índice do bloco de consultas.
+        base_columns: Índices das colunas do conjunto actual.
+        changes: Índices das colunas a acrescentar (se fora da base) ou a retirar (se na base).
+
+    Returns:
+        list: Acertos no bloco para cada alteração, pela ordem de `changes`.
+    """
+    distances = _block_distances(block, base_columns)
+    queries = _block_queries(block)
+    base = set(base_columns)
+    correct = []
+    for column in changes:
+        sign = -1.0 if column in base else 1.0
+        correct.append(_correct_predictions(distances + sign * _contribution(queries, column), block))
+    return correct
+
+def _measure_latency(X_train, y_train, X_test, columns, n_neighbors):
+    """Tempo de previsão do KNN com as colunas indicadas, em ms por 1000 linhas."""
+    knn = KNeighborsClassifier(n_neighbors=n_neighbors).fit(X_train[:, columns], y_train)
+    queries = X_test[:, columns]
+    knn.predict(queries[:1])  # Aquece o modelo para não contar custos de inicialização
+    start = time.perf_counter()
+    knn.predict(queries)
+    return (time.perf_counter() - start) * 1000 / len(queries) * 1000
+
+def select_features(df, candidates=None, direction='forward', n_neighbors=5, max_columns=None, patience=1,
+                    max_queries=5000, block_mb=32, cache_mb=256, n_jobs=None, top=10, random_state=42):
+    """Selecção automática de colunas (para a frente ou para trás) com avaliação incremental das distâncias.
+
+    As colunas são normalizadas uma vez (a normalização de cada coluna não depende das outras) e
+    as consultas do conjunto de teste são divididas em blocos, cada um fixo num processo durante
+    toda a selecção. Cada processo guarda, por bloco, as distâncias ao quadrado do conjunto actual;
+    avaliar um candidato é somar (ou subtrair) a contribuição de uma única coluna, sem nova pesquisa de raiz.
+
+    Args:
+        df: DataFrame processado com a coluna 'result'.
+        candidates: Colunas candidatas; por defeito, candidate_columns(df).
+        direction: 'forward' (acrescenta colunas) ou 'backward' (retira colunas) (padrão: 'forward').
+        n_neighbors: Número de vizinhos do KNN (padrão: 5).
+        max_columns: Máximo de colunas na selecção para a frente (padrão: sem limite).
+        patience: Passos seguidos sem melhorar a acurácia antes de parar (padrão: 1).
+        max_queries: Máximo de linhas de teste usadas como consultas (padrão: 5000).
+        block_mb: Memória das distâncias de cada bloco, em MB (padrão: 32).
+        cache_mb: Memória do estado guardado por processo, em MB (padrão: 256).
+        n_jobs: Número de processos; None usa os CPUs disponíveis, 1 avalia no próprio processo.
+        top: Número de conjuntos devolvidos, com latência medida (padrão: 10).
+        random_state: Semente da amostra de consultas (padrão: 42).
+
+    Returns:
+        list: Conjuntos ordenados por acurácia (e, em empate, menos colunas), cada um um dict
+            com 'columns', 'accuracy', 'latency_ms' e 'step'.
+
+    Raises:
+        ValueError: Se a direcção for desconhecida ou não houver colunas candidatas válidas.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"Direcção desconhecida: '{direction}'.")
+    candidates = list(candidate_columns(df) if candidates is None else candidates)
+    if not candidates:
+        raise ValueError("Não há colunas numéricas sem nulos para seleccionar.")
+    X_train, X_test, y_train, y_test, columns = split_training_data(df, candidates + ['result'])
+    if has_sparse_columns(X_train):
+        raise ValueError("A selecção automática não suporta colunas esparsas.")
+    columns = [col for col in candidates if col in X_train.columns]  # Ordem estável, a das candidatas
+    X_train, X_test = X_train[columns], X_test[columns]
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X_train)
+    X_test = scaler.transform(X_test)
+    if len(X_test) > max_queries:
+        rows = np.sort(np.random.default_rng(random_state).choice(len(X_test), max_queries, replace=False))
+        X_test, y_test = X_test[rows], np.asarray(y_test)[rows]
+    classes = np.unique(np.asarray(y_train))
+    y_train_codes = np.searchsorted(classes, np.asarray(y_train))
+    y_test_codes = np.searchsorted(classes, np.asarray(y_test))
+
+    block_rows = max(1, int(block_mb * 1024 * 1024 / (8 * X_train.shape[0])))
+    n_blocks = math.ceil(len(X_test) / block_rows)
+    cache_blocks = max(1, int(cache_mb / block_mb))
+    n_jobs = min(n_jobs or os.cpu_count() or 1, n_blocks * len(columns))
+    init_args = (X_train, y_train_codes, X_test, y_test_codes, len(classes), n_neighbors, block_rows, cache_blocks)
+    # Cada bloco é dividido em grupos de candidatos para ocupar todos os processos
+    groups = max(1, math.ceil(n_jobs / n_blocks))
+
+    # Um executor de um só processo por worker: cada par (bloco, grupo) vai sempre para o mesmo
+    # processo, o único que tem o estado desse bloco (um pool partilhado entrega-o a qualquer um)
+    executors = [ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=init_args)
+                 for _ in range(n_jobs)] if n_jobs > 1 else []
+    if not executors:
+        _init_worker(*init_args)
+
+    def evaluate(base, changes):
+        """Acurácia de cada alteração, somando os acertos de todos os blocos."""
+        split = [changes[i::groups] for i in range(groups) if changes[i::groups]]
+        tasks = [(block, part, block * groups + group) for block in range(n_blocks)
+                 for group, part in enumerate(split)]
+        if not executors:
+            outputs = [_evaluate_block(block, base, part) for block, part, _ in tasks]
+        else:
+            futures = [executors[slot % n_jobs].submit(_evaluate_block, block, base, part) for block, part, slot in tasks]
+            outputs = [future.result() for future in futures]
+        correct = dict.fromkeys(changes, 0)
+        for (_, part, _), counts in zip(tasks, outputs):
+            for column, count in zip(part, counts):
+                correct[column] += count
+        return {column: count / len(X_test) for column, count in correct.items()}
+
+    evaluated = {}  # Conjunto de colunas -> (acurácia, passo)
+    current = [] if direction == 'forward' else list(range(len(columns)))
+    best_accuracy, stale, step = -1.0, 0, 0
+    try:
+        if direction == 'backward':
+            full = evaluate(current[:-1], [current[-1]])[current[-1]]  # O conjunto completo, via um acréscimo
+            evaluated[frozenset(current)] = (full, 0)
+            best_accuracy = full
+        limit = len(columns) if max_columns is None else min(max_columns, len(columns))
+        while True:
+            step += 1
+            if direction == 'forward':
+                changes = [c for c in range(len(columns)) if c not in current]
+                if not changes or len(current) >= limit:
+                    break
+            else:
+                changes = list(current)
+                if len(changes) <= 1:
+                    break
+            scores = evaluate(current, changes)
+            for column, accuracy in scores.items():
+                subset = frozenset(current) ^ {column}
+                evaluated.setdefault(subset, (accuracy, step))
+            chosen = max(changes, key=lambda column: (scores[column], -column))
+            current = sorted(set(current) ^ {chosen})
+            logger.debug(f"Selecção ({direction}), passo {step}: {[columns[c] for c in current]} "
+                         f"com acurácia {scores[chosen]:.4f}")
+            if scores[chosen] > best_accuracy:
+                best_accuracy, stale = scores[chosen], 0
+            else:
+                stale += 1
+                if stale >= patience:
+                    break
+    finally:
+        for executor in executors:
+            executor.shutdown()
+        if not executors:
+            _STATE.clear()
+
+    ranked = sorted(evaluated.items(), key=lambda item: (-item[1][0], len(item[0])))[:top]
+    results = []
+    for subset, (accuracy, subset_step) in ranked:
+        indices = sorted(subset)
+        results.append({'columns': [columns[c] for c in indices], 'accuracy': accuracy, 'step': subset_step,
+                        'latency_ms': _measure_latency(X_train, y_train_codes, X_test, indices, n_neighbors)})
+    return results
\ No newline at end of file
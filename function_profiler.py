@@ -0,0 +1,225 @@
+# function_profiler.py
+import ast
+import logging
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from preprocessing_pipeline import get_function_source
+from memory_tracking import dataframe_footprint, format_bytes
+
+logger = logging.getLogger(__name__)
+
+SCALE_FACTOR = 4  # Cada medição usa SCALE_FACTOR vezes mais linhas do que a anterior
+LOOP_INDEXERS = {'loc', 'iloc', 'at', 'iat'}
+ROW_ITERATORS = {'iterrows', 'itertuples'}
+
+def detect_slow_patterns(function):
+    """Procura no código da função padrões conhecidos por serem lentos em pandas.
+
+    Args:
+        function: Função (df, column) a analisar.
+
+    Returns:
+        list: Dicts com 'pattern', 'severity' ('alta', 'média' ou 'info'), 'line' (linha na função)
+            e 'message'; vazia se o código fonte não estiver disponível.
+    """
+    try:
+        tree = ast.parse(get_function_source(function))
+    except (OSError, TypeError, SyntaxError):
+        return []
+    flags = []
+
+    def flag(node, pattern, severity, message):
+        flags.append({'pattern': pattern, 'severity': severity, 'line': node.lineno, 'message': message})
+
+    loops = [node for node in ast.walk(tree) if isinstance(node, (ast.For, ast.While))]
+    in_loop = {id(inner) for loop in loops for body in loop.body for inner in ast.walk(body)}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            name = node.func.attr
+            axis = next((kw.value for kw in node.keywords if kw.arg == 'axis'), None)
+            if name == 'apply' and isinstance(axis, ast.Constant) and axis.value in (1, 'columns'):
+                flag(node, 'apply_rows', 'alta', "apply(axis=1) chama Python uma vez por linha e cria uma Series "
+                                                 "por linha; use condições vectoriais (np.select, where, map).")
+            elif name == 'apply':
+                flag(node, 'apply_values', 'média', "apply sobre uma coluna chama Python uma vez por valor; "
+                                                    "prefira map com dicionário, métodos .str ou operações vectoriais.")
+            elif name in ROW_ITERATORS:
+                flag(node, 'row_iteration', 'alta', f"{name}() percorre as linhas em Python; use operações por coluna.")
+            elif name in ('concat', 'append') and id(node) in in_loop:
+                flag(node, 'concat_in_loop', 'alta', f"{name} dentro de um ciclo copia os dados acumulados a cada "
+                                                     f"volta (custo quadrático); junte uma lista no fim.")
+            elif name == 'copy':
+                flag(node, 'copy', 'info', "copy() duplica o DataFrame inteiro; copie só a coluna alterada "
+                                           "ou use assign.")
+        elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Attribute) \
+                and node.value.attr in LOOP_INDEXERS and id(node) in in_loop \
+                and not any(isinstance(part, ast.Slice) for part in ast.walk(node.slice)):  # Fatias são vectoriais
+            flag(node, 'indexing_in_loop', 'alta', f".{node.value.attr}[...] dentro de um ciclo acede a um valor de "
+                                                   f"cada vez; opere sobre a coluna inteira.")
+    unique = {(item['pattern'], item['line']): item for item in flags}  # Um aviso por padrão e linha
+    return sorted(unique.values(), key=lambda item: item['line'])
+
+def _sample_frame(df, rows, random_state):
+    """Amostra com `rows` linhas; acima do tamanho do DataFrame, as linhas são repetidas ao acaso."""
+    if rows == len(df):
+        return df.copy()
+    return df.sample(rows, replace=rows > len(df), random_state=random_state).reset_index(drop=True)
+
+def _copy_report(before, after, column, peak_bytes, frame_bytes):
+    """Indica se a função alterou o DataFrame recebido ou copiou as colunas que não transformou."""
+    if after is before:
+        return {'in_place': True, 'checked': 0, 'copied': 0, 'verdict': "altera o DataFrame recebido (sem cópia)"}
+    # Colunas numéricas não transformadas: partilham a memória com a entrada, a menos que tenham sido copiadas
+    candidates = [col for col in before.columns if col != column and col in after.columns
+                  and isinstance(before[col].dtype, np.dtype) and before[col].dtype.kind in 'biufcmM'
+                  and before[col].dtype == after[col].dtype]
+    copied = [col for col in candidates if not np.shares_memory(before[col].to_numpy(), after[col].to_numpy())]
+    if candidates and len(copied) == len(candidates):
+        verdict = "copia o DataFrame inteiro"
+    elif copied:
+        verdict = f"copia {len(copied)} de {len(candidates)} colunas não transformadas"
+    elif candidates:
+        verdict = "não copia as colunas não transformadas"
+    elif frame_bytes and peak_bytes is not None and peak_bytes >= frame_bytes:
+        verdict = "provável cópia do DataFrame (pico de memória acima do seu tamanho)"
+    else:
+        verdict = "sem colunas numéricas para verificar a cópia"
+    return {'in_place': False, 'checked': len(candidates), 'copied': len(copied), 'verdict': verdict}
+
+def _run(function, frame, column, trace):
+    """Executa a função uma vez; com trace, mede o pico de alocações com tracemalloc.
+
+    O pico só é medido quando o tracemalloc está livre: se outra medição (ex.: um MemoryTracker)
+    já o estiver a usar, repor o pico estragaria a dela, pelo que o pico fica indisponível.
+
+    Returns:
+        tuple: (resultado, segundos, pico em bytes ou None).
+    """
+    trace = trace and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    try:
+        start = time.perf_counter()
+        result = function(frame, column)
+        seconds = time.perf_counter() - start
+        peak = max(tracemalloc.get_traced_memory()[1] - traced_before, 0) if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+    return result, seconds, peak
+
+def _scaling_exponent(runs):
+    """Expoente de crescimento do tempo com o número de linhas (1 = linear), pelas medições mais longas."""
+    usable = [run for run in runs if run['seconds'] > 1e-4]
+    if len(usable) < 2:
+        return 1.0
+    usable = usable[-3:]  # As medições maiores são as menos afectadas pelo custo fixo
+    slope = np.polyfit(np.log([run['rows'] for run in usable]), np.log([run['seconds'] for run in usable]), 1)[0]
+    return float(np.clip(slope, 0.0, 3.0))
+
+def profile_custom_function(df, function, column, target_rows=None, sample_rows=1000, max_rows=None,
+                            time_budget=10.0, random_state=42):
+    """Mede o custo de uma função personalizada (df, column) em amostras crescentes e extrapola-o.
+
+    A função corre numa amostra e em tamanhos SCALE_FACTOR vezes maiores até ao tamanho do
+    DataFrame actual (ou `max_rows`), parando antes de exceder o orçamento de tempo. Em cada
+    tamanho há uma execução cronometrada e outra com tracemalloc (pico de memória e cópias).
+    O tempo em `target_rows` é extrapolado com o expoente de crescimento medido; a memória,
+    de forma linear.
+
+    Args:
+        df: DataFrame actual (não é alterado: cada execução recebe uma cópia).
+        function: Função com assinatura (df, column).
+        column: Coluna passada à função.
+        target_rows: Tamanho dos dados completos para a extrapolação; por defeito, len(df).
+        sample_rows: Linhas da primeira medição (padrão: 1000).
+        max_rows: Máximo de linhas medidas; por defeito, len(df).
+        time_budget: Tempo máximo aproximado do perfil, em segundos (padrão: 10.0).
+        random_state: Semente das amostras (padrão: 42).
+
+    Returns:
+        dict: 'function', 'column', 'runs' (cada um com 'rows', 'seconds', 'peak_bytes' e
+            'copy'), 'exponent', 'target_rows', 'estimated_seconds', 'estimated_peak_bytes',
+            'copy' (da maior medição) e 'flags' (detect_slow_patterns e crescimento super-linear);
+            os picos são None se o tracemalloc já estiver em uso por outra medição.
+
+    Raises:
+        ValueError: Se o DataFrame estiver vazio ou a função falhar ou não devolver um DataFrame.
+    """
+    if df is None or len(df) == 0:
+        raise ValueError("Não há dados para perfilar a função.")
+    target_rows = target_rows or len(df)
+    max_rows = max_rows or len(df)
+    sizes = [min(sample_rows, max_rows)]
+    while sizes[-1] < max_rows:
+        sizes.append(min(sizes[-1] * SCALE_FACTOR, max_rows))
+
+    runs, spent = [], 0.0
+    for rows in sizes:
+        if runs:
+            # Prevê o custo da próxima medição (cronometrada e com tracemalloc) antes de a fazer
+            expected = 2 * runs[-1]['seconds'] * (rows / runs[-1]['rows']) ** max(_scaling_exponent(runs), 1.0)
+            if spent + expected > time_budget:
+                break
+        frame = _sample_frame(df, rows, random_state)
+        try:
+            _, seconds, _ = _run(function, frame.copy(), column, trace=False)
+            result, traced_seconds, peak = _run(function, frame, column, trace=True)
+        except Exception as e:
+            raise ValueError(f"A função '{function.__name__}' falhou com {rows} linhas: {str(e)}")
+        if not isinstance(result, pd.DataFrame):
+            raise ValueError(f"A função '{function.__name__}' deve devolver um DataFrame.")
+        frame_bytes = dataframe_footprint(frame)['total_bytes']
+        runs.append({'rows': rows, 'seconds': seconds, 'peak_bytes': peak, 'frame_bytes': frame_bytes,
+                     'copy': _copy_report(frame, result, column, peak, frame_bytes)})
+        spent += seconds + traced_seconds
+        logger.debug(f"Perfil de '{function.__name__}': {rows} linhas em {seconds:.4f}s, pico {format_bytes(peak)}")
+
+    last = runs[-1]
+    exponent = _scaling_exponent(runs)
+    flags = detect_slow_patterns(function)
+    if exponent > 1.3 and last['seconds'] > 0.01:
+        flags.append({'pattern': 'superlinear', 'severity': 'alta', 'line': None,
+                      'message': f"O tempo cresce com linhas^{exponent:.2f}: duplicar os dados mais do que duplica o tempo."})
+    return {
+        'function': function.__name__,
+        'column': column,
+        'runs': runs,
+        'exponent': exponent,
+        'target_rows': target_rows,
+        'estimated_seconds': last['seconds'] * (target_rows / last['rows']) ** exponent,
+        'estimated_peak_bytes': None if last['peak_bytes'] is None else last['peak_bytes'] * target_rows / last['rows'],
+        'copy': last['copy'],
+        'flags': flags,
+    }
+
+def format_profile_report(report):
+    """Formata o perfil de uma função personalizada como texto para a interface.
+
+    Args:
+        report: Dict devolvido por profile_custom_function.
+
+    Returns:
+        str: Relatório em texto.
+    """
+    lines = [f"Perfil de '{report['function']}' na coluna '{report['column']}':", ""]
+    lines.append(f"{'Linhas':>10} {'Tempo (s)':>10} {'µs/linha':>9} {'Pico memória':>13}  Cópia")
+    for run in report['runs']:
+        lines.append(f"{run['rows']:>10} {run['seconds']:>10.4f} {run['seconds'] / run['rows'] * 1e6:>9.2f} "
+                     f"{format_bytes(run['peak_bytes']):>13}  {run['copy']['verdict']}")
+    lines.append("")
+    lines.append(f"Crescimento do tempo: linhas^{report['exponent']:.2f}")
+    lines.append(f"Estimativa para {report['target_rows']} linhas: {report['estimated_seconds']:.2f} s, "
+                 f"pico de memória {format_bytes(report['estimated_peak_bytes'])}")
+    if report['estimated_peak_bytes'] is None:
+        lines.append("Pico de memória indisponível: o tracemalloc já estava em uso por outra medição.")
+    if report['flags']:
+        lines.append("")
+        lines.append("Avisos:")
+        for item in report['flags']:
+            where = f"linha {item['line']}: " if item['line'] is not None else ""
+            lines.append(f"- [{item['severity']}] {where}{item['message']}")
+    return "\n".join(lines)
\ No newline at end of file
@@ -0,0 +1,330 @@
+# hot_folder.py
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from model import load_model_bundle, score_test_csv
+from schema import ScoringSchema
+from shared_model import SharedModel, attached_model, init_worker
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_SUFFIX = '_predictions.csv'
+QUARANTINE_SUFFIX = '_quarantine.csv'  # Linhas rejeitadas pelo esquema, com o motivo
+MANIFEST_NAME = '.hot_folder_manifest.json'  # Ficheiros já tratados, para nunca os voltar a prever
+METRICS_NAME = 'metrics.json'
+THROUGHPUT_WINDOW = 60  # Segundos considerados no débito recente
+MAX_ATTEMPTS = 2  # Tentativas de um ficheiro interrompido pela queda de um worker
+
+def _write_atomic(path, write):
+    """Escreve um ficheiro através de um temporário na mesma pasta e substitui-o de uma vez."""
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)  # Quem lê a pasta nunca vê um ficheiro a meio
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _write_json(path, data):
+    """Escreve um JSON de forma atómica."""
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    _write_atomic(path, write)
+
+def _init_hot_folder_worker(handle):
+    """Liga o worker ao modelo partilhado; o Ctrl+C é tratado só pelo processo principal."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_worker(handle)
+
+def _score_file(path, output_path, quarantine_path, schema, include_neighbors):
+    """Prevê um CSV no worker, com o modelo partilhado, e escreve previsões e quarentena de forma atómica.
+
+    Returns:
+        dict: Resumo de score_test_csv com 'seconds'.
+    """
+    start = time.perf_counter()
+    model = attached_model()
+    summary = {}
+
+    def write(tmp_output):
+        tmp_quarantine = os.path.join(os.path.dirname(quarantine_path), f".{os.path.basename(quarantine_path)}.tmp")
+        summary.update(score_test_csv(path, model.knn, model.scaler, model.training_columns, schema,
+                                      output_file=tmp_output, quarantine_file=tmp_quarantine,
+                                      include_neighbors=include_neighbors))
+        if summary['quarantine_file'] is not None:
+            os.replace(tmp_quarantine, quarantine_path)
+            summary['quarantine_file'] = quarantine_path
+        elif os.path.exists(quarantine_path):
+            os.remove(quarantine_path)  # Quarentena de uma versão anterior do mesmo ficheiro
+
+    _write_atomic(output_path, write)
+    summary.update(output_file=output_path, seconds=time.perf_counter() - start)
+    return summary
+
+class HotFolderScorer:
+    """Vigia uma pasta e prevê cada CSV novo num pool limitado de processos com um modelo pré-carregado.
+
+    A pasta é lida por polling (portável, sem dependências); um ficheiro só é enviado quando o seu
+    tamanho e data de modificação se mantêm entre duas leituras, para não apanhar cópias a meio.
+    O modelo é publicado uma vez em memória partilhada (SharedModel) para todos os workers. Cada
+    ficheiro tratado fica no manifesto com o seu tamanho e data, pelo que um reinício não volta a
+    prever ficheiros já tratados (um ficheiro alterado é previsto de novo). O débito, o atraso e
+    os totais ficam em metrics() e em metrics.json.
+    """
+
+    def __init__(self, watch_dir, knn, scaler, training_columns, valid_values=None, output_dir=None, n_workers=2,
+                 poll_interval=2.0, include_neighbors=False):
+        """Prepara a vigilância (o pool e o modelo partilhado são criados em start()).
+
+        Args:
+            watch_dir: Pasta vigiada.
+            knn: Modelo KNN treinado.
+            scaler: Normalizador usado no treino.
+            training_columns: Colunas usadas no treino.
+            valid_values: Valores válidos das colunas, para o esquema de validação (padrão: só tipos e nulos).
+            output_dir: Pasta das previsões, do manifesto e das métricas; por defeito, watch_dir.
+            n_workers: Número de processos do pool (padrão: 2).
+            poll_interval: Segundos entre leituras da pasta (padrão: 2.0).
+            include_neighbors: Inclui os vizinhos no CSV de previsões (padrão: False).
+
+        Raises:
+            ValueError: Se a pasta vigiada não existir.
+        """
+        if not os.path.isdir(watch_dir):
+            raise ValueError(f"A pasta '{watch_dir}' não existe.")
+        self.watch_dir = watch_dir
+        self.output_dir = output_dir or watch_dir
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.model = (knn, scaler, training_columns)
+        self.schema = ScoringSchema.from_model(training_columns, valid_values)
+        self.n_workers = n_workers
+        self.poll_interval = poll_interval
+        self.include_neighbors = include_neighbors
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        self.metrics_path = os.path.join(self.output_dir, METRICS_NAME)
+        self.manifest = self._load_manifest()
+        self._seen = {}  # Ficheiro -> (tamanho, data) da última leitura, para detectar ficheiros estáveis
+        self._queue = deque()  # Ficheiros estáveis à espera de um worker
+        self._running = {}  # Futuro -> (ficheiro, assinatura, início)
+        self._attempts = {}  # Ficheiro -> tentativas interrompidas por quedas do pool
+        self._recent = deque()  # (fim, linhas) dos ficheiros concluídos na janela de débito
+        self._totals = {'files_done': 0, 'files_failed': 0, 'rows_scored': 0, 'rows_quarantined': 0}
+        self._started_at = None
+        self.last_metrics = None  # Últimas métricas calculadas, lidas sem bloquear por outras threads
+        self._stop = threading.Event()
+        self._shared = None
+        self._executor = None
+
+    def _load_manifest(self):
+        """Lê o manifesto do disco (vazio se não existir ou estiver ilegível)."""
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Manifesto ilegível ({str(e)}); os ficheiros serão tratados como novos")
+            return {}
+
+    def start(self):
+        """Publica o modelo e inicia o pool de processos."""
+        if self._executor is None:
+            knn, scaler, training_columns = self.model
+            self._shared = SharedModel(knn, scaler, training_columns)
+            self._executor = self._new_pool()
+            self._started_at = time.time()
+        return self
+
+    def _new_pool(self):
+        """Cria o pool de processos ligado ao modelo partilhado."""
+        return ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_hot_folder_worker,
+                                   initargs=(self._shared.handle,))
+
+    def _is_input(self, name):
+        """Indica se um nome de ficheiro é um CSV de entrada (não previsões, temporários ou ocultos)."""
+        return (name.endswith('.csv') and not name.endswith(OUTPUT_SUFFIX) and not name.endswith(QUARANTINE_SUFFIX)
+                and not name.startswith('.'))
+
+    def scan(self):
+        """Lê a pasta e põe na fila os ficheiros novos cujo tamanho e data não mudaram desde a última leitura.
+
+        Returns:
+            list: Ficheiros acrescentados à fila.
+        """
+        queued = {path for path in self._queue} | {path for path, _, _ in self._running.values()}
+        current, added = {}, []
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not self._is_input(entry.name):
+                    continue
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+                current[entry.name] = signature
+                done = self.manifest.get(entry.name)
+                if done is not None and (done['size'], done['mtime_ns']) == signature:
+                    continue  # Já tratado (nesta execução ou numa anterior)
+                if self._seen.get(entry.name) == signature and entry.name not in queued:
+                    self._queue.append(entry.name)
+                    added.append(entry.name)
+        self._seen = current
+        return added
+
+    def _submit(self):
+        """Envia ficheiros da fila até ter um por worker em curso (o resto espera na fila)."""
+        while self._queue and len(self._running) < self.n_workers:
+            name = self._queue.popleft()
+            if name not in self._seen:
+                continue  # Removido da pasta depois de entrar na fila
+            path = os.path.join(self.watch_dir, name)
+            stem = os.path.join(self.output_dir, name[:-len('.csv')])
+            future = self._executor.submit(_score_file, path, stem + OUTPUT_SUFFIX, stem + QUARANTINE_SUFFIX, self.schema,
+                                           self.include_neighbors)
+            self._running[future] = (name, self._seen[name], time.time())
+
+    def _collect(self):
+        """Regista os ficheiros concluídos no manifesto e nas métricas."""
+        finished = [future for future in self._running if future.done()]
+        broken = False
+        for future in finished:
+            name, (size, mtime_ns), started = self._running.pop(future)
+            entry = {'size': size, 'mtime_ns': mtime_ns, 'finished_at': datetime.now().isoformat()}
+            try:
+                result = future.result()
+                entry.update(status='done', rows=result['rows'], scored=result['scored'],
+                             quarantined=result['quarantined'], seconds=round(result['seconds'], 3),
+                             output=os.path.basename(result['output_file']),
+                             quarantine=result['quarantine_file'] and os.path.basename(result['quarantine_file']),
+                             reasons=result['reasons'])
+                self._totals['files_done'] += 1
+                self._totals['rows_scored'] += result['scored']
+                self._totals['rows_quarantined'] += result['quarantined']
+                self._recent.append((time.time(), result['rows']))
+                logger.info(f"'{name}' previsto: {result['scored']} linhas em {result['seconds']:.2f} s, "
+                            f"{result['quarantined']} em quarentena")
+            except BrokenProcessPool as e:
+                # Não se sabe que ficheiro derrubou o worker: todos os interrompidos voltam à fila, com limite
+                broken = True
+                self._attempts[name] = self._attempts.get(name, 0) + 1
+                if self._attempts[name] < MAX_ATTEMPTS:
+                    self._queue.append(name)
+                    continue
+                entry.update(status='failed', error=f"Worker terminou inesperadamente: {str(e)}")
+                self._totals['files_failed'] += 1
+            except Exception as e:
+                # Ficheiros inválidos ficam no manifesto para não serem repetidos; alterá-los volta a pô-los na fila
+                entry.update(status='failed', error=str(e))
+                self._totals['files_failed'] += 1
+                logger.warning(f"'{name}' não foi previsto: {str(e)}")
+            self.manifest[name] = entry
+        if finished:
+            _write_json(self.manifest_path, self.manifest)
+        if broken:
+            logger.error("O pool de scoring foi interrompido; a reiniciar os workers")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_pool()
+
+    def poll_once(self):
+        """Uma volta da vigilância: recolhe resultados, lê a pasta, envia trabalho e escreve as métricas.
+
+        Returns:
+            dict: Métricas actuais (ver metrics()).
+        """
+        self.start()
+        self._collect()
+        self.scan()
+        self._submit()
+        self.last_metrics = self.metrics()
+        _write_json(self.metrics_path, self.last_metrics)
+        return self.last_metrics
+
+    def metrics(self):
+        """Métricas de débito e atraso.
+
+        Returns:
+            dict: Totais, ficheiros em fila e em curso ('backlog'), linhas por segundo na janela
+                recente, tempo activo e hora da medição.
+        """
+        now = time.time()
+        while self._recent and now - self._recent[0][0] > THROUGHPUT_WINDOW:
+            self._recent.popleft()
+        uptime = now - self._started_at if self._started_at else 0.0
+        window = min(THROUGHPUT_WINDOW, uptime) or 1.0
+        return dict(self._totals, queued=len(self._queue), in_flight=len(self._running),
+                    backlog=len(self._queue) + len(self._running),
+                    rows_per_second=round(sum(rows for _, rows in self._recent) / window, 1),
+                    files_per_minute=round(len(self._recent) * 60 / window, 2),
+                    uptime_seconds=round(uptime, 1), updated_at=datetime.now().isoformat())
+
+    def run(self, once=False):
+        """Vigia a pasta até stop() (ou, com once, até tratar os ficheiros já presentes).
+
+        Args:
+            once: Trata os ficheiros presentes e termina (padrão: False).
+
+        Returns:
+            dict: Métricas finais.
+        """
+        self.start()
+        try:
+            self.poll_once()
+            while not self._stop.is_set():
+                if once and not self._queue and not self._running and not self.scan():
+                    break
+                self._stop.wait(self.poll_interval if not once else min(self.poll_interval, 0.5))
+                self.poll_once()
+        finally:
+            self.close()
+        return self.metrics()
+
+    def stop(self):
+        """Pede o fim da vigilância; os ficheiros em curso terminam antes de run() regressar."""
+        self._stop.set()
+
+    def close(self):
+        """Espera pelos ficheiros em curso, regista-os e liberta o pool e o modelo partilhado."""
+        if self._executor is not None:
+            self._queue.clear()  # Os ficheiros por enviar são apanhados no próximo arranque
+            self._executor.shutdown(wait=True)
+            self._collect()
+            self.last_metrics = self.metrics()
+            _write_json(self.metrics_path, self.last_metrics)
+            self._executor = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+def main():
+    """Ponto de entrada da linha de comandos."""
+    parser = argparse.ArgumentParser(description="Prevê os CSV que chegam a uma pasta com um modelo KNN guardado.")
+    parser.add_argument('folder', help="Pasta vigiada.")
+    parser.add_argument('--model', default='knn_model.pkl', help="Ficheiro knn_model.pkl.")
+    parser.add_argument('--output', help="Pasta das previsões, do manifesto e das métricas (padrão: a vigiada).")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--interval', type=float, default=2.0, help="Segundos entre leituras da pasta.")
+    parser.add_argument('--neighbors', action='store_true', help="Inclui os vizinhos no CSV de previsões.")
+    parser.add_argument('--once', action='store_true', help="Trata os ficheiros presentes e termina.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    bundle = load_model_bundle(args.model)
+    scorer = HotFolderScorer(args.folder, bundle['knn'], bundle['scaler'], bundle['training_columns'],
+                             valid_values=bundle['valid_values'], output_dir=args.output, n_workers=args.workers, poll_interval=args.interval,
+                             include_neighbors=args.neighbors)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: scorer.stop())
+    metrics = scorer.run(once=args.once)
+    print(f"{metrics['files_done']} ficheiros previstos ({metrics['rows_scored']} linhas, "
+          f"{metrics['rows_quarantined']} em quarentena), {metrics['files_failed']} com erro.")
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,307 @@
+# knn_engine.py
+import logging
+import os
+import time
+import numpy as np
+from scipy import sparse
+from sklearn.neighbors import KNeighborsClassifier
+from threadpoolctl import threadpool_limits
+
+logger = logging.getLogger(__name__)
+
+QUERY_TILES = (128, 256, 512)  # Linhas de consulta por bloco testadas na afinação
+TRAIN_TILES = (512, 1024, 2048, 8192)  # Linhas de treino por bloco testadas na afinação
+
+def vote_probabilities(knn, distances, indices):
+    """Calcula as probabilidades das classes a partir dos vizinhos, como em predict_proba.
+
+    Args:
+        knn: KNeighborsClassifier treinado (usa classes_, weights e as etiquetas codificadas);
+            num DeduplicatedKNNClassifier, cada vizinho vota com as contagens do seu ponto.
+        distances: Distâncias aos vizinhos (linhas x k).
+        indices: Posições dos vizinhos no conjunto de treino (linhas x k).
+
+    Returns:
+        numpy.ndarray: Probabilidades (linhas x classes).
+    """
+    if hasattr(knn, 'class_counts_'):
+        return _normalize(knn.neighbor_votes(indices, distances))
+    neighbor_codes = knn._y[indices]  # Etiquetas de treino já codificadas pelo índice em classes_
+    weights = _neighbor_weights(knn.weights, distances)
+    probabilities = np.zeros((indices.shape[0], len(knn.classes_)))
+    np.add.at(probabilities, (np.arange(indices.shape[0])[:, None], neighbor_codes), weights)
+    return _normalize(probabilities)
+
+def _normalize(votes):
+    """Converte votos (linhas x classes) em probabilidades; linhas sem votos ficam a zero."""
+    totals = votes.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    return votes / totals
+
+def _neighbor_weights(weights, distances):
+    """Pesos dos vizinhos como em KNeighborsClassifier; vizinhos à distância zero decidem sozinhos."""
+    if weights == 'distance':
+        with np.errstate(divide='ignore'):
+            result = 1.0 / distances
+        exact = np.isinf(result).any(axis=1)
+        result[exact] = np.isinf(result[exact]).astype(float)
+        return result
+    if callable(weights):
+        return weights(distances)
+    return np.ones(distances.shape)
+
+class BlockedBruteForceKNN(KNeighborsClassifier):
+    """KNN euclidiano por força bruta com distâncias calculadas por multiplicação de matrizes em blocos.
+
+    As distâncias ao quadrado são ‖q‖² + ‖x‖² − 2·q·xᵀ, com as normas das linhas de treino
+    calculadas uma vez no treino. Cada bloco de consultas percorre o treino em blocos do tamanho
+    da cache, guardando apenas os k melhores candidatos (argpartition) entre blocos. Os tamanhos
+    dos blocos e o número de threads BLAS são afinados automaticamente no treino.
+    """
+
+    def __init__(self, n_neighbors=5, *, weights='uniform', tile_queries=None, tile_train=None, n_threads=None,
+                 auto_tune=True):
+        """Inicializa o classificador.
+
+        Args:
+            n_neighbors: Número de vizinhos (padrão: 5).
+            weights: Pesos dos vizinhos: 'uniform' ou 'distance' (padrão: 'uniform').
+            tile_queries: Linhas de consulta por bloco; None usa o valor afinado.
+            tile_train: Linhas de treino por bloco; None usa o valor afinado.
+            n_threads: Threads BLAS; None usa o valor afinado.
+            auto_tune: Afina blocos e threads no treino com uma amostra dos dados (padrão: True).
+        """
+        super().__init__(n_neighbors=n_neighbors, weights=weights, algorithm='brute')
+        self.tile_queries = tile_queries
+        self.tile_train = tile_train
+        self.n_threads = n_threads
+        self.auto_tune = auto_tune
+
+    def fit(self, X, y):
+        """Treina o modelo e pré-calcula as normas das linhas de treino.
+
+        Raises:
+            ValueError: Se os dados forem esparsos.
+        """
+        if sparse.issparse(X):
+            raise ValueError("O motor 'blocked' exige dados densos; use o motor 'sklearn' com colunas esparsas.")
+        super().fit(X, y)
+        self.train_norms_ = np.einsum('ij,ij->i', self._fit_X, self._fit_X)
+        self.tile_queries_ = self.tile_queries or 256
+        self.tile_train_ = self.tile_train or 1024
+        self.n_threads_ = self.n_threads or os.cpu_count() or 1
+        if self.auto_tune and (self.tile_queries is None or self.tile_train is None or self.n_threads is None):
+            self.tune()
+        return self
+
+    def tune(self, sample_rows=512, train_rows=32768, random_state=42):
+        """Escolhe o tamanho dos blocos e o número de threads mais rápidos numa amostra de consultas.
+
+        O tamanho ideal dos blocos depende da cache e da dimensão dos dados, não do tamanho do
+        treino, pelo que cada configuração é medida só sobre as primeiras `train_rows` linhas.
+
+        Args:
+            sample_rows: Linhas de treino usadas como consultas de teste (padrão: 512).
+            train_rows: Linhas de treino percorridas em cada medição (padrão: 32768).
+            random_state: Semente da amostra (padrão: 42).
+
+        Returns:
+            dict: Configuração escolhida ('tile_queries', 'tile_train', 'n_threads', 'seconds').
+        """
+        n_train = min(self._fit_X.shape[0], train_rows)
+        rows = np.random.default_rng(random_state).choice(n_train, min(sample_rows, n_train), replace=False)
+        queries = np.asarray(self._fit_X[np.sort(rows)])
+        cpus = os.cpu_count() or 1
+        threads = [self.n_threads] if self.n_threads else sorted({1, max(cpus // 2, 1), cpus})
+        query_tiles = [self.tile_queries] if self.tile_queries else [t for t in QUERY_TILES if t <= max(len(queries), 128)]
+        train_tiles = [self.tile_train] if self.tile_train else [min(t, n_train) for t in TRAIN_TILES]
+        best = None
+        for n_threads in threads:
+            for tile_queries in query_tiles:
+                for tile_train in sorted(set(train_tiles)):
+                    start = time.perf_counter()
+                    with threadpool_limits(limits=n_threads, user_api='blas'):
+                        self._search(queries, self.n_neighbors, tile_queries, tile_train, n_train=n_train)
+                    seconds = time.perf_counter() - start
+                    if best is None or seconds < best['seconds']:
+                        best = {'tile_queries': tile_queries, 'tile_train': tile_train, 'n_threads': n_threads,
+                                'seconds': seconds}
+        self.tile_queries_, self.tile_train_, self.n_threads_ = best['tile_queries'], best['tile_train'], best['n_threads']
+        logger.debug(f"Motor em blocos afinado: {best}")
+        return best
+
+    def _search(self, X, k, tile_queries, tile_train, exclude_self=False, n_train=None):
+        """Devolve as distâncias ao quadrado e os índices dos k vizinhos mais próximos, ordenados.
+
+        Dentro de cada bloco só se calcula ‖x‖² − 2·q·xᵀ (‖q‖² não altera a ordem e é somado no fim).
+        Depois do primeiro bloco de treino, só as linhas com alguma distância abaixo do pior dos
+        k melhores são juntadas aos candidatos, o que evita particionar a maioria dos blocos.
+        """
+        fit_X, train_norms = self._fit_X, self.train_norms_
+        n_queries = X.shape[0]
+        n_train = fit_X.shape[0] if n_train is None else n_train
+        all_distances = np.empty((n_queries, k))
+        all_indices = np.empty((n_queries, k), dtype=np.intp)
+        for q_start in range(0, n_queries, tile_queries):
+            Q = np.asarray(X[q_start:q_start + tile_queries], dtype=float)
+            scaled_Q = -2.0 * Q
+            rows = np.arange(len(Q))[:, None]
+            best_distances = best_indices = None
+            for t_start in range(0, n_train, tile_train):
+                block = np.asarray(fit_X[t_start:min(t_start + tile_train, n_train)])
+                distances = scaled_Q @ block.T  # Produto por BLAS; a soma das normas é feita no próprio array
+                distances += train_norms[None, t_start:t_start + len(block)]
+                if exclude_self:
+                    # Consulta sobre o próprio treino: cada ponto não é vizinho de si mesmo
+                    own = np.arange(q_start, q_start + len(Q)) - t_start
+                    inside = (own >= 0) & (own < len(block))
+                    distances[np.flatnonzero(inside), own[inside]] = np.inf
+                if best_distances is None:
+                    if len(block) > k:
+                        part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                        best_distances, best_indices = distances[rows, part], part + t_start
+                    else:
+                        best_distances = np.full((len(Q), k), np.inf)
+                        best_indices = np.zeros((len(Q), k), dtype=np.intp)
+                        best_distances[:, :len(block)] = distances
+                        best_indices[:, :len(block)] = np.arange(t_start, t_start + len(block))
+                    continue
+                # Só as linhas cujo mínimo do bloco bate o pior dos k melhores precisam de ser juntadas
+                touched = np.flatnonzero(distances.min(axis=1) < best_distances.max(axis=1))
+                if not len(touched):
+                    continue
+                candidates = np.concatenate([best_distances[touched], distances[touched]], axis=1)
+                top = np.argpartition(candidates, k - 1, axis=1)[:, :k]
+                local = np.arange(len(touched))[:, None]
+                best_distances[touched] = candidates[local, top]
+                # Posições < k vêm dos melhores anteriores; as restantes são colunas do bloco actual
+                best_indices[touched] = np.where(top < k, best_indices[touched][local, np.minimum(top, k - 1)],
+                                                 top - k + t_start)
+            order = np.argsort(best_distances, axis=1, kind='stable')
+            best_distances = best_distances[rows, order] + np.einsum('ij,ij->i', Q, Q)[:, None]
+            all_distances[q_start:q_start + len(Q)] = best_distances
+            all_indices[q_start:q_start + len(Q)] = best_indices[rows, order]
+        np.maximum(all_distances, 0, out=all_distances)  # Corrige erros de arredondamento negativos
+        return all_distances, all_indices
+
+    def kneighbors(self, X=None, n_neighbors=None, return_distance=True):
+        """Encontra os k vizinhos mais próximos, com a mesma interface de KNeighborsClassifier.
+
+        Raises:
+            ValueError: Se k exceder as linhas de treino disponíveis (menos uma quando X é None).
+        """
+        k = n_neighbors or self.n_neighbors
+        exclude_self = X is None
+        available = self.n_samples_fit_ - exclude_self
+        if k > available:
+            raise ValueError(f"Pedidos {k} vizinhos, mas só há {available} linhas de treino disponíveis "
+                             f"(n_samples_fit = {self.n_samples_fit_}).")
+        if exclude_self:
+            X = self._fit_X
+        elif sparse.issparse(X):
+            X = X.toarray()
+        with threadpool_limits(limits=self.n_threads_, user_api='blas'):
+            distances, indices = self._search(np.asarray(X, dtype=float), k, self.tile_queries_, self.tile_train_,
+                                              exclude_self)
+        if return_distance:
+            return np.sqrt(distances), indices
+        return indices
+
+    def predict_proba(self, X):
+        """Probabilidades das classes a partir de uma única pesquisa em blocos."""
+        distances, indices = self.kneighbors(X)
+        return vote_probabilities(self, distances, indices)
+
+    def predict(self, X):
+        """Classe mais votada de cada linha."""
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+class DeduplicatedKNNClassifier(KNeighborsClassifier):
+    """KNN treinado sobre os vectores distintos do treino, cada um com as contagens por classe.
+
+    Linhas de treino iguais depois da normalização (frequentes com poucas colunas de baixa
+    cardinalidade) passam a ser um único ponto. Na previsão, os pontos mais próximos votam
+    com as suas contagens até perfazer k linhas; no ponto que completa as k linhas, as
+    contagens entram na proporção das linhas que faltam.
+
+    É uma aproximação do modelo sem agrupamento: quando várias linhas empatam com o k-ésimo
+    vizinho, o KNeighborsClassifier escolhe algumas delas pela ordem interna do índice, e este
+    modelo usa a proporção de todas. Fora desses empates as previsões são iguais; com eles, as
+    probabilidades (e por vezes a classe prevista) podem diferir.
+    """
+
+    def __init__(self, n_neighbors=5, *, weights='uniform', algorithm='auto', metric='minkowski'):
+        """Inicializa o classificador.
+
+        Args:
+            n_neighbors: Número de linhas de treino que votam (padrão: 5).
+            weights: Pesos dos vizinhos: 'uniform' ou 'distance' (padrão: 'uniform').
+            algorithm: Algoritmo de pesquisa do KNeighborsClassifier (padrão: 'auto').
+            metric: Distância do KNeighborsClassifier (padrão: 'minkowski').
+        """
+        super().__init__(n_neighbors=n_neighbors, weights=weights, algorithm=algorithm, metric=metric)
+
+    def fit(self, X, y):
+        """Agrupa as linhas iguais e treina o índice sobre os pontos distintos.
+
+        Raises:
+            ValueError: Se os dados forem esparsos.
+        """
+        if sparse.issparse(X):
+            raise ValueError("O agrupamento de linhas repetidas exige dados densos.")
+        X = np.asarray(X)
+        points, first_rows, row_points = np.unique(X, axis=0, return_index=True, return_inverse=True)
+        classes, codes = np.unique(np.asarray(y), return_inverse=True)
+        counts = np.zeros((len(points), len(classes)), dtype=np.int64)
+        np.add.at(counts, (row_points.ravel(), codes), 1)
+        super().fit(points, classes[counts.argmax(axis=1)])
+        # A classe maioritária de cada ponto só serve ao fit; os votos usam as contagens completas
+        self.classes_ = classes
+        self._y = counts.argmax(axis=1)
+        self.class_counts_ = counts
+        self.unique_rows_ = first_rows  # Primeira linha de treino de cada ponto
+        self.row_points_ = row_points.ravel()  # Ponto de cada linha de treino
+        self.n_training_rows_ = X.shape[0]
+        return self
+
+    def kneighbors(self, X=None, n_neighbors=None, return_distance=True):
+        """Pontos distintos mais próximos; k é limitado ao número de pontos."""
+        k = min(n_neighbors or self.n_neighbors, self.n_samples_fit_ - (X is None))
+        return super().kneighbors(X, n_neighbors=k, return_distance=return_distance)
+
+    def neighbor_votes(self, indices, distances=None, n_neighbors=None, exclude=None):
+        """Soma os votos das primeiras k linhas de treino representadas pelos pontos vizinhos.
+
+        Args:
+            indices: Pontos vizinhos por ordem de distância (linhas x pontos).
+            distances: Distâncias aos pontos; None vota com pesos uniformes.
+            n_neighbors: Número de linhas que votam; por defeito, o k do modelo.
+            exclude: Par (pontos, classes) com uma linha a descontar por consulta (ex.: leave-one-out).
+
+        Returns:
+            numpy.ndarray: Votos (linhas x classes).
+        """
+        k = n_neighbors or self.n_neighbors
+        counts = self.class_counts_[indices].astype(float)
+        if exclude is not None:
+            points, codes = exclude
+            rows, positions = np.nonzero(indices == np.asarray(points)[:, None])
+            counts[rows, positions, np.asarray(codes)[rows]] -= 1
+        totals = counts.sum(axis=2)
+        before = np.cumsum(totals, axis=1) - totals
+        taken = np.clip(k - before, 0, totals)  # Linhas de cada ponto que entram nas k primeiras
+        with np.errstate(invalid='ignore', divide='ignore'):
+            share = np.where(totals > 0, taken / totals, 0.0)
+        if distances is not None:
+            weights = _neighbor_weights(self.weights, np.where(share > 0, distances, np.inf))
+            share = share * np.nan_to_num(weights)
+        return np.einsum('qp,qpc->qc', share, counts)
+
+    def predict_proba(self, X):
+        """Probabilidades das classes a partir dos votos dos pontos vizinhos."""
+        distances, indices = self.kneighbors(X)
+        return _normalize(self.neighbor_votes(indices, distances))
+
+    def predict(self, X):
+        """Classe mais votada de cada linha."""
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
\ No newline at end of file
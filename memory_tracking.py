@@ -0,0 +1,206 @@
+# memory_tracking.py
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MEMORY_LOG = deque(maxlen=500)  # Últimos registos de memória por operação
+_budget_mb = None  # Orçamento global de memória residente, em MB
+
+class MemoryBudgetError(MemoryError):
+    """Erro levantado quando uma operação termina acima do orçamento de memória."""
+
+def set_memory_budget(budget_mb):
+    """Define o orçamento global de memória residente (None desactiva)."""
+    global _budget_mb
+    _budget_mb = budget_mb
+
+def get_memory_budget():
+    """Devolve o orçamento global de memória residente, em MB, ou None."""
+    return _budget_mb
+
+def current_rss():
+    """Devolve a memória residente do processo em bytes, ou None se não for possível medi-la."""
+    try:
+        with open('/proc/self/statm') as f:  # Linux
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = _Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return int(counters.WorkingSetSize)
+        return None
+    try:
+        import resource
+        # Sem /proc (ex.: macOS) só há o pico; é o melhor limite superior disponível
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+def dataframe_footprint(df):
+    """Calcula a memória profunda ocupada por um DataFrame, por coluna.
+
+    Args:
+        df: DataFrame a medir (ou None).
+
+    Returns:
+        dict: 'total_bytes', 'index_bytes' e 'columns' (coluna -> bytes, por ordem decrescente).
+    """
+    if df is None:
+        return {'total_bytes': 0, 'index_bytes': 0, 'columns': {}}
+    usage = df.memory_usage(deep=True)  # Inclui o conteúdo das strings das colunas object
+    index_bytes = int(usage.get('Index', 0))
+    columns = usage.drop('Index', errors='ignore').sort_values(ascending=False)
+    return {'total_bytes': int(usage.sum()), 'index_bytes': index_bytes,
+            'columns': {col: int(value) for col, value in columns.items()}}
+
+def history_footprint(frames):
+    """Soma a memória profunda de uma lista de DataFrames (ex.: o histórico para desfazer)."""
+    return sum(dataframe_footprint(frame)['total_bytes'] for frame in frames)
+
+def format_bytes(value):
+    """Formata um número de bytes em MB para os registos e a interface."""
+    return "n/d" if value is None else f"{value / (1024 * 1024):.1f} MB"
+
+class MemoryTracker:
+    """Mede a variação de memória residente e o pico do tracemalloc numa operação.
+
+    Pode ser usado com start()/stop() quando o início e o fim da operação estão em
+    métodos diferentes, ou através do gestor de contexto track_memory.
+    """
+
+    def __init__(self, operation, trace=True, budget_mb=None, enforce=False):
+        """Prepara a medição de uma operação.
+
+        Args:
+            operation: Nome da operação (aparece nos registos).
+            trace: Mede também o pico de alocações Python com tracemalloc (padrão: True).
+            budget_mb: Orçamento em MB; por defeito, o orçamento global.
+            enforce: Levanta MemoryBudgetError se a operação terminar acima do orçamento.
+        """
+        self.operation = operation
+        self.trace = trace
+        self.budget_mb = budget_mb
+        self.enforce = enforce
+        self._started_tracing = False
+        self._start = None
+        self._rss_before = None
+
+    def start(self):
+        """Regista o estado de memória no início da operação."""
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+
+                tracemalloc.reset_peak()
+            self._traced_before = tracemalloc.get_traced_memory()[0]
+        self._rss_before = current_rss()
+        self._start = time.perf_counter()
+        return self
+
+    def abort(self):
+        """Pára a medição sem registo (ex.: quando a operação falha)."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def stop(self, df=None, history=None, **context):
+        """Termina a medição, regista e devolve o registo da operação.
+
+        Args:
+            df: DataFrame resultante, cuja memória profunda é incluída no registo.
+            history: Lista de DataFrames guardados (ex.: histórico para desfazer).
+            **context: Informação adicional incluída no registo.
+
+        Returns:
+            dict: Registo com 'operation', 'seconds', 'rss_before', 'rss_after', 'rss_delta',
+                'traced_peak', 'df_bytes', 'history_bytes', 'history_length' e 'over_budget'.
+
+        Raises:
+            MemoryBudgetError: Se enforce=True e a memória residente ultrapassar o orçamento.
+        """
+        rss_after = current_rss()
+        record = {
+            'operation': self.operation,
+            'time': time.time(),
+            'seconds': time.perf_counter() - self._start,
+            'rss_before': self._rss_before,
+            'rss_after': rss_after,
+            'rss_delta': rss_after - self._rss_before if rss_after is not None and self._rss_before is not None else None,
+            'traced_peak': None,
+            'df_bytes': dataframe_footprint(df)['total_bytes'] if df is not None else None,
+            'history_bytes': history_footprint(history) if history is not None else None,
+            'history_length': len(history) if history is not None else None,
+        }
+        if self.trace:
+            # Pico de alocações Python acima do valor inicial (inclui os buffers do NumPy)
+            record['traced_peak'] = max(tracemalloc.get_traced_memory()[1] - self._traced_before, 0)
+            self.abort()
+        record.update(context)
+
+        budget_mb = self.budget_mb if self.budget_mb is not None else _budget_mb
+        record['over_budget'] = bool(budget_mb and rss_after is not None and rss_after > budget_mb * 1024 * 1024)
+        MEMORY_LOG.append(record)
+        logger.info(f"Memória [{self.operation}]: RSS {format_bytes(rss_after)} "
+                    f"(delta {format_bytes(record['rss_delta'])}), pico traçado {format_bytes(record['traced_peak'])}, "
+                    f"DataFrame {format_bytes(record['df_bytes'])}, histórico {format_bytes(record['history_bytes'])}"
+                    f", {record['seconds']:.2f}s")
+        if record['over_budget']:
+            logger.warning(f"Operação '{self.operation}' terminou acima do orçamento de {budget_mb} MB")
+            if self.enforce:
+                raise MemoryBudgetError(f"A operação '{self.operation}' ultrapassou o orçamento de memória "
+                                        f"({format_bytes(rss_after)} > {budget_mb} MB).")
+        return record
+
+@contextmanager
+def track_memory(operation, trace=True, budget_mb=None, enforce=False, **context):
+    """Gestor de contexto que regista a memória usada por uma operação.
+
+    Exemplo:
+        with track_memory('train_model') as tracker:
+            ...
+            tracker.df = df  # Opcional: inclui a memória do DataFrame resultante
+
+    Args:
+        operation: Nome da operação.
+        trace: Mede o pico de alocações com tracemalloc (padrão: True).
+        budget_mb: Orçamento em MB; por defeito, o orçamento global.
+        enforce: Levanta MemoryBudgetError se a operação terminar acima do orçamento.
+        **context: Informação adicional incluída no registo.
+
+    Yields:
+        MemoryTracker: O medidor; os atributos `df` e `history` podem ser definidos dentro do bloco.
+    """
+    tracker = MemoryTracker(operation, trace, budget_mb, enforce).start()
+    tracker.df = None
+    tracker.history = None
+    try:
+        yield tracker
+    except BaseException:
+        tracker.abort()
+        raise
+    tracker.stop(df=tracker.df, history=tracker.history, **context)
+
+def last_record():
+    """Devolve o último registo de memória, ou None."""
+    return MEMORY_LOG[-1] if MEMORY_LOG else None
\ No newline at end of file
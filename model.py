@@ -1,11 +1,24 @@
 # model.py
+import numpy as np
 import pandas as pd
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
+from sklearn.decomposition import PCA
+from sklearn.random_projection import SparseRandomProjection
+from sklearn.pipeline import Pipeline
+from scipy import sparse
 import joblib
+from evaluation import build_evaluation_report
+from knn_engine import BlockedBruteForceKNN, DeduplicatedKNNClassifier, vote_probabilities
+from schema import REASON_COLUMN, ROW_COLUMN
+import os
+import time
 
-def train_and_save_model(df, selected_columns, valid_values, n_neighbors=5):
+BINARY_METRICS = ('jaccard', 'hamming')  # Distâncias sobre indicadores 0/1, sem normalização
+
+def train_and_save_model(df, selected_columns, valid_values, n_neighbors=5, projection=None, projection_target=None,
+                         metric='minkowski', evaluation_max_k=20, engine='sklearn', deduplicate=False):
     """Treina um modelo KNN com as colunas seleccionadas e devolve os resultados.
     
     Args:
@@ -13,9 +26,106 @@ def train_and_save_model(df, selected_columns, valid_values, n_neighbors=5):
         selected_columns: Lista de colunas seleccionadas para o treino.
         valid_values: Dicionário com valores válidos para cada coluna (não usado directamente aqui).
         n_neighbors: Número de vizinhos para o KNN (padrão: 5).
+        projection: Redução de dimensionalidade após a normalização: None, 'pca' ou 'random' (padrão: None).
+        projection_target: Variância explicada (< 1) ou número de dimensões (>= 1) da projecção.
+        metric: Distância do KNN: 'minkowski' (euclidiana, padrão), 'jaccard' ou 'hamming';
+            as duas últimas exigem colunas 0/1 (ex.: encode_multilabel_bits) e não normalizam os dados.
+        evaluation_max_k: Maior k avaliado no relatório de avaliação (padrão: 20).
+        engine: Pesquisa de vizinhos: 'sklearn' (KNeighborsClassifier, padrão) ou 'blocked'
+            (BlockedBruteForceKNN, força bruta em blocos afinada automaticamente; só dados densos e euclidianos).
+        deduplicate: Agrupa as linhas de treino iguais depois da normalização em pontos com contagens
+            por classe (DeduplicatedKNNClassifier), com um índice menor; aproxima o modelo sem
+            agrupamento, do qual difere quando há linhas empatadas com o k-ésimo vizinho (ver
+            DeduplicatedKNNClassifier). Só dados densos e motor 'sklearn' (padrão: False).
+    
+    Returns:
+        tuple: (knn, scaler, accuracy, len(X_train), len(X_test), training_columns); com projecção,
+            `scaler` é um Pipeline que normaliza e projecta. O relatório completo de avaliação
+            (ver evaluation.py) fica em `knn.evaluation_report_` e os valores de 'id' das linhas
+            de treino (ou o índice, sem 'id') em `knn.training_ids_`; com deduplicate, os vizinhos
+            são pontos distintos e `knn.training_ids_` guarda o 'id' da primeira linha de cada ponto.
+    
+    Raises:
+        ValueError: Se 'result' não estiver presente, colunas forem inválidas ou dados inconsistentes.
+    """
+    X_train, X_test, y_train, y_test, training_columns = split_training_data(df, selected_columns)
+    # Identificação original de cada linha de treino, para auditar os vizinhos de cada previsão
+    training_ids = (df.loc[X_train.index, 'id'] if 'id' in df.columns else X_train.index.to_series()).to_numpy()
+    
+    if engine not in ('sklearn', 'blocked'):
+        raise ValueError(f"Motor de pesquisa desconhecido: '{engine}'.")
+    if metric in BINARY_METRICS:
+        if engine != 'sklearn':
+            raise ValueError(f"O motor '{engine}' só suporta a distância euclidiana.")
+        return _train_binary_model(X_train, X_test, y_train, y_test, training_columns, n_neighbors, metric, projection,
+                                   evaluation_max_k, training_ids, deduplicate)
+    if deduplicate and engine != 'sklearn':
+        raise ValueError(f"O agrupamento de linhas repetidas não está disponível com o motor '{engine}'.")
+    
+    # Colunas esparsas (one-hot/hashing) são tratadas como matrizes CSR em todo o percurso
+    is_sparse = has_sparse_columns(X_train)
+    if is_sparse:
+        if engine == 'blocked':
+            raise ValueError("O motor 'blocked' exige dados densos; use o motor 'sklearn' com colunas esparsas.")
+        if deduplicate:
+            raise ValueError("O agrupamento de linhas repetidas exige dados densos; desactive-o com colunas esparsas.")
+        X_train, X_test = to_sparse_matrix(X_train), to_sparse_matrix(X_test)
+    
+    # Normaliza os dados com StandardScaler (seguido da projecção, se pedida)
+    scaler = make_transformer(projection, projection_target, sparse_input=is_sparse)
+    X_train = scaler.fit_transform(X_train)  # Ajusta e transforma o conjunto de treino
+    X_test = scaler.transform(X_test)  # Apenas transforma o conjunto de teste
+    
+    # Cria e treina o modelo KNN (força bruta, que opera directamente sobre matrizes esparsas)
+    if engine == 'blocked':
+        knn = BlockedBruteForceKNN(n_neighbors=n_neighbors)
+    elif deduplicate:
+        knn = DeduplicatedKNNClassifier(n_neighbors=n_neighbors)
+    else:
+        knn = KNeighborsClassifier(n_neighbors=n_neighbors, algorithm='brute' if is_sparse else 'auto')
+    knn.fit(X_train, y_train)
+    knn.sparse_input_ = is_sparse  # Indica a predict_new_client que deve converter as entradas para CSR
+    knn.training_ids_ = training_ids[knn.unique_rows_] if deduplicate else training_ids
+    
+    # Acurácia e restantes métricas a partir de um único grafo de vizinhos do conjunto de teste
+    knn.evaluation_report_ = build_evaluation_report(knn, X_train, y_train, X_test, y_test, max_k=evaluation_max_k)
+    accuracy = knn.evaluation_report_['accuracy']
+    return knn, scaler, accuracy, X_train.shape[0], X_test.shape[0], training_columns
+
+def _train_binary_model(X_train, X_test, y_train, y_test, training_columns, n_neighbors, metric, projection,
+                        evaluation_max_k=20, training_ids=None, deduplicate=False):
+    """Treina um KNN com distância de Jaccard ou Hamming sobre colunas indicadoras 0/1."""
+    if projection is not None:
+        raise ValueError(f"A distância '{metric}' não pode ser combinada com uma projecção.")
+    for col in training_columns:
+        if not X_train[col].isin([0, 1]).all() or not X_test[col].isin([0, 1]).all():
+            raise ValueError(f"A distância '{metric}' exige colunas 0/1; a coluna '{col}' tem outros valores.")
+    
+    # Normalizador identidade: mantém a interface de predict_new_client sem alterar os bits
+    scaler = StandardScaler(with_mean=False, with_std=False)
+    X_train = scaler.fit_transform(X_train).astype(bool)
+    X_test = scaler.transform(X_test).astype(bool)
+    
+    if deduplicate:
+        knn = DeduplicatedKNNClassifier(n_neighbors=n_neighbors, metric=metric, algorithm='brute')
+    else:
+        knn = KNeighborsClassifier(n_neighbors=n_neighbors, metric=metric, algorithm='brute')
+    knn.fit(X_train, y_train)
+    knn.sparse_input_ = False
+    knn.training_ids_ = training_ids[knn.unique_rows_] if deduplicate and training_ids is not None else training_ids
+    knn.evaluation_report_ = build_evaluation_report(knn, X_train, y_train, X_test, y_test, max_k=evaluation_max_k)
+    accuracy = knn.evaluation_report_['accuracy']
+    return knn, scaler, accuracy, X_train.shape[0], X_test.shape[0], training_columns
+
+def split_training_data(df, selected_columns):
+    """Valida as colunas seleccionadas e divide os dados em treino e teste.
+    
+    Args:
+        df: DataFrame de entrada com os dados a treinar.
+        selected_columns: Lista de colunas seleccionadas para o treino.
     
     Returns:
-        tuple: (knn, scaler, accuracy, len(X_train), len(X_test), training_columns)
+        tuple: (X_train, X_test, y_train, y_test, training_columns), sem normalização.
     
     Raises:
         ValueError: Se 'result' não estiver presente, colunas forem inválidas ou dados inconsistentes.
@@ -25,6 +135,8 @@ def train_and_save_model(df, selected_columns, valid_values, n_neighbors=5):
     
     train_data = df.copy()  # Cria uma cópia para evitar modificar o original
     training_columns = list(set(col for col in selected_columns if col not in ['id', 'result']))  # Exclui 'id' e 'result'
+    # Ordena as colunas densas antes das esparsas, a ordem usada pelas matrizes CSR
+    training_columns.sort(key=lambda col: isinstance(train_data[col].dtype, pd.SparseDtype))
     
     if not training_columns:
         raise ValueError("Nenhuma coluna válida seleccionada além de 'id' e 'result'.")
@@ -44,33 +156,289 @@ def train_and_save_model(df, selected_columns, valid_values, n_neighbors=5):
     
     # Divide os dados em conjuntos de treino e teste (25% para teste)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42)
+    return X_train, X_test, y_train, y_test, training_columns
+
+def has_sparse_columns(X):
+    """Indica se um DataFrame tem colunas esparsas (pd.SparseDtype)."""
+    return any(isinstance(dtype, pd.SparseDtype) for dtype in X.dtypes)
+
+def to_sparse_matrix(X):
+    """Converte um DataFrame com colunas densas seguidas de esparsas numa matriz CSR.
     
-    # Normaliza os dados com StandardScaler
-    scaler = StandardScaler()
-    X_train = scaler.fit_transform(X_train)  # Ajusta e transforma o conjunto de treino
-    X_test = scaler.transform(X_test)  # Apenas transforma o conjunto de teste
+    Args:
+        X: DataFrame com as colunas densas antes das esparsas (ordem de split_training_data).
     
-    # Cria e treina o modelo KNN
-    knn = KNeighborsClassifier(n_neighbors=n_neighbors)
-    knn.fit(X_train, y_train)
+    Returns:
+        scipy.sparse.csr_matrix com as colunas pela mesma ordem.
+    """
+    sparse_columns = [col for col in X.columns if isinstance(X[col].dtype, pd.SparseDtype)]
+    dense_columns = [col for col in X.columns if col not in sparse_columns]
+    blocks = []
+    if dense_columns:
+        blocks.append(sparse.csr_matrix(X[dense_columns].to_numpy(dtype=float)))
+    if sparse_columns:
+        blocks.append(X[sparse_columns].sparse.to_coo().astype(float))
+    return sparse.hstack(blocks, format='csr')
+
+def make_transformer(projection=None, projection_target=None, sparse_input=False):
+    """Cria o normalizador do modelo, opcionalmente seguido de uma redução de dimensionalidade.
+    
+    Args:
+        projection: None, 'pca' ou 'random' (projecção aleatória esparsa).
+        projection_target: Para PCA, variância explicada (< 1) ou dimensões (>= 1), padrão 0.95;
+            para a projecção aleatória, número de dimensões (obrigatório).
+        sparse_input: Se True, a normalização não centra os dados, preservando a esparsidade.
+    
+    Returns:
+        StandardScaler ou Pipeline (StandardScaler + projecção).
+    
+    Raises:
+        ValueError: Se a projecção for desconhecida ou o alvo inválido.
+    """
+    if projection is None:
+        return StandardScaler(with_mean=not sparse_input)
+    if projection == 'pca':
+        if sparse_input:
+            raise ValueError("A PCA não suporta colunas esparsas; use a projecção aleatória.")
+        target = 0.95 if projection_target is None else projection_target
+        n_components = target if target < 1 else int(target)
+        return Pipeline([('scaler', StandardScaler()), ('projection', PCA(n_components=n_components, random_state=42))])
+    if projection == 'random':
+        if projection_target is None or projection_target < 1:
+            raise ValueError("A projecção aleatória requer um número de dimensões (>= 1).")
+        return Pipeline([('scaler', StandardScaler(with_mean=not sparse_input)),
+                         ('projection', SparseRandomProjection(n_components=int(projection_target), random_state=42))])
+    raise ValueError(f"Projecção desconhecida: '{projection}'.")
+
+def evaluate_projection_tradeoff(df, selected_columns, n_neighbors=5, projection='pca', targets=None):
+    """Compara a acurácia e a latência de previsão do KNN para vários alvos de projecção.
+    
+    Args:
+        df: DataFrame de entrada com os dados a treinar.
+        selected_columns: Lista de colunas seleccionadas para o treino.
+        n_neighbors: Número de vizinhos para o KNN (padrão: 5).
+        projection: 'pca' ou 'random' (padrão: 'pca').
+        targets: Alvos a comparar; por defeito, variâncias 0.8–0.99 (PCA) ou 1/4–3/4 das dimensões (aleatória).
+    
+    Returns:
+        list: Um dict por alvo (mais a linha de base sem projecção) com 'target', 'dimensions',
+            'accuracy' e 'latency_ms' (tempo de previsão por 1000 linhas).
+    """
+    X_train, X_test, y_train, y_test, training_columns = split_training_data(df, selected_columns)
+    n_dims = len(training_columns)
+    if targets is None:
+        if projection == 'pca':
+            targets = [0.8, 0.9, 0.95, 0.99]
+        else:
+            targets = sorted({max(1, n_dims * share // 4) for share in (1, 2, 3)})
     
-    accuracy = knn.score(X_test, y_test)  # Calcula a acurácia no conjunto de teste
-    return knn, scaler, accuracy, len(X_train), len(X_test), training_columns
+    is_sparse = has_sparse_columns(X_train)
+    if is_sparse:
+        X_train, X_test = to_sparse_matrix(X_train), to_sparse_matrix(X_test)
+    
+    report = []
+    for projection_name, target in [(None, None)] + [(projection, target) for target in targets]:
+        transformer = make_transformer(projection_name, target, sparse_input=is_sparse)
+        X_train_t = transformer.fit_transform(X_train)
+        X_test_t = transformer.transform(X_test)
+        knn = KNeighborsClassifier(n_neighbors=n_neighbors).fit(X_train_t, y_train)
+        knn.predict(X_test_t[:1])  # Aquece o modelo para não contar custos de inicialização
+        start = time.perf_counter()
+        predictions = knn.predict(X_test_t)
+        elapsed = time.perf_counter() - start
+        report.append({
+            'target': target,
+            'dimensions': X_train_t.shape[1],
+            'accuracy': float((predictions == np.asarray(y_test)).mean()),
+            'latency_ms': elapsed * 1000 / X_test_t.shape[0] * 1000
+        })
+    return report
 
-def predict_new_client(new_data, knn, scaler, training_columns):
+def predict_new_client(new_data, knn, scaler, training_columns, cache=None, model_version=0, return_neighbors=False):
     """Faz previsões para uma ou várias linhas de dados usando o modelo treinado.
     
+    As previsões, as probabilidades e os vizinhos saem de uma única pesquisa kneighbors.
+    
     Args:
         new_data: Lista ou array com os dados a prever.
         knn: Modelo KNN treinado.
         scaler: Normalizador usado no treino.
         training_columns: Lista de colunas usadas no treino.
+        cache: PredictionCache opcional para reutilizar previsões de vectores repetidos.
+        model_version: Versão do modelo, usada na chave da cache (padrão: 0).
+        return_neighbors: Devolve também os vizinhos que decidiram cada previsão (padrão: False).
+    
+    Returns:
+        tuple: (predictions, probabilities) com previsões e probabilidades; com return_neighbors,
+            (predictions, probabilities, neighbors), em que neighbors é um dict com 'indices'
+            (posições no treino), 'ids' (valores de 'id' do treino) e 'distances', cada um (linhas x k).
+    """
+    if cache is None:
+        predictions, probabilities, distances, indices = _predict_rows(new_data, knn, scaler, training_columns)
+    else:
+        rows = np.asarray(new_data, dtype=float)
+        keys = [cache.make_key(model_version, row) for row in rows]
+        results = [cache.get(key) for key in keys]
+        
+        # Agrupa as linhas em falta por chave para calcular cada vector distinto uma única vez
+        pending = {}
+        for i, (key, result) in enumerate(zip(keys, results)):
+            if result is None:
+                pending.setdefault(key, []).append(i)
+        if pending:
+            first_rows = [positions[0] for positions in pending.values()]
+            computed = zip(*_predict_rows(rows[first_rows], knn, scaler, training_columns))
+            for (key, positions), result in zip(pending.items(), computed):
+                cache.put(key, result)  # Os vizinhos ficam em cache com a previsão
+                for i in positions:
+                    results[i] = result
+        predictions, probabilities, distances, indices = (np.array(values) for values in zip(*results))
+    
+    if not return_neighbors:
+        return predictions, probabilities
+    training_ids = getattr(knn, 'training_ids_', None)  # Modelos antigos não guardam os ids
+    neighbors = {'indices': indices, 'ids': training_ids[indices] if training_ids is not None else indices,
+                 'distances': distances}
+    return predictions, probabilities, neighbors
+
+def _predict_rows(new_data, knn, scaler, training_columns):
+    """Normaliza as linhas e calcula previsões, probabilidades e vizinhos sem usar a cache.
     
     Returns:
-        tuple: (predictions, probabilities) com previsões e probabilidades.
+        tuple: (predictions, probabilities, distances, indices).
     """
     new_df = pd.DataFrame(new_data, columns=training_columns)  # Converte os dados num DataFrame
+    if getattr(knn, 'sparse_input_', False):
+        new_df = sparse.csr_matrix(new_df.to_numpy(dtype=float))  # O modelo foi treinado com matrizes CSR
     new_data_scaled = scaler.transform(new_df)  # Normaliza os novos dados
-    predictions = knn.predict(new_data_scaled)  # Gera as previsões
-    probabilities = knn.predict_proba(new_data_scaled)  # Calcula as probabilidades
-    return predictions, probabilities
\ No newline at end of file
+    if knn.metric in BINARY_METRICS:
+        new_data_scaled = new_data_scaled.astype(bool)  # Distâncias binárias operam sobre bits
+    distances, indices = knn.kneighbors(new_data_scaled)  # Única pesquisa de vizinhos
+    probabilities = vote_probabilities(knn, distances, indices)
+    predictions = knn.classes_[probabilities.argmax(axis=1)]
+    return predictions, probabilities, distances, indices
+
+def predict_test_data(test_df, knn, scaler, training_columns, include_neighbors=False, cache=None, model_version=0,
+                      features=None):
+    """Devolve um DataFrame de teste já validado com as colunas de previsão acrescentadas.
+    
+    Args:
+        test_df: DataFrame de teste com as colunas de treino numéricas e sem nulos (não é alterado).
+        knn: Modelo KNN treinado.
+        scaler: Normalizador usado no treino.
+        training_columns: Lista de colunas usadas no treino.
+        include_neighbors: Acrescenta os ids e as distâncias dos vizinhos, separados por ';' (padrão: False).
+        cache: PredictionCache opcional para reutilizar previsões de vectores repetidos.
+        model_version: Versão do modelo, usada na chave da cache (padrão: 0).
+        features: Matriz já convertida das colunas de treino, pela ordem de training_columns, usada só
+            na previsão; por defeito, os valores de test_df[training_columns]. test_df sai inalterado.
+    
+    Returns:
+        DataFrame: Cópia de test_df com 'prediction' e 'probability' (e, opcionalmente, os vizinhos).
+    """
+    features = test_df[training_columns].values if features is None else features
+    predictions, probabilities, neighbors = predict_new_client(features, knn, scaler,
+                                                               training_columns, cache=cache, model_version=model_version,
+                                                               return_neighbors=True)
+    output = test_df.copy()
+    output['prediction'] = predictions
+    output['probability'] = [prob[1] for prob in probabilities]
+    if include_neighbors:
+        # Vizinhos da mesma pesquisa que produziu as previsões, separados por ';'
+        output['neighbor_ids'] = [";".join(map(str, ids)) for ids in neighbors['ids']]
+        output['neighbor_distances'] = [";".join(f"{d:.6g}" for d in row) for row in neighbors['distances']]
+    return output
+
+def score_test_csv(file_name, knn, scaler, training_columns, schema, output_file=None, quarantine_file=None,
+                   chunksize=50000, include_neighbors=False, cache=None, model_version=0):
+    """Valida e prevê um CSV de teste por blocos, pondo as linhas inválidas em quarentena.
+    
+    Cada bloco é validado pelo esquema; as linhas aceites são previstas e acrescentadas ao
+    ficheiro de previsões e as rejeitadas ao ficheiro de quarentena, com a linha de origem e
+    o motivo. Só a falta de colunas obrigatórias impede o ficheiro inteiro.
+    
+    Args:
+        file_name: Caminho do CSV de teste.
+        knn: Modelo KNN treinado.
+        scaler: Normalizador usado no treino.
+        training_columns: Lista de colunas usadas no treino.
+        schema: ScoringSchema do modelo.
+        output_file: Ficheiro de previsões; por defeito, '<nome>_predictions.csv'.
+        quarantine_file: Ficheiro de quarentena; por defeito, '<nome>_quarantine.csv'.
+        chunksize: Linhas por bloco (padrão: 50000).
+        include_neighbors: Acrescenta os vizinhos às previsões (padrão: False).
+        cache: PredictionCache opcional para reutilizar previsões de vectores repetidos.
+        model_version: Versão do modelo, usada na chave da cache (padrão: 0).
+    
+    Returns:
+        dict: 'rows', 'scored', 'quarantined', 'output_file', 'quarantine_file' (None se não
+            houver linhas rejeitadas) e 'reasons' (contagem de linhas rejeitadas por coluna).
+    
+    Raises:
+        ValueError: Se faltarem colunas obrigatórias no CSV.
+    """
+    output_file = output_file or file_name.replace('.csv', '_predictions.csv')
+    quarantine_file = quarantine_file or file_name.replace('.csv', '_quarantine.csv')
+    missing = schema.missing_columns(pd.read_csv(file_name, nrows=0).columns)
+    if missing:
+        raise ValueError(f"Colunas em falta no CSV de teste: {', '.join(missing)}")
+    
+    summary = {'rows': 0, 'scored': 0, 'quarantined': 0, 'output_file': output_file, 'quarantine_file': None,
+               'reasons': {}}
+    if os.path.exists(quarantine_file):
+        os.remove(quarantine_file)  # A quarentena de uma execução anterior não se aplica a esta
+    with pd.read_csv(file_name, chunksize=chunksize) as reader:
+        for i, chunk in enumerate(reader):
+            chunk.index = pd.RangeIndex(summary['rows'], summary['rows'] + len(chunk))  # Linha no ficheiro
+            values, good, reasons = schema.check(chunk)
+            accepted = chunk[good]
+            if len(accepted):
+                # Os valores convertidos (o bloco pode ter vindo como texto) só servem à previsão; a saída
+                # mantém as colunas tal como estão no ficheiro (ex.: inteiros sem '.0')
+                features = values[good][:, [schema.columns.index(col) for col in training_columns]]
+                output = predict_test_data(accepted, knn, scaler, training_columns, include_neighbors=include_neighbors,
+                                           cache=cache, model_version=model_version, features=features)
+            else:
+                output = accepted.assign(prediction=[], probability=[])
+            output.to_csv(output_file, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            if len(reasons):
+                rejected = chunk[~good].copy()
+                rejected.insert(0, ROW_COLUMN, rejected.index)
+                rejected[REASON_COLUMN] = reasons.reindex(rejected.index)
+                first = summary['quarantine_file'] is None
+                rejected.to_csv(quarantine_file, mode='w' if first else 'a', header=first, index=False)
+                summary['quarantine_file'] = quarantine_file
+                for reason in reasons:
+                    for column in {item.split(':', 1)[0] for item in reason.split('; ')}:
+                        summary['reasons'][column] = summary['reasons'].get(column, 0) + 1
+            summary['rows'] += len(chunk)
+            summary['scored'] += int(good.sum())
+            summary['quarantined'] += int((~good).sum())
+    if summary['rows'] == 0:
+        pd.read_csv(file_name, nrows=0).assign(prediction=[], probability=[]).to_csv(output_file, index=False)
+    return summary
+
+def load_model_bundle(model_file, include_dataframe=False):
+    """Carrega um modelo guardado e os ficheiros .pkl associados.
+    
+    Args:
+        model_file: Caminho do ficheiro knn_model.pkl.
+        include_dataframe: Se True, carrega também dataframe.pkl (padrão: False).
+    
+    Returns:
+        dict: Chaves 'knn', 'scaler', 'training_columns', 'valid_values' e, opcionalmente, 'df'.
+    
+    Raises:
+        ValueError: Se algum dos ficheiros associados não existir.
+    """
+    names = [('scaler', 'scaler.pkl'), ('training_columns', 'training_columns.pkl'), ('valid_values', 'valid_values.pkl')]
+    if include_dataframe:
+        names.insert(2, ('df', 'dataframe.pkl'))
+    
+    bundle = {'knn': joblib.load(model_file, mmap_mode='r')}  # Mapeia a matriz de treino em disco
+    for key, suffix in names:
+        file_path = model_file.replace('knn_model.pkl', suffix)
+        if not os.path.exists(file_path):
+            raise ValueError(f"Ficheiro {os.path.basename(file_path)} não encontrado.")
+        bundle[key] = joblib.load(file_path)
+    return bundle
\ No newline at end of file
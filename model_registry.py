@@ -0,0 +1,258 @@
+# model_registry.py
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import joblib
+from model import load_model_bundle
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = 'models'  # Pasta do registo: uma subpasta por modelo
+EVICTION_POLICIES = ('lru', 'largest')  # Menos usado recentemente ou maior primeiro
+PRELOAD_POLICIES = ('none', 'recent', 'all')
+MODEL_FILES = (('knn', 'knn_model.pkl'), ('scaler', 'scaler.pkl'), ('training_columns', 'training_columns.pkl'),
+               ('valid_values', 'valid_values.pkl'))  # Ficheiros carregados para prever
+_VALID_NAME = re.compile(r'^\w[\w.-]*$')  # Sem '.' inicial: exclui '..' e as pastas temporárias
+
+class ModelRegistry:
+    """Registo de modelos em disco com uma cache LRU de modelos carregados, limitada em memória.
+
+    Cada modelo fica em `<root>/<nome>/` com os mesmos ficheiros .pkl de save_model e um
+    metadata.json (colunas, k, acurácia, tamanho e data de criação). Os modelos carregados
+    ficam em memória até o orçamento ser ultrapassado; a política de descarte e a de
+    pré-carregamento são configuráveis.
+    """
+
+    def __init__(self, root=REGISTRY_DIR, memory_budget_mb=512, eviction='lru', preload='none', preload_count=3):
+        """Inicializa o registo (a pasta é criada no primeiro registo).
+
+        Args:
+            root: Pasta do registo (padrão: 'models').
+            memory_budget_mb: Memória máxima dos modelos carregados, em MB (padrão: 512).
+            eviction: Política de descarte: 'lru' ou 'largest' (padrão: 'lru').
+            preload: Pré-carregamento em preload_models: 'none', 'recent' ou 'all' (padrão: 'none').
+            preload_count: Número de modelos pré-carregados com 'recent' (padrão: 3).
+
+        Raises:
+            ValueError: Se alguma política for desconhecida.
+        """
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"Política de descarte desconhecida: '{eviction}'.")
+        if preload not in PRELOAD_POLICIES:
+            raise ValueError(f"Política de pré-carregamento desconhecida: '{preload}'.")
+        self.root = root
+        self.memory_budget_mb = memory_budget_mb
+        self.eviction = eviction
+        self.preload = preload
+        self.preload_count = preload_count
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loaded = OrderedDict()  # Nome -> (bundle, bytes estimados), do menos ao mais recente
+        self._lock = threading.RLock()  # O scoring em lote pode pedir modelos de outras threads
+
+    def _model_dir(self, name):
+        """Pasta de um modelo, validando o nome."""
+        if not _VALID_NAME.match(name or ''):
+            raise ValueError(f"Nome de modelo inválido: '{name}' (comece por letra, número ou '_' e use também '-' ou '.').")
+        return os.path.join(self.root, name)
+
+    def register(self, name, knn, scaler, training_columns, valid_values, df=None, overwrite=False):
+        """Guarda um modelo no registo e devolve os seus metadados.
+
+        Args:
+            name: Nome do modelo (nome da subpasta).
+            knn: Modelo KNN treinado.
+            scaler: Normalizador usado no treino.
+            training_columns: Colunas usadas no treino.
+            valid_values: Valores válidos das colunas.
+            df: DataFrame a guardar com o modelo, opcional (não é carregado pela cache).
+            overwrite: Substitui um modelo existente com o mesmo nome (padrão: False).
+
+        Returns:
+            dict: Metadados do modelo.
+
+        Raises:
+            ValueError: Se o nome for inválido ou já existir e overwrite for False.
+        """
+        model_dir = self._model_dir(name)
+        if os.path.exists(model_dir) and not overwrite:
+            raise ValueError(f"Já existe um modelo com o nome '{name}'.")
+        # Escreve numa pasta temporária e só depois a coloca no lugar, para nunca deixar um modelo incompleto
+        staging_dir = os.path.join(self.root, f".{name}.tmp")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        objects = {'knn': knn, 'scaler': scaler, 'training_columns': training_columns, 'valid_values': valid_values}
+        memory_bytes = 0
+        for key, file_name in MODEL_FILES:
+            file_path = os.path.join(staging_dir, file_name)
+            joblib.dump(objects[key], file_path)
+            memory_bytes += os.path.getsize(file_path)  # O tamanho em disco aproxima a memória dos arrays
+        size_bytes = memory_bytes
+        if df is not None:
+            joblib.dump(df, os.path.join(staging_dir, 'dataframe.pkl'))
+            size_bytes += os.path.getsize(os.path.join(staging_dir, 'dataframe.pkl'))
+
+        report = getattr(knn, 'evaluation_report_', None) or {}
+        metadata = {
+            'name': name,
+            'columns': list(training_columns),
+            'n_neighbors': int(knn.n_neighbors),
+            'accuracy': report.get('accuracy'),
+            'model_class': type(knn).__name__,
+            'n_points': int(knn.n_samples_fit_),
+            'size_bytes': int(size_bytes),
+            'memory_bytes': int(memory_bytes),
+            'has_dataframe': df is not None,
+            'created_at': datetime.now().isoformat(),
+        }
+        with open(os.path.join(staging_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+        with self._lock:
+            self.evict(name)  # Uma versão anterior em memória deixa de ser válida
+            if os.path.exists(model_dir):
+                shutil.rmtree(model_dir)
+            os.replace(staging_dir, model_dir)
+        logger.info(f"Modelo '{name}' registado em {model_dir}")
+        return metadata
+
+    def metadata(self, name):
+        """Devolve os metadados de um modelo.
+
+        Raises:
+            ValueError: Se o modelo não existir.
+        """
+        path = os.path.join(self._model_dir(name), 'metadata.json')
+        if not os.path.exists(path):
+            raise ValueError(f"Modelo '{name}' não encontrado no registo.")
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def list_models(self):
+        """Lista os metadados dos modelos registados, do mais recente ao mais antigo."""
+        if not os.path.isdir(self.root):
+            return []
+        models = []
+        for name in os.listdir(self.root):
+            if name.startswith('.') or not os.path.exists(os.path.join(self.root, name, 'metadata.json')):
+                continue  # Ignora pastas temporárias e pastas alheias ao registo
+            try:
+                models.append(self.metadata(name))
+            except (ValueError, OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Metadados ilegíveis do modelo '{name}': {str(e)}")
+        return sorted(models, key=lambda item: item['created_at'], reverse=True)
+
+    def get(self, name):
+        """Devolve um modelo carregado, da cache ou do disco.
+
+        Returns:
+            dict: 'knn', 'scaler', 'training_columns', 'valid_values' e 'metadata'.
+
+        Raises:
+            ValueError: Se o modelo não existir ou faltar algum ficheiro.
+        """
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)  # Marca como usado recentemente
+                self.hits += 1
+                return self._loaded[name][0]
+            self.misses += 1
+            metadata = self.metadata(name)
+            bundle = load_model_bundle(os.path.join(self._model_dir(name), 'knn_model.pkl'))
+            bundle['metadata'] = metadata
+            self._store(name, bundle, metadata['memory_bytes'])
+            return bundle
+
+    def _store(self, name, bundle, size):
+        """Guarda um modelo na cache e descarta outros até respeitar o orçamento."""
+        budget = self.memory_budget_mb * 1024 * 1024
+        if size > budget:
+            logger.warning(f"O modelo '{name}' ({size} bytes) excede o orçamento da cache e não fica em memória")
+            return
+        self._loaded[name] = (bundle, size)
+        while self.memory_used() > budget:
+            self.evict(self._eviction_candidate(exclude=name))
+
+    def _eviction_candidate(self, exclude):
+        """Escolhe o modelo a descartar segundo a política configurada."""
+        candidates = [name for name in self._loaded if name != exclude]
+        if self.eviction == 'largest':
+            return max(candidates, key=lambda name: self._loaded[name][1])
+        return candidates[0]  # O OrderedDict está ordenado do menos ao mais recente
+
+    def evict(self, name):
+        """Retira um modelo da memória (o registo em disco mantém-se)."""
+        with self._lock:
+            if self._loaded.pop(name, None) is not None:
+                self.evictions += 1
+                logger.debug(f"Modelo '{name}' retirado da cache de modelos")
+
+    def clear(self):
+        """Retira todos os modelos da memória."""
+        with self._lock:
+            self._loaded.clear()
+
+    def remove(self, name):
+        """Apaga um modelo do registo e da memória.
+
+        Raises:
+            ValueError: Se o modelo não existir.
+        """
+        model_dir = self._model_dir(name)
+        if not os.path.isdir(model_dir):
+            raise ValueError(f"Modelo '{name}' não encontrado no registo.")
+        self.evict(name)
+        shutil.rmtree(model_dir)
+        logger.info(f"Modelo '{name}' removido do registo")
+
+    def set_memory_budget(self, memory_budget_mb):
+        """Altera o orçamento da cache, descartando modelos se necessário."""
+        with self._lock:
+            self.memory_budget_mb = memory_budget_mb
+            while self._loaded and self.memory_used() > memory_budget_mb * 1024 * 1024:
+                self.evict(self._eviction_candidate(exclude=None))
+
+    def preload_models(self):
+        """Carrega modelos para a cache segundo a política de pré-carregamento.
+
+        Com 'recent', carrega os `preload_count` modelos mais recentes; com 'all', todos os que
+        couberem no orçamento, do mais recente ao mais antigo.
+
+        Returns:
+            list: Nomes dos modelos em memória após o pré-carregamento.
+        """
+        if self.preload == 'none':
+            return []
+        models = self.list_models()
+        if self.preload == 'recent':
+            models = models[:self.preload_count]
+        budget = self.memory_budget_mb * 1024 * 1024
+        used = self.memory_used()
+        for metadata in models:
+            if used + metadata['memory_bytes'] > budget:
+                continue  # Não descarta modelos já carregados só para pré-carregar outros
+            try:
+                self.get(metadata['name'])
+                used = self.memory_used()
+            except ValueError as e:
+                logger.warning(f"Pré-carregamento do modelo '{metadata['name']}' falhou: {str(e)}")
+        return list(self._loaded)
+
+    def memory_used(self):
+        """Memória estimada dos modelos carregados, em bytes."""
+        return sum(size for _, size in self._loaded.values())
+
+    def stats(self):
+        """Devolve as estatísticas da cache de modelos.
+
+        Returns:
+            dict: Modelos carregados, memória usada, acertos, falhas e descartes.
+        """
+        return {'loaded': list(self._loaded), 'memory_bytes': self.memory_used(), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
\ No newline at end of file
@@ -0,0 +1,186 @@
+# out_of_core.py
+import logging
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+import pandas as pd
+from sklearn import config_context
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+SPLIT_BUCKETS = 10000  # Resolução da divisão treino/teste por hash
+
+def estimate_row_bytes(file_name, usecols=None, sample_rows=1000):
+    """Estima a memória ocupada por linha do CSV a partir de uma amostra inicial.
+
+    Args:
+        file_name: Caminho do ficheiro CSV.
+        usecols: Colunas a considerar (padrão: todas).
+        sample_rows: Número de linhas da amostra (padrão: 1000).
+
+    Returns:
+        float: Bytes por linha estimados (memória profunda do DataFrame).
+    """
+    sample = pd.read_csv(file_name, usecols=usecols, nrows=sample_rows)
+    if sample.empty:
+        return 1.0
+    return max(sample.memory_usage(deep=True).sum() / len(sample), 1.0)
+
+def chunk_rows_for_budget(file_name, memory_budget_mb, usecols=None, fraction=0.25):
+    """Calcula o número de linhas por bloco para respeitar um orçamento de memória.
+
+    Args:
+        file_name: Caminho do ficheiro CSV.
+        memory_budget_mb: Orçamento total de memória em MB.
+        usecols: Colunas a ler (padrão: todas).
+        fraction: Fracção do orçamento reservada a cada bloco (padrão: 0.25).
+
+    Returns:
+        int: Linhas por bloco (pelo menos 1000).
+    """
+    row_bytes = estimate_row_bytes(file_name, usecols)
+    return max(int(memory_budget_mb * 1024 * 1024 * fraction / row_bytes), 1000)
+
+def iter_csv_chunks(file_name, usecols=None, chunksize=None, memory_budget_mb=512):
+    """Lê um CSV em blocos de tamanho limitado.
+
+    Args:
+        file_name: Caminho do ficheiro CSV.
+        usecols: Colunas a ler (padrão: todas).
+        chunksize: Linhas por bloco; se None, é calculado a partir do orçamento de memória.
+        memory_budget_mb: Orçamento de memória em MB usado para calcular o bloco (padrão: 512).
+
+    Yields:
+        DataFrame: Próximo bloco do ficheiro, com índice global das linhas.
+    """
+    if chunksize is None:
+        chunksize = chunk_rows_for_budget(file_name, memory_budget_mb, usecols)
+    logger.debug(f"A ler '{file_name}' em blocos de {chunksize} linhas")
+    with pd.read_csv(file_name, usecols=usecols, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+def hash_split(chunk, test_size=0.25, key_column='id', seed=42):
+    """Divide um bloco em treino e teste de forma determinística por hash.
+
+    A mesma linha (identificada por `key_column`, ou pelo índice global) cai sempre
+    no mesmo conjunto, independentemente do tamanho dos blocos ou da ordem de leitura.
+
+    Args:
+        chunk: Bloco do DataFrame.
+        test_size: Fracção aproximada das linhas para teste (padrão: 0.25).
+        key_column: Coluna usada como chave do hash (padrão: 'id').
+        seed: Semente do hash (padrão: 42).
+
+    Returns:
+        numpy.ndarray: Máscara booleana das linhas de teste.
+    """
+    keys = chunk[key_column] if key_column in chunk.columns else chunk.index.to_series()
+    hashes = pd.util.hash_pandas_object(keys, index=False, hash_key=f"{seed:016d}").to_numpy()
+    return (hashes % SPLIT_BUCKETS) < int(test_size * SPLIT_BUCKETS)
+
+def _validate_chunk(chunk, training_columns):
+    """Valida que as colunas de treino de um bloco são numéricas e sem nulos."""
+    for col in training_columns:
+        if not pd.api.types.is_numeric_dtype(chunk[col]):
+            raise ValueError(f"Coluna '{col}' contém valores não numéricos.")
+        if chunk[col].isnull().any():
+            raise ValueError(f"Coluna '{col}' contém valores NaN.")
+
+def train_out_of_core(file_name, selected_columns, n_neighbors=5, memory_budget_mb=512, work_dir=None, test_size=0.25):
+    """Treina um modelo KNN a partir de um CSV maior do que a memória disponível.
+
+    O ficheiro é lido em três passagens por blocos: ajuste incremental do
+    StandardScaler, escrita da matriz de treino normalizada num ficheiro mapeado
+    em memória e avaliação por blocos do conjunto de teste. A pesquisa de vizinhos
+    lê directamente do ficheiro mapeado.
+
+    Args:
+        file_name: Caminho do CSV de treino (com as colunas já numéricas).
+        selected_columns: Colunas seleccionadas, incluindo 'result'.
+        n_neighbors: Número de vizinhos para o KNN (padrão: 5).
+        memory_budget_mb: Orçamento de memória em MB (padrão: 512).
+        work_dir: Directório para a matriz mapeada; por defeito, um directório temporário que é
+            removido quando o modelo devolvido é descartado ou à saída do interpretador.
+        test_size: Fracção das linhas para teste (padrão: 0.25).
+
+    Returns:
+        tuple: (knn, scaler, accuracy, n_train, n_test, training_columns), como em train_and_save_model.
+
+    Raises:
+        ValueError: Se 'result' não for seleccionada, as colunas forem inválidas ou o ficheiro estiver vazio.
+    """
+    if 'result' not in selected_columns:
+        raise ValueError("A coluna 'result' é obrigatória no DataFrame e na selecção.")
+    training_columns = [col for col in dict.fromkeys(selected_columns) if col not in ['id', 'result']]
+    if not training_columns:
+        raise ValueError("Nenhuma coluna válida seleccionada além de 'id' e 'result'.")
+
+    header = pd.read_csv(file_name, nrows=0).columns
+    missing = [col for col in training_columns + ['result'] if col not in header]
+    if missing:
+        raise ValueError(f"Colunas em falta no CSV: {', '.join(missing)}")
+    usecols = training_columns + ['result'] + (['id'] if 'id' in header else [])
+    chunksize = chunk_rows_for_budget(file_name, memory_budget_mb, usecols)
+
+    # 1.ª passagem: ajuste incremental do normalizador e contagem das linhas
+    scaler = StandardScaler()
+    n_train = n_test = 0
+    label_dtype = id_dtype = None
+    for chunk in iter_csv_chunks(file_name, usecols, chunksize):
+        _validate_chunk(chunk, training_columns)
+        chunk_dtype = chunk['result'].to_numpy().dtype
+        label_dtype = chunk_dtype if label_dtype is None else np.result_type(label_dtype, chunk_dtype)
+        chunk_ids = (chunk['id'] if 'id' in chunk else chunk.index).to_numpy().dtype
+        id_dtype = chunk_ids if id_dtype is None else np.result_type(id_dtype, chunk_ids)
+        test_mask = hash_split(chunk, test_size)
+        if (~test_mask).any():
+            scaler.partial_fit(chunk.loc[~test_mask, training_columns])
+        n_train += int((~test_mask).sum())
+        n_test += int(test_mask.sum())
+    if n_train == 0 or n_test == 0:
+        raise ValueError("O DataFrame está vazio após as transformações.")
+
+    # 2.ª passagem: escreve a matriz de treino normalizada em disco
+    owns_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='knn_ooc_')
+    X_path = os.path.join(work_dir, 'X_train.mmap')
+    X_train = np.memmap(X_path, dtype='float64', mode='w+', shape=(n_train, len(training_columns)))
+    y_train = np.empty(n_train, dtype=label_dtype)
+    training_ids = np.empty(n_train, dtype=id_dtype)  # 'id' de cada linha de treino, ou a sua posição no ficheiro
+    position = 0
+    for chunk in iter_csv_chunks(file_name, usecols, chunksize):
+        train_rows = chunk[~hash_split(chunk, test_size)]
+        size = len(train_rows)
+        X_train[position:position + size] = scaler.transform(train_rows[training_columns])
+        y_train[position:position + size] = train_rows['result'].to_numpy()
+        training_ids[position:position + size] = (train_rows['id'] if 'id' in train_rows else train_rows.index).to_numpy()
+        position += size
+    X_train.flush()
+    del X_train  # Liberta as páginas escritas antes de reabrir só para leitura
+    X_train = np.memmap(X_path, dtype='float64', mode='r', shape=(n_train, len(training_columns)))
+
+    # A força bruta pesquisa directamente na matriz mapeada, sem construir cópias em árvore
+    knn = KNeighborsClassifier(n_neighbors=n_neighbors, algorithm='brute')
+    knn.fit(X_train, y_train)
+    knn.training_ids_ = training_ids
+    if owns_work_dir:
+        # O modelo é o dono da matriz mapeada: ao ser substituído, o directório temporário desaparece
+        weakref.finalize(knn, shutil.rmtree, work_dir, True)
+
+    # 3.ª passagem: avalia o conjunto de teste por blocos, limitando a memória das distâncias
+    correct = 0
+    with config_context(working_memory=max(memory_budget_mb // 4, 16)):
+        for chunk in iter_csv_chunks(file_name, usecols, chunksize):
+            test_rows = chunk[hash_split(chunk, test_size)]
+            if test_rows.empty:
+                continue
+            predictions = knn.predict(scaler.transform(test_rows[training_columns]))
+            correct += int((predictions == test_rows['result'].to_numpy()).sum())
+    accuracy = correct / n_test
+    logger.debug(f"Treino fora da memória concluído: {n_train} treino, {n_test} teste, matriz em '{X_path}'")
+    return knn, scaler, accuracy, n_train, n_test, training_columns
\ No newline at end of file
@@ -0,0 +1,82 @@
+# prediction_cache.py
+from collections import OrderedDict
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class PredictionCache:
+    """Cache LRU limitada para previsões de vectores de atributos repetidos.
+
+    As entradas são indexadas pela versão do modelo e pelo vector de atributos
+    (exacto ou quantizado), pelo que um modelo novo nunca reutiliza previsões antigas.
+    """
+
+    def __init__(self, max_size=10000, decimals=None):
+        """Inicializa a cache vazia.
+
+        Args:
+            max_size: Número máximo de vectores guardados (padrão: 10000).
+            decimals: Casas decimais para quantizar os vectores; None usa o valor exacto.
+        """
+        self.max_size = max_size
+        self.decimals = decimals
+        self.hits = 0  # Contador de acertos
+        self.misses = 0  # Contador de falhas
+        self._entries = OrderedDict()
+
+    def make_key(self, model_version, row):
+        """Gera a chave da cache para um vector de atributos.
+
+        Args:
+            model_version: Versão do modelo que produz a previsão.
+            row: Vector de atributos (lista ou array).
+
+        Returns:
+            tuple: Chave imutável (versão, bytes do vector).
+        """
+        values = np.asarray(row, dtype=float)
+        if self.decimals is not None:
+            values = np.round(values, self.decimals)  # Quantiza para agrupar vectores quase iguais
+        values = values + 0.0  # Normaliza -0.0 para 0.0
+        return (model_version, values.tobytes())
+
+    def get(self, key):
+        """Devolve a previsão guardada para a chave ou None, actualizando os contadores."""
+        if key in self._entries:
+            self._entries.move_to_end(key)  # Marca como usada recentemente
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Guarda uma previsão, descartando a entrada menos usada se a cache estiver cheia."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Esvazia a cache e repõe os contadores (usado ao treinar ou carregar um modelo)."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        logger.debug("Cache de previsões invalidada")
+
+    def stats(self):
+        """Devolve as estatísticas de utilização da cache.
+
+        Returns:
+            dict: Tamanho actual, acertos, falhas e taxa de acerto.
+        """
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def __len__(self):
+        return len(self._entries)
\ No newline at end of file
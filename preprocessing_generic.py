@@ -1,6 +1,14 @@
 # preprocessing_generic.py
+import re
+import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 from sklearn.preprocessing import LabelEncoder
+from sketches import ColumnSketch
+
+REFERENCE_YEAR = 2025  # Ano de referência para idades (o mesmo usado em calculate_age)
+REFERENCE_DATE = pd.Timestamp('2025-01-01')  # Data de referência para dias decorridos
+DOTTED_DATE = re.compile(r'^(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?$')  # dd.mm.aaaa ou dd.mm (data parcial)
 
 def convert_to_numeric(df, column):
     """Converte uma coluna para tipo numérico, substituindo valores inválidos por NaN.
@@ -15,18 +23,26 @@ def convert_to_numeric(df, column):
     df[column] = pd.to_numeric(df[column], errors='coerce')  # Força conversão, valores inválidos tornam-se NaN
     return df
 
-def fill_missing_values(df, column, method='median'):
+def fill_missing_values(df, column, method='median', sketch=None, approximate=False):
     """Preenche valores nulos numa coluna com o método especificado.
     
     Args:
         df: DataFrame de entrada.
         column: Nome da coluna a preencher.
         method: Método de preenchimento ('mean', 'median', 'mode'; padrão: 'median').
+        sketch: ColumnSketch opcional da coluna (ver sketches.py); se indicado, a mediana e a moda
+            são aproximadas a partir dele em vez de recalculadas sobre a coluna inteira.
+        approximate: Sem `sketch`, constrói um ColumnSketch da coluna recebida; é a forma como os
+            passos aproximados ficam registados na receita (padrão: False).
     
     Returns:
         DataFrame com valores nulos preenchidos.
     """
-    if method == 'mean':
+    if sketch is None and approximate:
+        sketch = ColumnSketch().update(df[column])
+    if sketch is not None:
+        fill_value = {'mean': sketch.mean, 'median': sketch.median, 'mode': sketch.mode}[method]()
+    elif method == 'mean':
         fill_value = df[column].mean()  # Usa a média da coluna
     elif method == 'median':
         fill_value = df[column].median()  # Usa a mediana da coluna
@@ -49,6 +65,78 @@ def encode_categorical(df, column):
     df[column] = encoder.fit_transform(df[column].astype(str))  # Converte para string antes de codificar
     return df
 
+def encode_one_hot_sparse(df, column, top_n=50, categories=None):
+    """Substitui uma coluna categórica por colunas indicadoras esparsas (one-hot).
+    
+    Apenas as `top_n` categorias mais frequentes recebem coluna própria; as restantes
+    e os nulos vão para a coluna '<coluna>__other', limitando a dimensionalidade.
+    
+    Args:
+        df: DataFrame de entrada.
+        column: Nome da coluna a codificar.
+        top_n: Número máximo de categorias com coluna própria (padrão: 50).
+        categories: Categorias fixas (texto, incluindo 'other' se existir), pela ordem das colunas;
+            substituem as mais frequentes, para que os mesmos passos dêem as mesmas colunas
+            noutros dados (ex.: a pré-visualização e o conjunto completo). Valores fora delas vão
+            para 'other', ou ficam a zero se 'other' não estiver entre as categorias.
+    
+    Returns:
+        DataFrame sem a coluna original e com as colunas '<coluna>__<categoria>' (Sparse[uint8]).
+    """
+    if categories is None:
+        top_values = df[column].value_counts().index[:top_n]  # Categorias mais frequentes
+        capped = df[column].where(df[column].isin(top_values), 'other').astype(str)  # Agrupa as restantes em 'other'
+    else:
+        labels = df[column].astype(str)
+        named = [category for category in categories if category != 'other']
+        capped = labels.where(df[column].notna() & labels.isin(named), 'other')
+        capped = pd.Series(pd.Categorical(capped, categories=list(categories)), index=df.index)
+    dummies = pd.get_dummies(capped, prefix=column, prefix_sep='__', sparse=True, dtype=np.uint8)
+    return pd.concat([df.drop(columns=[column]), dummies], axis=1)
+
+def encode_hashing_sparse(df, column, n_features=32):
+    """Substitui uma coluna categórica por `n_features` colunas esparsas obtidas por hashing.
+    
+    Cada valor é atribuído a um balde pelo seu hash, pelo que o número de colunas é fixo
+    e igual entre ficheiros de treino e de teste, mesmo com categorias novas.
+    
+    Args:
+        df: DataFrame de entrada.
+        column: Nome da coluna a codificar.
+        n_features: Número de baldes (padrão: 32).
+    
+    Returns:
+        DataFrame sem a coluna original e com as colunas '<coluna>__h<i>' (Sparse[uint8]).
+    """
+    buckets = pd.util.hash_array(df[column].astype(str).to_numpy(dtype=object)) % n_features  # Hash determinístico
+    buckets = pd.Categorical(buckets, categories=range(n_features))  # Garante todas as colunas, mesmo vazias
+    dummies = pd.get_dummies(buckets, prefix=f"{column}__h", prefix_sep='', sparse=True, dtype=np.uint8)
+    dummies.index = df.index
+    return pd.concat([df.drop(columns=[column]), dummies], axis=1)
+
+def encode_multilabel_bits(df, column, sep=';', max_labels=16):
+    """Substitui uma coluna multi-etiqueta (ex.: 'Русский;English') por indicadores uint8.
+    
+    A coluna é processada com operações vectorizadas de texto e o vocabulário fica
+    limitado às `max_labels` etiquetas mais frequentes. Os indicadores resultantes
+    são adequados às distâncias de Jaccard ou Hamming no KNN.
+    
+    Args:
+        df: DataFrame de entrada.
+        column: Nome da coluna a separar.
+        sep: Separador das etiquetas (padrão: ';').
+        max_labels: Número máximo de etiquetas no vocabulário (padrão: 16).
+    
+    Returns:
+        DataFrame sem a coluna original e com as colunas '<coluna>__<etiqueta>' (uint8).
+    """
+    values = df[column].fillna('').astype(str).str.replace(rf"\s*{re.escape(sep)}\s*", sep, regex=True).str.strip()
+    labels = values.str.split(sep).explode()
+    vocabulary = labels[labels != ''].value_counts().index[:max_labels]  # Etiquetas mais frequentes
+    indicators = values.str.get_dummies(sep=sep).reindex(columns=vocabulary, fill_value=0).astype(np.uint8)
+    indicators.columns = [f"{column}__{label}" for label in vocabulary]
+    return pd.concat([df.drop(columns=[column]), indicators], axis=1)
+
 def convert_to_datetime(df, column):
     """Converte uma coluna para formato datetime, substituindo valores inválidos por NaT.
     
@@ -59,26 +147,111 @@ def convert_to_datetime(df, column):
     Returns:
         DataFrame com a coluna convertida.
     """
-    df[column] = pd.to_datetime(df[column], errors='coerce')  # Converte para datetime, inválidos tornam-se NaT
+    codes, uniques = pd.factorize(df[column])  # Cada valor distinto é convertido uma única vez
+    parsed = _parse_unique_datetimes(pd.Series(uniques, dtype=object))
+    df[column] = pd.Series(parsed.to_numpy()[codes], index=df.index).where(codes >= 0)  # Inválidos e nulos tornam-se NaT
     return df
 
-def remove_outliers(df, column):
+def _parse_unique_datetimes(values, date_format=None):
+    """Converte valores distintos para datetime com um formato explícito ou inferido.
+
+    Os valores que não seguem o formato inferido são convertidos sem formato, como antes.
+    """
+    text = values.astype(str)
+    if date_format is None and len(values):
+        date_format = guess_datetime_format(text.iloc[0])
+    if date_format is None:
+        return pd.to_datetime(text, errors='coerce')
+    parsed = pd.to_datetime(text, format=date_format, errors='coerce')
+    failed = parsed.isna() & values.notna()
+    if failed.any():
+        parsed[failed] = pd.to_datetime(text[failed], errors='coerce', format='mixed')
+    return parsed
+
+def extract_date_features(df, column, date_format=None, reference_year=REFERENCE_YEAR, reference_date=REFERENCE_DATE):
+    """Substitui uma coluna de datas por atributos numéricos, convertendo cada valor distinto uma única vez.
+    
+    Aceita datas no formato dd.mm.aaaa, incluindo datas parciais sem ano (ex.: '11.4', como em
+    'bdate'), e datas completas com formato explícito ou inferido (ex.: 'last_seen'). Cria as colunas
+    '<coluna>_year', '<coluna>_month', '<coluna>_age', '<coluna>_days_since' e '<coluna>_partial';
+    os atributos que não podem ser calculados (ex.: idade de uma data parcial) ficam a NaN.
+    
+    Args:
+        df: DataFrame de entrada.
+        column: Nome da coluna de datas.
+        date_format: Formato strftime das datas completas; None infere o formato.
+        reference_year: Ano usado para calcular a idade (padrão: 2025).
+        reference_date: Data usada para calcular os dias decorridos (padrão: 2025-01-01).
+    
+    Returns:
+        DataFrame com os atributos de data no lugar da coluna original.
+    """
+    codes, uniques = pd.factorize(df[column])
+    uniques = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    parts = uniques.str.extract(DOTTED_DATE)
+    dotted = parts[0].notna()
+    
+    day = pd.to_numeric(parts[0], errors='coerce')
+    month = pd.to_numeric(parts[1], errors='coerce')
+    year = pd.to_numeric(parts[2], errors='coerce')
+    partial = dotted & year.isna()
+    dates = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day}).where(dotted & ~partial),
+                           errors='coerce')
+    if (~dotted).any():
+        dates[~dotted] = _parse_unique_datetimes(uniques[~dotted], date_format)
+        year = year.where(dotted, dates.dt.year)
+        month = month.where(dotted, dates.dt.month)
+    
+    year = year.where(year.between(1900, reference_year))  # Anos fora do intervalo são inválidos
+    month = month.where(month.between(1, 12))
+    features = pd.DataFrame({
+        f"{column}_year": year,
+        f"{column}_month": month,
+        f"{column}_age": reference_year - year,
+        f"{column}_days_since": (reference_date - dates).dt.days,
+        f"{column}_partial": partial.astype(float)
+    })
+    
+    # Espalha os atributos dos valores distintos por todas as linhas (nulos ficam a NaN)
+    values = features.to_numpy(dtype=float)[codes]
+    values[codes < 0] = np.nan
+    result = pd.DataFrame(values, columns=features.columns, index=df.index)
+    return pd.concat([df.drop(columns=[column]), result], axis=1)
+
+def remove_outliers(df, column, sketch=None, approximate=False):
     """Remove valores extremos de uma coluna numérica usando o método IQR.
     
     Args:
         df: DataFrame de entrada.
         column: Nome da coluna a analisar.
+        sketch: ColumnSketch opcional da coluna; se indicado, os quartis são aproximados a partir dele.
+        approximate: Sem `sketch`, constrói um ColumnSketch da coluna recebida (padrão: False).
     
     Returns:
         DataFrame sem valores extremos na coluna especificada.
     """
-    Q1 = df[column].quantile(0.25)  # Primeiro quartil
-    Q3 = df[column].quantile(0.75)  # Terceiro quartil
+    if sketch is None and approximate:
+        sketch = ColumnSketch().update(df[column])
+    source = sketch if sketch is not None else df[column]
+    Q1 = source.quantile(0.25)  # Primeiro quartil
+    Q3 = source.quantile(0.75)  # Terceiro quartil
     IQR = Q3 - Q1  # Intervalo interquartil
     lower_bound = Q1 - 1.5 * IQR  # Limite inferior
     upper_bound = Q3 + 1.5 * IQR  # Limite superior
     return df[(df[column] >= lower_bound) & (df[column] <= upper_bound)]  # Filtra valores dentro dos limites
 
+def remove_nulls(df, column):
+    """Remove as linhas com valores nulos numa coluna.
+    
+    Args:
+        df: DataFrame de entrada.
+        column: Nome da coluna a analisar.
+    
+    Returns:
+        DataFrame sem as linhas com nulos na coluna especificada.
+    """
+    return df.dropna(subset=[column])  # Remove linhas com nulos na coluna
+
 def update_valid_values(df):
     """Calcula os valores válidos para cada coluna do DataFrame.
     
@@ -99,4 +272,12 @@ def update_valid_values(df):
             except (ValueError, TypeError):
                 unique_values = [str(val) for val in unique_values]  # Usa string se a conversão falhar
             valid_values[col] = sorted(unique_values)  # Armazena valores ordenados
-    return valid_values
\ No newline at end of file
+    return valid_values
+
+# As transformações genéricas só lêem a coluna recebida; a cache de transformações (TransformCache)
+# pode assim ignorar alterações às outras colunas
+for _function in (convert_to_numeric, fill_missing_values, encode_categorical, encode_one_hot_sparse,
+                  encode_hashing_sparse, encode_multilabel_bits, convert_to_datetime, extract_date_features,
+                  remove_outliers, remove_nulls):
+    _function.reads = ()
+del _function
\ No newline at end of file
@@ -0,0 +1,390 @@
+# preprocessing_pipeline.py
+import ast
+import inspect
+import logging
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Funções que removem linhas: alteram o índice de todo o DataFrame e não podem correr em paralelo
+ROW_FILTERING_FUNCTIONS = {'remove_outliers', 'remove_nulls'}
+
+# Chamadas e atributos que dependem de várias linhas ao mesmo tempo: impedem a execução sobre valores distintos
+AGGREGATE_NAMES = {
+    'mean', 'median', 'mode', 'quantile', 'sum', 'std', 'var', 'min', 'max', 'count', 'nunique', 'value_counts',
+    'unique', 'describe', 'rank', 'shift', 'diff', 'pct_change', 'cumsum', 'cumprod', 'cummax', 'cummin', 'rolling',
+    'expanding', 'ewm', 'groupby', 'sort_values', 'sort_index', 'drop_duplicates', 'duplicated', 'dropna', 'sample',
+    'head', 'tail', 'fit', 'fit_transform', 'corr', 'cov', 'idxmax', 'idxmin', 'len', 'iloc', 'index', 'shape',
+    'transform', 'factorize', 'qcut', 'cut'
+}
+
+def make_step(function, column, **params):
+    """Cria um passo de pré-processamento para uma receita.
+
+    Args:
+        function: Função com assinatura (df, column, ...) de preprocessing_generic ou preprocessing_custom.
+        column: Coluna a transformar.
+        **params: Parâmetros adicionais da função (ex.: method='median').
+
+    Returns:
+        dict: Passo com as chaves 'function', 'column' e 'params'.
+    """
+    return {'function': function, 'column': column, 'params': params}
+
+def get_function_source(function):
+    """Devolve o código fonte de uma função, ou None se não estiver disponível."""
+    source = getattr(function, '__source__', None)  # Funções compiladas dinamicamente guardam o código aqui
+    if source is None:
+        try:
+            source = inspect.getsource(function)
+        except (OSError, TypeError):
+            return None
+    return textwrap.dedent(source)
+
+def detect_column_reads(function, columns):
+    """Detecta colunas lidas por uma função através de literais usados como índice.
+
+    Procura expressões como row['occupation_type'] ou df['day'] no código fonte e
+    mantém apenas os nomes que existem no DataFrame. Uma função pode declarar as
+    suas leituras explicitamente com o atributo `reads`.
+
+    Args:
+        function: Função a analisar.
+        columns: Colunas existentes no DataFrame.
+
+    Returns:
+        set: Colunas lidas, ou None se o código fonte não puder ser analisado.
+    """
+    declared = getattr(function, 'reads', None)
+    if declared is not None:
+        return set(declared)
+    source = get_function_source(function)
+    if source is None:
+        return None
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    reads = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Constant):
+            if isinstance(node.slice.value, str) and node.slice.value in columns:
+                reads.add(node.slice.value)
+    return reads
+
+def plan_stages(steps, columns):
+    """Agrupa os passos em estágios cujos passos são independentes entre si.
+
+    Dois passos são dependentes se um lê uma coluna que o outro escreve. Passos que
+    removem linhas, cujo código não pode ser analisado ou que criam colunas novas
+    funcionam como barreiras e correm sozinhos, preservando a ordem da receita. Uma função
+    pode declarar no atributo `writes` colunas existentes que altera sem as ler; as escritas
+    não declaradas são detectadas por apply_steps ao juntar os resultados.
+
+    Args:
+        steps: Lista de passos criados com make_step.
+        columns: Colunas existentes no DataFrame antes da receita.
+
+    Returns:
+        list: Lista de estágios; cada estágio é um dict com 'steps' (índices) e 'barrier'.
+    """
+    columns = set(columns)
+    stages = []
+    step_stage = []  # Estágio atribuído a cada passo
+    step_reads = []
+    last_barrier = -1
+    for i, step in enumerate(steps):
+        function, column = step['function'], step['column']
+        extra_reads = detect_column_reads(function, columns)
+        is_barrier = (function.__name__ in ROW_FILTERING_FUNCTIONS or getattr(function, 'filters_rows', False)
+                      or extra_reads is None or column not in columns)
+        reads = {column} | (extra_reads or set()) | set(getattr(function, 'writes', ()))
+        step_reads.append(reads)
+
+        if is_barrier:
+            stages.append({'steps': [i], 'barrier': True})
+            last_barrier = len(stages) - 1
+            step_stage.append(last_barrier)
+            continue
+
+        # O estágio mínimo é o seguinte ao último passo anterior com que partilha colunas
+        stage = last_barrier + 1
+        for j in range(i):
+            if step_reads[j] & reads:
+                stage = max(stage, step_stage[j] + 1)
+        while len(stages) <= stage:
+            stages.append({'steps': [], 'barrier': False})
+        stages[stage]['steps'].append(i)
+        step_stage.append(stage)
+    return [stage for stage in stages if stage['steps']]
+
+def _run_on_subframe(function, column, params, subframe):
+    """Executa um passo sobre um sub-DataFrame com as colunas que lê."""
+    result = function(subframe, column, **params)
+    if result is None:
+        raise ValueError(f"A função {function.__name__} retornou None. Ela deve retornar um DataFrame.")
+    return result
+
+def _merge_result(df, subframe_columns, result):
+    """Copia as colunas produzidas por um passo para o DataFrame completo."""
+    if not result.index.equals(df.index):
+        raise ValueError("Um passo paralelo alterou as linhas do DataFrame; declare-o com filters_rows = True.")
+    for col in result.columns:
+        df[col] = result[col]
+    removed = [col for col in subframe_columns if col not in result.columns]
+    if removed:
+        df = df.drop(columns=removed)
+    return df
+
+def _run_step(step, frame, cache):
+    """Executa um passo no processo actual, reutilizando o resultado da cache de transformações se existir."""
+    if cache is None:
+        return _run_on_subframe(step['function'], step['column'], step['params'], frame)
+    result, _ = cache.run(frame, step['function'], step['column'], step['params'],
+                          compute=lambda: _run_on_subframe(step['function'], step['column'], step['params'], frame))
+    return result
+
+def apply_steps(df, steps, max_workers=None, use_processes=False, cache=None):
+    """Aplica uma receita de passos de pré-processamento, em paralelo onde é seguro.
+
+    Cada passo independente corre numa cópia das colunas que lê; os resultados são
+    juntos ao DataFrame na ordem da receita, pelo que o resultado é igual ao da
+    aplicação sequencial.
+
+    Args:
+        df: DataFrame de entrada (não é modificado).
+        steps: Lista de passos criados com make_step.
+        max_workers: Número máximo de threads ou processos (padrão: definido pelo executor).
+        use_processes: Usa um ProcessPoolExecutor em vez de threads (as funções devem ser importáveis).
+        cache: TransformCache opcional; os passos já calculados sobre os mesmos dados não são repetidos.
+
+    Returns:
+        DataFrame com todos os passos aplicados.
+    """
+    df = df.copy()
+    stages = plan_stages(steps, df.columns)
+    logger.debug(f"Receita de {len(steps)} passos dividida em {len(stages)} estágios")
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+
+    for stage in stages:
+        stage_steps = [steps[i] for i in stage['steps']]
+        if stage['barrier'] or len(stage_steps) == 1:
+            for step in stage_steps:
+                df = _run_step(step, df, cache)
+            continue
+
+        columns = list(df.columns)
+        subframe_columns = []
+        for step in stage_steps:
+            reads = {step['column']} | detect_column_reads(step['function'], columns)
+            subframe_columns.append([col for col in columns if col in reads])
+
+        results, retry = [], []  # Os resultados só são juntos depois de verificadas as escritas
+        with executor_class(max_workers=max_workers) as executor:
+            pending = []  # (passo, colunas, cópia da entrada, chave, resultado da cache ou futuro)
+            for step, cols in zip(stage_steps, subframe_columns):
+                subframe = df[cols].copy()
+                key = cache.make_key(subframe, step['function'], step['column'], step['params']) if cache is not None else None
+                cached = cache.get(key, subframe)[0] if key is not None else None
+                work = cached if cached is not None else executor.submit(
+                    _run_on_subframe, step['function'], step['column'], step['params'], subframe)
+                pending.append((step, cols, cache.snapshot(subframe) if key is not None else None, key, work))
+            for step, cols, original, key, work in pending:
+                if isinstance(work, pd.DataFrame):
+                    results.append((step, cols, work))
+                    continue
+                try:
+                    result = work.result()
+                except KeyError as e:
+                    # A função lê uma coluna que a análise estática não detectou
+                    logger.warning(f"Passo '{step['function'].__name__}' leu a coluna {e} não detectada; repetido sequencialmente")
+                    retry.append(step)
+                    continue
+                if key is not None:
+                    cache.put(key, original, result)
+                results.append((step, cols, result))
+
+        # Um passo só vê as colunas que lê; se devolver outra coluna já existente, escreveu-a sem o declarar
+        foreign = {step['function'].__name__: [col for col in result.columns if col in columns and col not in cols]
+                   for step, cols, result in results}
+        foreign = {name: cols for name, cols in foreign.items() if cols}
+        if foreign:
+            logger.warning(f"Passos que escrevem colunas não detectadas ({foreign}); estágio repetido sequencialmente")
+            for step in stage_steps:
+                df = _run_step(step, df, cache)
+            continue
+        for step, cols, result in results:
+            df = _merge_result(df, cols, result)
+        for step in retry:
+            df = _run_step(step, df, cache)
+    return df
+
+def check_elementwise(function, columns):
+    """Verifica se uma função (df, column) calcula cada linha apenas a partir dos valores dessa linha.
+
+    Uma função pode declarar-se com o atributo `elementwise` (True ou False). Caso contrário,
+    o código é analisado: são rejeitadas funções que filtram linhas, cujas leituras não podem
+    ser detectadas ou que usam agregações sobre a coluna (ex.: median, value_counts, len).
+
+    Args:
+        function: Função a analisar.
+        columns: Colunas existentes no DataFrame.
+
+    Returns:
+        tuple: (elementwise, motivo), com o motivo quando a função não é elemento a elemento.
+    """
+    declared = getattr(function, 'elementwise', None)
+    if declared is not None:
+        return bool(declared), None if declared else "declarada com elementwise = False"
+    if function.__name__ in ROW_FILTERING_FUNCTIONS or getattr(function, 'filters_rows', False):
+        return False, "remove linhas"
+    if detect_column_reads(function, columns) is None:
+        return False, "código fonte indisponível"
+    try:
+        tree = ast.parse(get_function_source(function))  # Com `reads` declarado, o código pode não existir
+    except (OSError, TypeError, SyntaxError):
+        return False, "código fonte indisponível"
+    for node in ast.walk(tree):
+        name = node.attr if isinstance(node, ast.Attribute) else node.id if isinstance(node, ast.Name) else None
+        if name in AGGREGATE_NAMES:
+            return False, f"usa '{name}', que depende de várias linhas"
+    return True, None
+
+def _unique_frame(df, key_columns):
+    """Devolve os códigos de cada linha e o DataFrame das combinações distintas das colunas lidas."""
+    if len(key_columns) == 1:
+        codes, _ = pd.factorize(df[key_columns[0]], use_na_sentinel=False)  # Os nulos formam o seu próprio grupo
+    else:
+        codes = df.groupby(key_columns, dropna=False, sort=False).ngroup().to_numpy()
+    first_rows = pd.Series(range(len(df))).groupby(codes, sort=True).first().to_numpy()
+    return codes, df[key_columns].iloc[first_rows].reset_index(drop=True)
+
+def apply_on_uniques(df, function, column, params=None, verify_rows=200, random_state=42):
+    """Executa uma função elemento a elemento sobre os valores distintos e espalha o resultado pelas linhas.
+
+    A função recebe um DataFrame com uma linha por combinação distinta das colunas que lê;
+    o resultado é espalhado pelos códigos de factorização. Uma amostra de linhas é também
+    calculada directamente para confirmar que os resultados coincidem.
+
+    Args:
+        df: DataFrame de entrada (não é modificado).
+        function: Função com assinatura (df, column, ...).
+        column: Coluna a transformar.
+        params: Parâmetros adicionais da função.
+        verify_rows: Linhas da amostra de verificação (0 desactiva; padrão: 200).
+        random_state: Semente da amostra de verificação (padrão: 42).
+
+    Returns:
+        tuple: (DataFrame transformado, tempos) com os segundos e o número de linhas da chamada
+            sobre os valores distintos ('unique_seconds', 'unique_rows') e da amostra ('sample_seconds', 'sample_rows').
+
+    Raises:
+        ValueError: Se a função alterar o número de linhas ou a verificação falhar.
+    """
+    params = params or {}
+    reads = {column} | (detect_column_reads(function, df.columns) or set())
+    key_columns = [col for col in df.columns if col in reads]
+    codes, uniques = _unique_frame(df, key_columns)
+
+    start = time.perf_counter()
+    result = function(uniques.copy(), column, **params)
+    timings = {'unique_seconds': time.perf_counter() - start, 'unique_rows': len(uniques),
+               'sample_seconds': 0.0, 'sample_rows': min(verify_rows, len(df))}
+    if result is None:
+        raise ValueError(f"A função {function.__name__} retornou None. Ela deve retornar um DataFrame.")
+    if len(result) != len(uniques):
+        raise ValueError(f"A função {function.__name__} alterou o número de linhas; não é elemento a elemento.")
+
+    output = df.copy()
+    for col in result.columns:
+        output[col] = result[col].iloc[codes].set_axis(df.index)  # Espalha pelos códigos, mantendo o tipo
+    removed = [col for col in key_columns if col not in result.columns]
+    if removed:
+        output = output.drop(columns=removed)
+
+    if timings['sample_rows']:
+        sample = df.sample(n=timings['sample_rows'], random_state=random_state)
+        start = time.perf_counter()
+        expected = function(sample.copy(), column, **params)
+        timings['sample_seconds'] = time.perf_counter() - start
+        try:
+            pd.testing.assert_frame_equal(output.loc[sample.index, expected.columns], expected, check_dtype=False)
+        except AssertionError:
+            raise ValueError(f"A função {function.__name__} deu resultados diferentes sobre os valores distintos.")
+    return output, timings
+
+def _estimate_row_seconds(timings, n_rows):
+    """Estima o tempo da execução linha a linha a partir das duas chamadas medidas.
+
+    As duas medições (valores distintos e amostra) definem uma recta tempo = fixo + custo * linhas,
+    que separa o custo fixo da chamada do custo por linha.
+    """
+    x0, y0 = timings['sample_rows'], timings['sample_seconds']
+    x1, y1 = timings['unique_rows'], timings['unique_seconds']
+    if x0 == x1:
+        return y0 * n_rows / max(x0, 1)
+    per_row = max((y1 - y0) / (x1 - x0), 0.0)
+    return max(y0 + per_row * (n_rows - x0), y0)
+
+def run_custom_function(df, function, column, max_unique_ratio=0.5, cache=None, **params):
+    """Aplica uma função personalizada, sobre os valores distintos quando isso é seguro e compensa.
+
+    Args:
+        df: DataFrame de entrada.
+        function: Função com assinatura (df, column, ...).
+        column: Coluna a transformar.
+        max_unique_ratio: Fracção máxima de valores distintos por linha para usar o atalho (padrão: 0.5).
+        cache: TransformCache opcional, consultada antes de executar e actualizada depois.
+        **params: Parâmetros adicionais da função.
+
+    Returns:
+        tuple: (DataFrame transformado, relatório) com 'mode' ('uniques', 'rows' ou 'cache'), 'reason',
+            'rows', 'uniques', 'seconds' e 'speedup' estimado face à execução linha a linha; com
+            'cache', 'reason' indica o nível ('memory' ou 'disk') de onde veio o resultado.
+    """
+    report = {'mode': 'rows', 'reason': None, 'rows': len(df), 'uniques': None, 'seconds': 0.0, 'speedup': None}
+    key = cache.make_key(df, function, column, params) if cache is not None else None
+    if key is not None:
+        start = time.perf_counter()
+        result, source = cache.get(key, df)
+        if result is not None:
+            report.update(mode='cache', reason=source, seconds=time.perf_counter() - start)
+            logger.debug(f"'{function.__name__}' reutilizada da cache de transformações ({source})")
+            return result, report
+        original = cache.snapshot(df)
+
+    elementwise, reason = check_elementwise(function, df.columns)
+    if elementwise:
+        reads = {column} | (detect_column_reads(function, df.columns) or set())
+        n_uniques = len(df[[col for col in df.columns if col in reads]].drop_duplicates())
+        report['uniques'] = n_uniques
+        if n_uniques > max_unique_ratio * len(df):
+            reason = f"{n_uniques} valores distintos em {len(df)} linhas"
+        else:
+            start = time.perf_counter()
+            try:
+                result, timings = apply_on_uniques(df, function, column, params)
+            except (ValueError, KeyError) as e:
+                reason = str(e)
+            else:
+                report['seconds'] = time.perf_counter() - start - timings['sample_seconds']
+                if timings['sample_rows']:
+                    report['speedup'] = _estimate_row_seconds(timings, len(df)) / max(report['seconds'], 1e-9)
+                report['mode'] = 'uniques'
+                logger.debug(f"'{function.__name__}' executada sobre {n_uniques} valores distintos em "
+                             f"{report['seconds']:.4f}s (aceleração estimada {report['speedup']})")
+                if key is not None:
+                    cache.put(key, original, result, report['seconds'])
+                return result, report
+
+    report['reason'] = reason
+    start = time.perf_counter()
+    result = function(df, column, **params)
+    report['seconds'] = time.perf_counter() - start
+    logger.debug(f"'{function.__name__}' executada linha a linha: {reason}")
+    if key is not None and isinstance(result, pd.DataFrame):
+        cache.put(key, original, result, report['seconds'])
+    return result, report
\ No newline at end of file
@@ -0,0 +1,42 @@
+# sampling.py
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+def stratified_sample(df, size, column='result', random_state=42):
+    """Extrai uma amostra estratificada do DataFrame, mantendo as proporções de uma coluna.
+
+    Args:
+        df: DataFrame de entrada.
+        size: Número de linhas pretendido na amostra.
+        column: Coluna usada para estratificar (padrão: 'result').
+        random_state: Semente para reprodutibilidade (padrão: 42).
+
+    Returns:
+        DataFrame com a amostra, pela ordem original das linhas (o índice original é mantido).
+    """
+    if size >= len(df):
+        return df.copy()
+    if column not in df.columns:
+        return df.sample(n=size, random_state=random_state).sort_index()
+
+    # Distribui as linhas pelos estratos proporcionalmente, arredondando pelo maior resto
+    counts = df[column].value_counts(dropna=False)
+    quotas = counts / len(df) * size
+    allocated = np.floor(quotas).astype(int)
+    remainder = size - allocated.sum()
+    if remainder > 0:
+        extra = (quotas - allocated).sort_values(ascending=False).index[:remainder]
+        allocated[extra] += 1
+
+    parts = []
+    for value, n in allocated.items():
+        if n == 0:
+            continue
+        stratum = df[df[column].isna()] if pd.isna(value) else df[df[column] == value]
+        parts.append(stratum.sample(n=min(n, len(stratum)), random_state=random_state))
+    sample = pd.concat(parts).sort_index()
+    logger.debug(f"Amostra estratificada por '{column}': {len(sample)} de {len(df)} linhas")
+    return sample
\ No newline at end of file
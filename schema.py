@@ -0,0 +1,124 @@
+# schema.py
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MAX_CATEGORIES = 20  # Colunas inteiras com até este número de valores válidos são tratadas como códigos
+REASON_COLUMN = 'quarantine_reason'
+ROW_COLUMN = 'source_row'  # Linha de dados no ficheiro original (a primeira é 0)
+
+class ScoringSchema:
+    """Contrato dos dados de entrada do scoring, derivado do modelo treinado.
+
+    Exige as colunas de treino, valores numéricos e não nulos e, quando `valid_values` as
+    conhece, valores dentro do intervalo visto no treino ou, em colunas de códigos (poucos
+    valores inteiros), um dos valores vistos. Os limites ficam compilados em arrays, pelo que
+    check() valida um bloco inteiro com operações vectoriais e só constrói texto para as linhas
+    rejeitadas.
+    """
+
+    def __init__(self, columns, lower=None, upper=None, allowed=None):
+        """Inicializa o esquema.
+
+        Args:
+            columns: Colunas obrigatórias, pela ordem de treino.
+            lower: Limite inferior por coluna (NaN sem limite); por defeito, sem limites.
+            upper: Limite superior por coluna (NaN sem limite); por defeito, sem limites.
+            allowed: Dict coluna -> valores aceites, para colunas de códigos.
+        """
+        self.columns = list(dict.fromkeys(columns))
+        n_columns = len(self.columns)
+        self.lower = np.full(n_columns, np.nan) if lower is None else np.asarray(lower, dtype=float)
+        self.upper = np.full(n_columns, np.nan) if upper is None else np.asarray(upper, dtype=float)
+        self.allowed = {col: np.asarray(values, dtype=float) for col, values in (allowed or {}).items()}
+
+    @classmethod
+    def from_model(cls, training_columns, valid_values=None, max_categories=MAX_CATEGORIES):
+        """Compila o esquema a partir das colunas de treino e dos valores válidos do modelo.
+
+        Args:
+            training_columns: Colunas usadas no treino.
+            valid_values: Dict coluna -> valores válidos (preprocessing_generic.update_valid_values).
+            max_categories: Máximo de valores inteiros para tratar uma coluna como códigos (padrão: 20).
+
+        Returns:
+            ScoringSchema: Esquema compilado.
+        """
+        columns = list(dict.fromkeys(training_columns))
+        lower, upper = np.full(len(columns), np.nan), np.full(len(columns), np.nan)
+        allowed = {}
+        for i, col in enumerate(columns):
+            values = (valid_values or {}).get(col)
+            if values is None or len(values) == 0:
+                continue  # Coluna derivada depois do cálculo dos valores válidos: só tipo e nulos
+            try:
+                values = np.asarray(values, dtype=float)
+            except (TypeError, ValueError):
+                continue  # Valores de texto no treino não definem limites numéricos
+            lower[i], upper[i] = values.min(), values.max()
+            if len(values) <= max_categories and np.all(values == np.round(values)):
+                allowed[col] = values  # Códigos (ex.: indicadores 0/1): o intervalo deixaria passar 0.5
+        return cls(columns, lower, upper, allowed)
+
+    def missing_columns(self, columns):
+        """Colunas obrigatórias ausentes de uma lista de colunas (ex.: o cabeçalho do CSV)."""
+        return [col for col in self.columns if col not in set(columns)]
+
+    def check(self, chunk):
+        """Valida um bloco e separa as linhas aceites das rejeitadas.
+
+        Args:
+            chunk: DataFrame com todas as colunas obrigatórias.
+
+        Returns:
+            tuple: (values, good, reasons) com os valores numéricos das colunas obrigatórias
+                (linhas x colunas), a máscara das linhas aceites e uma Series com o motivo de
+                cada linha rejeitada (indexada como o bloco).
+
+        Raises:
+            ValueError: Se faltarem colunas obrigatórias.
+        """
+        missing = self.missing_columns(chunk.columns)
+        if missing:
+            raise ValueError(f"Colunas em falta no CSV de teste: {', '.join(missing)}")
+        raw = chunk[self.columns]
+        nulls = raw.isna().to_numpy()
+        values = raw.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        non_numeric = np.isnan(values) & ~nulls
+        with np.errstate(invalid='ignore'):
+            out_of_range = (values < self.lower) | (values > self.upper)  # Comparações com NaN são falsas
+        for col, codes in self.allowed.items():
+            i = self.columns.index(col)
+            out_of_range[:, i] |= ~np.isnan(values[:, i]) & ~np.isin(values[:, i], codes)
+        bad = nulls | non_numeric | out_of_range
+        good = ~bad.any(axis=1)
+
+        reasons = {}
+        for row, i in zip(*np.nonzero(bad)):  # Só as células rejeitadas geram texto
+            col = self.columns[i]
+            if nulls[row, i]:
+                reason = f"{col}: nulo"
+            elif non_numeric[row, i]:
+                reason = f"{col}: não numérico ({raw.iat[row, i]!r})"
+            elif col in self.allowed:
+                reason = f"{col}: valor {values[row, i]:g} não visto no treino"
+            else:
+                reason = f"{col}: {values[row, i]:g} fora do intervalo [{self.lower[i]:g}, {self.upper[i]:g}]"
+            reasons.setdefault(row, []).append(reason)
+        reasons = pd.Series({chunk.index[row]: "; ".join(items) for row, items in reasons.items()}, dtype=object)
+        return values, good, reasons
+
+    def describe(self):
+        """Resumo legível do contrato, uma linha por coluna."""
+        lines = []
+        for i, col in enumerate(self.columns):
+            if col in self.allowed:
+                rule = f"um de {', '.join(f'{v:g}' for v in self.allowed[col])}"
+            elif not np.isnan(self.lower[i]):
+                rule = f"entre {self.lower[i]:g} e {self.upper[i]:g}"
+            else:
+                rule = "numérico"
+            lines.append(f"{col}: {rule}, sem nulos")
+        return "\n".join(lines)
\ No newline at end of file
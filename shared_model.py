@@ -0,0 +1,246 @@
+# shared_model.py
+import atexit
+import io
+import logging
+import os
+import pickle
+import sys
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from model import predict_new_client
+
+logger = logging.getLogger(__name__)
+
+MIN_SHARED_BYTES = 4096  # Arrays mais pequenos seguem no pickle do esqueleto
+ALIGNMENT = 64  # Alinhamento de cada array no segmento (linha de cache)
+_WORKER = {}  # Modelo ligado em cada processo do pool, definido por init_worker
+
+class _ArrayPickler(pickle.Pickler):
+    """Pickler que retira os arrays numéricos grandes do esqueleto, substituindo-os por referências."""
+
+    def __init__(self, file, arrays):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays = arrays
+
+    def persistent_id(self, obj):
+        if isinstance(obj, np.ndarray) and not obj.dtype.hasobject and obj.nbytes >= MIN_SHARED_BYTES:
+            self.arrays.append(obj)
+            return len(self.arrays) - 1
+        return None
+
+class _ArrayUnpickler(pickle.Unpickler):
+    """Unpickler que resolve as referências do esqueleto para vistas do segmento partilhado."""
+
+    def __init__(self, file, views):
+        super().__init__(file)
+        self.views = views
+
+    def persistent_load(self, pid):
+        return self.views[pid]
+
+def _array_views(buffer, layout):
+    """Vistas só de leitura sobre o segmento, uma por array do esquema (dtype, forma, ordem, posição)."""
+    views = []
+    for dtype, shape, order, offset in layout:
+        view = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset, order=order)
+        view.flags.writeable = False  # Os workers nunca alteram o modelo partilhado
+        views.append(view)
+    return views
+
+def _write_arrays(buffer, layout, arrays):
+    """Copia os arrays para o segmento; as vistas do dono desaparecem no fim, para o segmento poder ser fechado."""
+    for array, view in zip(arrays, _array_views(buffer, layout)):
+        view.flags.writeable = True  # Só o dono escreve, uma única vez
+        view[...] = array
+
+def _release_segment(segment, unlink):
+    """Fecha (e, no dono, remove) um segmento de memória partilhada, tolerando chamadas repetidas."""
+    try:
+        segment.close()
+    except BufferError:
+        logger.warning(f"Segmento {segment.name} ainda tem vistas activas; o mapeamento fica até ao fim do processo")
+    if unlink:
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass  # Já removido (ex.: pelo resource_tracker)
+
+class SharedModel:
+    """Modelo publicado uma única vez em memória partilhada, para workers de scoring no mesmo computador.
+
+    O modelo (KNN, normalizador e colunas de treino) é serializado com os arrays numéricos grandes
+    (matriz de treino normalizada, etiquetas, árvore de pesquisa, parâmetros do normalizador)
+    copiados para um único segmento de multiprocessing.shared_memory; o resto segue num esqueleto
+    pickle pequeno. Os workers recebem apenas `handle` e reconstroem o modelo com vistas sobre o
+    segmento, sem copiar os dados, pelo que a memória não cresce com o número de workers.
+
+    O segmento é removido por close(), à saída do bloco `with`, quando o objecto é recolhido ou à
+    saída do interpretador; se o processo for morto sem limpeza, o resource_tracker do
+    multiprocessing remove-o quando o dono e os seus workers terminam.
+    """
+
+    def __init__(self, knn, scaler, training_columns):
+        """Publica o modelo num segmento novo.
+
+        Args:
+            knn: Modelo KNN treinado (denso).
+            scaler: Normalizador usado no treino.
+            training_columns: Colunas usadas no treino.
+
+        Raises:
+            ValueError: Se o modelo tiver sido treinado com colunas esparsas.
+        """
+        if getattr(knn, 'sparse_input_', False):
+            raise ValueError("O modelo partilhado exige um modelo denso; use o scoring distribuído com colunas esparsas.")
+        arrays = []
+        skeleton = io.BytesIO()
+        _ArrayPickler(skeleton, arrays).dump({'knn': knn, 'scaler': scaler})
+
+        layout, offset = [], 0
+        for array in arrays:
+            order = 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+            layout.append((array.dtype, array.shape, order, offset))
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        self._segment = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self._finalizer = weakref.finalize(self, _release_segment, self._segment, True)  # Também corre à saída
+        _write_arrays(self._segment.buf, layout, arrays)
+        self.nbytes = offset
+        self.handle = {'name': self._segment.name, 'layout': layout, 'skeleton': skeleton.getvalue(),
+                       'training_columns': list(training_columns)}
+        logger.debug(f"Modelo publicado no segmento {self._segment.name}: {len(arrays)} arrays, {offset} bytes "
+                     f"(esqueleto com {len(self.handle['skeleton'])} bytes)")
+
+    @property
+    def closed(self):
+        """Indica se o segmento já foi removido."""
+        return not self._finalizer.alive
+
+    def close(self):
+        """Remove o segmento; os workers ainda ligados mantêm o mapeamento até se desligarem."""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class AttachedModel:
+    """Modelo reconstruído num worker a partir do `handle` de um SharedModel, sem copiar os arrays."""
+
+    def __init__(self, handle):
+        """Liga-se ao segmento e reconstrói o modelo.
+
+        Args:
+            handle: Dict publicado por SharedModel.handle.
+
+        Raises:
+            ValueError: Se o segmento já não existir.
+        """
+        try:
+            if sys.version_info >= (3, 13):
+                self._segment = shared_memory.SharedMemory(name=handle['name'], track=False)
+            else:
+                # Os workers do pool partilham o resource_tracker do dono, onde o segmento já está registado
+                self._segment = shared_memory.SharedMemory(name=handle['name'])
+        except FileNotFoundError:
+            raise ValueError(f"O segmento {handle['name']} do modelo partilhado já não existe.")
+        views = _array_views(self._segment.buf, handle['layout'])
+        bundle = _ArrayUnpickler(io.BytesIO(handle['skeleton']), views).load()
+        self.knn, self.scaler = bundle['knn'], bundle['scaler']
+        self.training_columns = handle['training_columns']
+
+    def close(self):
+        """Larga o modelo e desliga-se do segmento (sem o remover)."""
+        self.knn = self.scaler = None
+        _release_segment(self._segment, False)
+
+def init_worker(handle):
+    """Liga o processo actual ao modelo partilhado, uma única vez (initializer de um pool de processos).
+
+    Args:
+        handle: Dict publicado por SharedModel.handle.
+
+    Raises:
+        ValueError: Se o segmento já não existir.
+    """
+    _WORKER['model'] = AttachedModel(handle)
+    atexit.register(_WORKER['model'].close)
+
+def attached_model():
+    """Modelo ligado ao processo actual por init_worker.
+
+    Returns:
+        AttachedModel: Modelo com knn, scaler e training_columns.
+
+    Raises:
+        ValueError: Se o processo ainda não estiver ligado a um modelo partilhado.
+    """
+    if 'model' not in _WORKER:
+        raise ValueError("Este processo não está ligado a um modelo partilhado; use init_worker como initializer.")
+    return _WORKER['model']
+
+def _score_rows(rows):
+    """Previsões e probabilidades da classe positiva para um bloco de linhas, no worker."""
+    model = attached_model()
+    predictions, probabilities = predict_new_client(rows, model.knn, model.scaler, model.training_columns)
+    return predictions, probabilities[:, 1]
+
+def score_csv_shared(file_name, shared, n_workers=None, partition_rows=10000, output_file=None):
+    """Prevê um CSV num pool de processos locais ligados a um modelo em memória partilhada.
+
+    Os blocos são lidos e enviados aos workers com no máximo dois blocos pendentes por worker,
+    e as previsões são escritas pela ordem original das linhas.
+
+    Args:
+        file_name: Caminho do CSV a prever.
+        shared: SharedModel publicado pelo processo actual.
+        n_workers: Número de processos; None usa os CPUs disponíveis.
+        partition_rows: Linhas por bloco (padrão: 10000).
+        output_file: Ficheiro de saída; por defeito, '<nome>_predictions.csv'.
+
+    Returns:
+        str: Caminho do ficheiro de previsões escrito.
+
+    Raises:
+        ValueError: Se faltarem colunas de treino no CSV ou o modelo já tiver sido removido.
+    """
+    if shared.closed:
+        raise ValueError("O modelo partilhado já foi removido.")
+    training_columns = shared.handle['training_columns']
+    header = pd.read_csv(file_name, nrows=0).columns
+    missing = [col for col in training_columns if col not in header]
+    if missing:
+        raise ValueError(f"Colunas em falta no CSV de teste: {', '.join(missing)}")
+
+    n_workers = n_workers or os.cpu_count() or 1
+    output_file = output_file or file_name.replace('.csv', '_predictions.csv')
+    pending = []  # (bloco, futuro), pela ordem do ficheiro
+    written = 0
+
+    def write_next():
+        nonlocal written
+        chunk, future = pending.pop(0)
+        predictions, probabilities = future.result()
+        chunk = chunk.copy()
+        chunk['prediction'] = predictions
+        chunk['probability'] = probabilities
+        chunk.to_csv(output_file, mode='w' if written == 0 else 'a', header=(written == 0), index=False)
+        written += 1
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(shared.handle,)) as executor:
+        with pd.read_csv(file_name, chunksize=partition_rows) as reader:
+            for chunk in reader:
+                rows = chunk[training_columns].to_numpy(dtype=float)
+                pending.append((chunk, executor.submit(_score_rows, rows)))
+                if len(pending) >= 2 * n_workers:
+                    write_next()  # Limita os blocos em memória no processo principal
+        while pending:
+            write_next()
+    if written == 0:
+        pd.read_csv(file_name, nrows=0).assign(prediction=[], probability=[]).to_csv(output_file, index=False)
+    logger.debug(f"Scoring com modelo partilhado concluído: {written} blocos em {n_workers} workers")
+    return output_file
\ No newline at end of file
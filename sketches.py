@@ -0,0 +1,286 @@
+# sketches.py
+import logging
+import math
+import weakref
+import numpy as np
+import pandas as pd
+from out_of_core import iter_csv_chunks
+
+logger = logging.getLogger(__name__)
+
+class QuantileSketch:
+    """Sketch KLL de quantis: memória limitada, actualização incremental e fusão entre sketches.
+
+    Os valores são guardados em compactadores por nível; quando um nível enche, é ordenado
+    e metade dos valores (alternados, com deslocamento aleatório) sobe para o nível seguinte
+    com o dobro do peso. Enquanto nenhum nível foi compactado, os quantis são exactos.
+    """
+
+    def __init__(self, k=200, seed=42):
+        """Inicializa o sketch vazio.
+
+        Args:
+            k: Capacidade do compactador de topo; controla o erro (padrão: 200, cerca de 1,3%).
+            seed: Semente das escolhas aleatórias de compactação (padrão: 42).
+        """
+        self.k = k
+        self.n = 0  # Número de valores vistos (sem nulos)
+        self.compactors = [np.empty(0)]
+        self.compacted = False
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        """Capacidade de um nível: decresce geometricamente abaixo do topo."""
+        depth = len(self.compactors) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values):
+        """Acrescenta valores ao sketch, ignorando nulos."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Junta outro sketch a este, nível a nível (ex.: sketches de blocos ou de workers)."""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+        self.n += other.n
+        self.compacted = self.compacted or other.compacted
+        self._compress()
+        return self
+
+    def _compress(self):
+        """Compacta os níveis cheios até todos respeitarem a sua capacidade."""
+        while True:
+            # Acrescentar um nível reduz a capacidade dos inferiores, pelo que a procura recomeça do início
+            full = [level for level, items in enumerate(self.compactors) if len(items) >= self._capacity(level)]
+            if not full:
+                return
+            level = full[0]
+            if level + 1 == len(self.compactors):
+                self.compactors.append(np.empty(0))
+            items = np.sort(self.compactors[level])
+            keep = items[-1:] if len(items) % 2 else items[:0]  # Um valor ímpar fica no nível actual
+            paired = items[:len(items) - len(keep)]
+            self.compactors[level] = keep
+            self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], paired[self._rng.integers(2)::2]])
+            self.compacted = True
+
+    def _weighted_items(self):
+        """Devolve os valores ordenados e os respectivos pesos acumulados."""
+        values = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(items), 2 ** level) for level, items in enumerate(self.compactors)])
+        order = np.argsort(values, kind='stable')
+        return values[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Devolve o quantil q (0 a 1) aproximado, ou NaN se o sketch estiver vazio."""
+        if self.n == 0:
+            return float('nan')
+        values, cumulative = self._weighted_items()
+        if not self.compacted:
+            return float(np.quantile(values, q))  # Ainda exacto: usa a mesma interpolação do pandas
+        position = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+        return float(values[min(position, len(values) - 1)])
+
+    def error_bound(self):
+        """Erro máximo de ordem normalizado (fracção de n) com cerca de 99% de confiança; 0 se exacto."""
+        if not self.compacted:
+            return 0.0
+        return 2.296 / self.k ** 0.9723  # Aproximação empírica do erro do KLL para um quantil
+
+    def size(self):
+        """Número de valores guardados no sketch."""
+        return int(sum(len(items) for items in self.compactors))
+
+class ModeSketch:
+    """Contador de elementos frequentes (Misra-Gries) com fusão entre sketches.
+
+    Guarda no máximo `capacity` contadores; quando há mais, todos são reduzidos pela
+    contagem do primeiro excedente. Cada contagem subestima a real no máximo `error`.
+    """
+
+    def __init__(self, capacity=100):
+        """Inicializa o contador vazio.
+
+        Args:
+            capacity: Número máximo de valores contados (padrão: 100).
+        """
+        self.capacity = capacity
+        self.n = 0
+        self.error = 0  # Subestimação máxima de cada contagem
+        self.counts = {}
+
+    def update(self, values):
+        """Acrescenta valores ao contador, ignorando nulos."""
+        counts = pd.Series(values).value_counts(dropna=True)
+        self.n += int(counts.sum())
+        return self._combine(counts.to_dict())
+
+    def merge(self, other):
+        """Junta outro contador a este."""
+        self.n += other.n
+        self.error += other.error
+        return self._combine(other.counts)
+
+    def _combine(self, counts):
+        """Soma contagens e reduz os contadores à capacidade máxima."""
+        merged = dict(self.counts)
+        for value, count in counts.items():
+            merged[value] = merged.get(value, 0) + int(count)
+        if len(merged) > self.capacity:
+            ordered = sorted(merged.values(), reverse=True)
+            cut = ordered[self.capacity]  # Contagem do primeiro valor que não cabe
+            merged = {value: count - cut for value, count in merged.items() if count > cut}
+            self.error += cut
+        self.counts = merged
+        return self
+
+    def mode(self):
+        """Devolve o valor mais frequente estimado, ou None se o contador estiver vazio."""
+        if not self.counts:
+            return None
+        return max(self.counts.items(), key=lambda item: item[1])[0]
+
+    def is_exact(self):
+        """Indica se a moda é garantidamente a verdadeira (margem maior do que o erro)."""
+        if not self.counts:
+            return True
+        ordered = sorted(self.counts.values(), reverse=True)
+        return self.error == 0 or len(ordered) == 1 or ordered[0] - ordered[1] > self.error
+
+    def error_bound(self):
+        """Subestimação máxima de cada contagem, em fracção de n."""
+        return self.error / self.n if self.n else 0.0
+
+class ColumnSketch:
+    """Resumo de uma coluna: quantis (se numérica), moda, soma e contagens, actualizável por blocos."""
+
+    def __init__(self, k=200, capacity=100):
+        """Inicializa o resumo vazio.
+
+        Args:
+            k: Parâmetro do sketch de quantis (padrão: 200).
+            capacity: Número de contadores do sketch de moda (padrão: 100).
+        """
+        self.quantiles = QuantileSketch(k)
+        self.modes = ModeSketch(capacity)
+        self.total = 0.0  # Soma exacta dos valores numéricos, para a média
+        self.count = 0  # Valores não nulos
+        self.rows = 0  # Linhas vistas, incluindo nulos
+        self.numeric = True
+
+    def update(self, series):
+        """Acrescenta os valores de uma Series (ex.: um bloco de um CSV)."""
+        self.rows += len(series)
+        self.count += int(series.notna().sum())
+        self.modes.update(series)
+        if self.numeric and pd.api.types.is_numeric_dtype(series):
+            self.quantiles.update(series.to_numpy(dtype=float, na_value=np.nan))
+            self.total += float(series.sum())
+        else:
+            self.numeric = False  # Colunas não numéricas mantêm apenas a moda
+        return self
+
+    def merge(self, other):
+        """Junta o resumo de outro bloco ou worker a este."""
+        self.quantiles.merge(other.quantiles)
+        self.modes.merge(other.modes)
+        self.total += other.total
+        self.count += other.count
+        self.rows += other.rows
+        self.numeric = self.numeric and other.numeric
+        return self
+
+    def quantile(self, q):
+        """Quantil q aproximado (só colunas numéricas)."""
+        if not self.numeric:
+            raise ValueError("Os quantis só estão disponíveis para colunas numéricas.")
+        return self.quantiles.quantile(q)
+
+    def median(self):
+        """Mediana aproximada."""
+        return self.quantile(0.5)
+
+    def mean(self):
+        """Média exacta, calculada a partir da soma e da contagem."""
+        return self.total / self.count if self.count else float('nan')
+
+    def mode(self):
+        """Moda estimada."""
+        return self.modes.mode()
+
+    def error_bounds(self):
+        """Devolve os limites de erro dos sketches.
+
+        Returns:
+            dict: 'rank_error' (erro de ordem normalizado dos quantis), 'mode_error'
+                (subestimação máxima das contagens, em fracção) e 'mode_exact'.
+        """
+        return {'rank_error': self.quantiles.error_bound() if self.numeric else None,
+                'mode_error': self.modes.error_bound(), 'mode_exact': self.modes.is_exact()}
+
+def sketch_csv(file_name, columns, chunksize=None, memory_budget_mb=512):
+    """Constrói os resumos de várias colunas de um CSV lendo-o por blocos.
+
+    Args:
+        file_name: Caminho do ficheiro CSV.
+        columns: Colunas a resumir.
+        chunksize: Linhas por bloco; se None, é calculado a partir do orçamento de memória.
+        memory_budget_mb: Orçamento de memória em MB (padrão: 512).
+
+    Returns:
+        dict: Coluna -> ColumnSketch.
+    """
+    sketches = {column: ColumnSketch() for column in columns}
+    for chunk in iter_csv_chunks(file_name, usecols=list(columns), chunksize=chunksize, memory_budget_mb=memory_budget_mb):
+        for column, sketch in sketches.items():
+            sketch.update(chunk[column])
+    return sketches
+
+class SketchCache:
+    """Resumos por coluna construídos uma única vez e reutilizados até a coluna mudar.
+
+    Os resumos pertencem a um DataFrame concreto: quando é pedido o resumo de outro
+    DataFrame (ex.: um CSV novo ou o resultado de remover linhas), a cache é esvaziada.
+    Alterações no próprio DataFrame devem ser comunicadas com invalidate(column).
+    """
+
+    def __init__(self):
+        self._sketches = {}
+        self._frame = None  # Referência fraca ao DataFrame resumido
+
+    def get(self, df, column):
+        """Devolve o resumo da coluna, construindo-o se ainda não existir para este DataFrame."""
+        if self._frame is None or self._frame() is not df:
+            self._sketches.clear()
+            self._frame = weakref.ref(df)
+        sketch = self._sketches.get(column)
+        if sketch is None or sketch.rows != len(df):
+            sketch = ColumnSketch().update(df[column])
+            self._sketches[column] = sketch
+            logger.debug(f"Resumo da coluna '{column}' construído com {sketch.quantiles.size()} valores guardados")
+        return sketch
+
+    def adopt(self, df, sketches):
+        """Associa à cache resumos já construídos para um DataFrame (ex.: durante o carregamento por blocos)."""
+        self._sketches = dict(sketches)
+        self._frame = weakref.ref(df)
+
+    def update(self, column, series):
+        """Acrescenta linhas novas ao resumo de uma coluna (ex.: blocos carregados progressivamente)."""
+        self._sketches.setdefault(column, ColumnSketch()).update(series)
+
+    def invalidate(self, column=None):
+        """Descarta o resumo de uma coluna, ou todos se column for None."""
+        if column is None:
+            self._sketches.clear()
+        else:
+            self._sketches.pop(column, None)
\ No newline at end of file
@@ -0,0 +1,348 @@
+# transform_cache.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import joblib
+import pandas as pd
+from preprocessing_pipeline import get_function_source
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = '.transform_cache'  # Pasta do nível em disco: um ficheiro por resultado
+PARAM_TYPES = (type(None), bool, int, float, str)  # Parâmetros que entram na chave; outros impedem a cache
+
+def _param_token(value):
+    """Representação estável de um parâmetro, ou None se o valor não puder entrar na chave (ex.: um sketch)."""
+    if isinstance(value, PARAM_TYPES):
+        return [type(value).__name__, value]
+    if isinstance(value, (list, tuple)):
+        items = [_param_token(item) for item in value]
+        return None if any(item is None for item in items) else items
+    return None
+
+def column_fingerprint(df, columns):
+    """Impressão digital do conteúdo de algumas colunas: número de linhas, nomes, tipos e valores.
+
+    Usa pd.util.hash_pandas_object, vectorial, sobre os valores (sem o índice).
+
+    Returns:
+        str: Hash hexadecimal, ou None se algum valor não puder ser calculado (ex.: listas).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((len(df), [(col, str(df[col].dtype)) for col in columns])).encode('utf-8'))
+    try:
+        for col in columns:
+            digest.update(pd.util.hash_pandas_object(df[col], index=False).to_numpy().tobytes())
+    except TypeError:
+        return None
+    return digest.hexdigest()
+
+def _make_delta(df, result):
+    """Descreve o resultado de uma transformação pelas diferenças face à entrada.
+
+    Guarda apenas as posições das linhas mantidas (se a função remove linhas), as colunas
+    novas ou alteradas, as colunas removidas e a ordem final das colunas.
+
+    Returns:
+        dict: Diferenças, ou None se o resultado não puder ser descrito assim (índice alterado,
+            índice ou colunas repetidos).
+    """
+    if not result.columns.is_unique or not df.columns.is_unique:
+        return None
+    if result.index.equals(df.index):
+        rows, base = None, df
+    else:
+        if not df.index.is_unique:
+            return None
+        rows = df.index.get_indexer(result.index)
+        if (rows < 0).any():
+            return None  # A função criou ou renumerou linhas
+        base = df.iloc[rows]
+    changed = {}
+    for col in result.columns:
+        if col in base.columns and base[col].dtype == result[col].dtype and base[col].equals(result[col]):
+            continue  # Coluna passada sem alterações
+        changed[col] = result[col].reset_index(drop=True)
+    return {'rows': rows, 'changed': changed, 'dropped': [col for col in df.columns if col not in result.columns],
+            'order': list(result.columns)}
+
+def _apply_delta(df, delta):
+    """Reconstrói o resultado de uma transformação a partir da entrada e das diferenças guardadas."""
+    out = df if delta['rows'] is None else df.iloc[delta['rows']]
+    kept = [col for col in out.columns if col not in delta['dropped']]
+    parts = [out[[col for col in kept if col not in delta['changed']]]]
+    parts += [values.set_axis(out.index) for values in delta['changed'].values()]
+    out = pd.concat(parts, axis=1)
+    if set(delta['order']) == set(out.columns):
+        return out[delta['order']]
+    # Entrada com outras colunas (ex.: o resultado veio de um sub-DataFrame): colunas novas no fim
+    return out[kept + [col for col in delta['changed'] if col not in kept]]
+
+def _delta_bytes(delta):
+    """Memória estimada das diferenças guardadas, em bytes."""
+    size = sum(int(values.memory_usage(deep=True)) for values in delta['changed'].values())
+    return size + (delta['rows'].nbytes if delta['rows'] is not None else 0)
+
+class TransformCache:
+    """Cache de resultados de transformações endereçada pelo conteúdo, com níveis em memória e em disco.
+
+    A chave combina o módulo, o nome e o hash do código fonte da função (de preprocessing_generic
+    ou preprocessing_custom), os parâmetros e uma impressão digital das colunas que a função lê:
+    a coluna transformada e as declaradas no atributo `reads` ou, sem declaração, todas as colunas
+    (as leituras detectadas no código são só um mínimo: df.dropna() lê todas). Desfazer e refazer um passo,
+    reabrir a janela de detalhes ou reaplicar a receita a um CSV recarregado encontram assim o
+    resultado já calculado, e editar uma função personalizada muda a chave.
+
+    Cada nível descarta as entradas menos usadas recentemente quando excede o seu orçamento; as
+    entradas do disco sobrevivem ao fecho da aplicação e são promovidas para a memória ao serem
+    lidas. Uma função pode declarar `cacheable = False` (ex.: se usar valores aleatórios) ou as
+    colunas que lê com o atributo `reads`, o que evita invalidações por alterações noutras colunas.
+    """
+
+    def __init__(self, root=CACHE_DIR, memory_budget_mb=256, disk_budget_mb=1024):
+        """Inicializa a cache (a pasta é criada na primeira escrita).
+
+        Args:
+            root: Pasta do nível em disco (padrão: '.transform_cache').
+            memory_budget_mb: Memória máxima dos resultados guardados, em MB (padrão: 256).
+            disk_budget_mb: Espaço máximo em disco, em MB; 0 desactiva o nível em disco (padrão: 1024).
+        """
+        self.root = root
+        self.memory_budget_mb = memory_budget_mb
+        self.disk_budget_mb = disk_budget_mb
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0  # Tempo de cálculo original das entradas reutilizadas
+        self._entries = OrderedDict()  # Chave -> (entrada, bytes), do menos ao mais recente
+        self._lock = threading.RLock()  # A reaplicação da receita corre numa thread em segundo plano
+
+    def make_key(self, df, function, column, params=None):
+        """Gera a chave de uma transformação sobre o DataFrame actual.
+
+        Args:
+            df: DataFrame de entrada.
+            function: Função com assinatura (df, column, ...).
+            column: Coluna a transformar.
+            params: Dict de parâmetros adicionais da função.
+
+        Returns:
+            str: Chave hexadecimal, ou None se a transformação não puder ser guardada (código fonte
+                indisponível, parâmetros não primitivos ou `cacheable = False`).
+        """
+        if getattr(function, 'cacheable', True) is False:
+            return None
+        source = get_function_source(function)
+        tokens = {name: _param_token(value) for name, value in sorted((params or {}).items())}
+        if source is None or any(token is None for token in tokens.values()):
+            return None
+        reads = getattr(function, 'reads', None)
+        if reads is None:
+            columns = list(df.columns)  # Sem declaração, qualquer coluna pode mudar o resultado
+        else:
+            columns = [col for col in df.columns if col == column or col in set(reads)]
+        fingerprint = column_fingerprint(df, columns)
+        if fingerprint is None:
+            return None
+        source_hash = hashlib.sha256(source.replace("\r\n", "\n").strip().encode('utf-8')).hexdigest()
+        payload = json.dumps([function.__module__, function.__qualname__, source_hash, column, tokens, fingerprint])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        """Ficheiro de uma entrada no nível em disco."""
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def get(self, key, df):
+        """Devolve o resultado guardado aplicado a df, procurando na memória e depois no disco.
+
+        Args:
+            key: Chave gerada por make_key para este df.
+            df: DataFrame de entrada da transformação.
+
+        Returns:
+            tuple: (DataFrame, nível) com o nível 'memory' ou 'disk', ou (None, None) se não existir.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)  # Marca como usada recentemente
+                entry = self._entries[key][0]
+                self.memory_hits += 1
+                self.saved_seconds += entry['seconds']
+                return _apply_delta(df, entry['delta']), 'memory'
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None, None
+            self.disk_hits += 1
+            self.saved_seconds += entry['seconds']
+            self._store(key, entry)
+        return _apply_delta(df, entry['delta']), 'disk'
+
+    def put(self, key, df, result, seconds=0.0):
+        """Guarda o resultado de uma transformação nos dois níveis.
+
+        Args:
+            key: Chave gerada por make_key para df.
+            df: DataFrame de entrada tal como estava antes da função (ver snapshot).
+            result: DataFrame devolvido pela função.
+            seconds: Tempo de cálculo, contabilizado nas estatísticas quando a entrada é reutilizada.
+        """
+        delta = _make_delta(df, result)
+        if delta is None:
+            logger.debug("Resultado com índice ou colunas alterados não guardado na cache de transformações")
+            return
+        entry = {'delta': delta, 'seconds': seconds}
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    @staticmethod
+    def snapshot(df):
+        """Cópia rasa da entrada para put(): com copy-on-write não duplica dados e fica imune às funções
+        que alteram o DataFrame recebido (ex.: df[column] = ...; return df)."""
+        return df.copy(deep=False)
+
+    def run(self, df, function, column, params=None, compute=None):
+        """Executa uma transformação, reutilizando o resultado guardado quando existe.
+
+        Args:
+            df: DataFrame de entrada.
+            function: Função com assinatura (df, column, ...).
+            column: Coluna a transformar.
+            params: Dict de parâmetros adicionais da função.
+            compute: Função sem argumentos que calcula o resultado; por defeito, function(df, column, **params).
+
+        Returns:
+            tuple: (DataFrame, nível) com o nível 'memory' ou 'disk' quando reutilizado, ou None se calculado.
+        """
+        params = params or {}
+        key = self.make_key(df, function, column, params)
+        if key is not None:
+            result, source = self.get(key, df)
+            if result is not None:
+                return result, source
+        original = self.snapshot(df) if key is not None else None
+        start = time.perf_counter()
+        result = compute() if compute is not None else function(df, column, **params)
+        if key is not None and isinstance(result, pd.DataFrame):
+            self.put(key, original, result, time.perf_counter() - start)
+        return result, None
+
+    def _store(self, key, entry):
+        """Guarda uma entrada na memória e descarta as menos usadas até respeitar o orçamento."""
+        size = _delta_bytes(entry['delta'])
+        budget = self.memory_budget_mb * 1024 * 1024
+        if size > budget:
+            return  # Fica apenas no disco
+        self._entries[key] = (entry, size)
+        self._entries.move_to_end(key)
+        while self.memory_used() > budget:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key):
+        """Lê uma entrada do disco, ou None; marca o ficheiro como usado recentemente."""
+        if not self.disk_budget_mb:
+            return None
+        path = self._path(key)
+        try:
+            entry = joblib.load(path)
+            os.utime(path)  # A data de modificação ordena o descarte no disco
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada ilegível na cache de transformações ({path}): {str(e)}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def _write_disk(self, key, entry):
+        """Escreve uma entrada no disco de forma atómica e descarta as mais antigas acima do orçamento."""
+        if not self.disk_budget_mb:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            joblib.dump(entry, temp_path)
+            os.replace(temp_path, path)  # Leitores nunca vêem um ficheiro incompleto
+        except OSError as e:
+            logger.warning(f"Não foi possível escrever na cache de transformações: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._evict_disk()
+
+    def _disk_files(self):
+        """Ficheiros do nível em disco como (data de modificação, tamanho, caminho), do mais antigo ao mais recente."""
+        if not os.path.isdir(self.root):
+            return []
+        files = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.pkl'):
+                continue  # Ignora escritas temporárias em curso
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return sorted(files)
+
+    def _evict_disk(self):
+        """Remove os ficheiros menos usados recentemente até respeitar o orçamento em disco."""
+        files = self._disk_files()
+        used = sum(size for _, size, _ in files)
+        budget = self.disk_budget_mb * 1024 * 1024
+        for _, size, path in files:
+            if used <= budget:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            used -= size
+
+    def clear(self, disk=False):
+        """Esvazia a cache em memória e, com disk=True, também o nível em disco."""
+        with self._lock:
+            self._entries.clear()
+        if disk:
+            for _, _, path in self._disk_files():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        logger.debug("Cache de transformações esvaziada" + (" (incluindo o disco)" if disk else ""))
+
+    def memory_used(self):
+        """Memória estimada das entradas em memória, em bytes."""
+        return sum(size for _, size in self._entries.values())
+
+    def stats(self):
+        """Devolve as estatísticas da cache de transformações.
+
+        Returns:
+            dict: Entradas e bytes em memória e em disco, acertos por nível, falhas, taxa de acerto
+                e segundos de cálculo poupados.
+        """
+        files = self._disk_files()
+        total = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_entries': len(self._entries),
+            'memory_bytes': self.memory_used(),
+            'disk_entries': len(files),
+            'disk_bytes': sum(size for _, size, _ in files),
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / total if total else 0.0,
+            'saved_seconds': self.saved_seconds,
+        }
\ No newline at end of file
@@ -1,15 +1,21 @@
 # ui/column_interface.py
+import logging
 import pandas as pd
-from PyQt5.QtWidgets import QCheckBox, QLabel, QPushButton, QHBoxLayout
+from PyQt5.QtWidgets import QCheckBox, QLabel, QPushButton, QHBoxLayout, QMessageBox
 from PyQt5.QtCore import Qt
 from ui.details_window import ColumnDetailsWindow
+from ui.feature_selection_window import FeatureSelectionWindow
 from ui.utils import clear_layout
+from preprocessing_pipeline import apply_steps
 
-def display_columns(app):
+logger = logging.getLogger(__name__)
+
+def display_columns(app, preselected=None):
     """Exibe as colunas do DataFrame como caixas de selecção com botões de detalhes na Tela 1.
     
     Args:
         app: Instância de MLApp contendo o DataFrame (app.df) e o layout (app.columns_layout).
+        preselected: Colunas a marcar de início (ex.: o conjunto da selecção automática).
     """
     clear_layout(app.columns_layout)  # Repõe o layout para evitar widgets duplicados
     app.selected_columns = []  # Inicializa a lista de colunas seleccionadas
@@ -40,6 +46,8 @@ def display_columns(app):
             app.selected_columns.append(column)
         else:
             checkbox.stateChanged.connect(make_state_handler(column))  # Associa o manipulador de alteração
+            if preselected and column in preselected:
+                checkbox.setChecked(True)  # Passa por update_selected_columns, como um clique
         
         # Avisa sobre colunas não numéricas que podem afectar o treino do modelo
         warning_label = QLabel("")
@@ -58,6 +66,19 @@ def display_columns(app):
         
         app.columns_layout.addLayout(row_layout)  # Adiciona a linha ao layout principal
 
+def open_feature_selection(app):
+    """Abre a selecção automática de colunas; o conjunto escolhido fica marcado na Tela 1.
+    
+    Args:
+        app: Instância de MLApp contendo o DataFrame (app.df).
+    """
+    if app.df is None or getattr(app, 'csv_load_worker', None) is not None:
+        QMessageBox.information(app, "Sem Dados", "Carregue um CSV (até ao fim) antes da selecção automática.")
+        return
+    window = FeatureSelectionWindow(app.df, n_neighbors=app.neighbors_input.value(),
+                                    on_select=lambda columns: display_columns(app, preselected=columns), parent=app)
+    window.exec_()
+
 def show_column_details(app, col):
     """Abre uma janela de detalhes para uma coluna específica com os seus metadados.
     
@@ -118,4 +139,43 @@ def update_selected_columns(app, column, state):
     if state == Qt.Checked and column not in app.selected_columns:
         app.selected_columns.append(column)  # Adiciona a coluna se seleccionada
     elif state == Qt.Unchecked and column in app.selected_columns:
-        app.selected_columns.remove(column)  # Remove a coluna se desmarcada
\ No newline at end of file
+        app.selected_columns.remove(column)  # Remove a coluna se desmarcada
+
+def apply_transform_recipe(app):
+    """Reaplica todos os passos da receita ao CSV tal como foi carregado, em paralelo onde é seguro.
+    
+    A receita parte sempre de app.loaded_df e não do DataFrame actual, que já pode ter os mesmos
+    passos aplicados; o resultado substitui app.df.
+    
+    Args:
+        app: Instância de MLApp contendo loaded_df, df e a receita (app.transform_recipe).
+    """
+    if getattr(app, 'csv_load_worker', None) is not None:
+        QMessageBox.information(app, "Carregamento em Curso", "Aguarde o fim do carregamento do CSV antes de reaplicar a receita.")
+        return
+    if app.df is None or not app.transform_recipe:
+        QMessageBox.information(app, "Receita Vazia", "Carregue um CSV e aplique transformações antes de reaplicar a receita.")
+        return
+    if app.loaded_df is None:
+        QMessageBox.information(app, "Sem CSV Original", "O DataFrame actual não veio de um CSV carregado; carregue um CSV para reaplicar a receita.")
+        return
+    if app.full_df is not None:
+        QMessageBox.information(app, "Pré-visualização Activa", "Termine a pré-visualização antes de reaplicar a receita ao CSV completo.")
+        return
+    
+    try:
+        # Executa os passos independentes em paralelo; os já calculados sobre os mesmos dados vêm da cache
+        app.df = apply_steps(app.loaded_df, app.transform_recipe, cache=app.transform_cache)
+        update_after_formatting(app)
+        QMessageBox.information(app, "Sucesso", f"{len(app.transform_recipe)} passos da receita aplicados.")
+    except Exception as e:
+        logger.error(f"Erro ao aplicar a receita: {str(e)}")
+        QMessageBox.critical(app, "Erro", f"Erro ao aplicar a receita: {str(e)}")
+
+def clear_transform_recipe(app):
+    """Esvazia a receita de transformações registadas.
+    
+    Args:
+        app: Instância de MLApp contendo a receita (app.transform_recipe).
+    """
+    app.transform_recipe.clear()
\ No newline at end of file
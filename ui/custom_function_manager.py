@@ -1,10 +1,9 @@
 # ui/custom_function_manager.py
-import inspect
-import importlib
-import sys
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit, QLineEdit, QComboBox, QMessageBox
-from PyQt5.QtCore import QTimer
-import preprocessing_custom
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit, QLineEdit, QComboBox,
+                             QMessageBox, QLabel)
+from custom_function_registry import get_registry
+from function_profiler import profile_custom_function, format_profile_report
+from ui.workers import FunctionWorker
 
 class CustomFunctionManagerWindow(QDialog):
     """Janela para criar, editar e excluir funções personalizadas de pré-processamento."""
@@ -19,6 +18,7 @@ class CustomFunctionManagerWindow(QDialog):
         self.setWindowTitle("Gerenciar Funções Personalizadas")
         self.setGeometry(300, 300, 600, 400)
         self.app_parent = parent
+        self.profile_worker = None
         
         layout = QVBoxLayout()  # Layout vertical principal
         
@@ -55,33 +55,31 @@ class CustomFunctionManagerWindow(QDialog):
         delete_btn.clicked.connect(self.delete_function)
         button_layout.addWidget(delete_btn)
         
+        self.profile_btn = QPushButton("Perfilar Função")
+        self.profile_btn.clicked.connect(self.profile_function)
+        self.profile_btn.setEnabled(getattr(parent, 'df', None) is not None)  # Precisa dos dados da janela de detalhes
+        button_layout.addWidget(self.profile_btn)
+        
         close_btn = QPushButton("Fechar")
         close_btn.clicked.connect(self.close)
         button_layout.addWidget(close_btn)
         
         layout.addLayout(button_layout)
+        
+        self.status_label = QLabel("")  # Estado do perfil em curso
+        layout.addWidget(self.status_label)
         self.setLayout(layout)
         
         self.function_selector.currentIndexChanged.connect(self.load_selected_function)  # Liga evento de selecção
 
     def load_functions(self):
-        """Carrega as funções personalizadas do módulo preprocessing_custom na caixa de selecção."""
-        try:
-            with open("preprocessing_custom.py", "r", encoding="utf-8") as f:
-                file_content = f.read()  # Verifica se o ficheiro existe
-        except Exception as e:
-            return  # Sai se houver erro ao abrir o ficheiro
-        
-        # Recarrega o módulo para garantir a versão mais recente
-        if 'preprocessing_custom' in sys.modules:
-            del sys.modules['preprocessing_custom']
-        import preprocessing_custom
-        
-        functions = inspect.getmembers(preprocessing_custom, inspect.isfunction)  # Obtém funções do módulo
+        """Carrega os nomes das funções personalizadas registadas na caixa de selecção."""
+        registry = get_registry()
+        registry.reload()  # Recompila apenas funções alteradas fora da aplicação
         
         self.function_selector.clear()  # Limpa a caixa de selecção
         self.function_selector.addItem("Selecione uma função")
-        for name, _ in functions:
+        for name in registry.names():
             self.function_selector.addItem(name)  # Adiciona nomes das funções
 
     def load_selected_function(self):
@@ -93,30 +91,10 @@ class CustomFunctionManagerWindow(QDialog):
             self.code_input.setText("")
             return  # Limpa campos se nenhuma função for seleccionada
         
-        import preprocessing_custom
-        function = getattr(preprocessing_custom, function_name, None)
-        if function:
-            try:
-                source = inspect.getsource(function)  # Obtém o código fonte da função
-                self.name_input.setText(function_name)
-                self.code_input.setText(source.strip())
-            except Exception as e:
-                # Tenta recarregar o módulo em caso de erro
-                if 'preprocessing_custom' in sys.modules:
-                    del sys.modules['preprocessing_custom']
-                import preprocessing_custom
-                function = getattr(preprocessing_custom, function_name, None)
-                if function:
-                    try:
-                        source = inspect.getsource(function)
-                        self.name_input.setText(function_name)
-                        self.code_input.setText(source.strip())
-                    except Exception as e2:
-                        QMessageBox.warning(self, "Erro", f"Não foi possível carregar o código da função '{function_name}': {str(e2)}")
-                        self.load_functions()
-                else:
-                    QMessageBox.warning(self, "Erro", f"Função '{function_name}' não encontrada.")
-                    self.load_functions()
+        source = get_registry().get_source(function_name)  # Código guardado no registo
+        if source is not None:
+            self.name_input.setText(function_name)
+            self.code_input.setText(source)
         else:
             # Evita erro ao adicionar nova função sem dados preenchidos
             if not self.name_input.text().strip() and not self.code_input.toPlainText().strip():
@@ -137,8 +115,7 @@ class CustomFunctionManagerWindow(QDialog):
             QMessageBox.warning(self, "Erro", "O nome da função deve ser um identificador válido (ex.: minha_funcao).")
             return
         
-        import preprocessing_custom
-        if hasattr(preprocessing_custom, function_name):
+        if get_registry().has(function_name):
             QMessageBox.warning(self, "Erro", f"A função '{function_name}' já existe.")
             return
         
@@ -160,43 +137,9 @@ class CustomFunctionManagerWindow(QDialog):
             QMessageBox.warning(self, "Erro", "Formato inválido da função. Use 'def nome(df, column):'.")
             return
         
-        # Adiciona a função ao ficheiro preprocessing_custom.py
+        # Adiciona a função ao registo, compilando apenas a função nova
         try:
-            try:
-                with open("preprocessing_custom.py", "r", encoding="utf-8") as f:
-                    existing_content = f.read()
-            except FileNotFoundError:
-                existing_content = "import pandas as pd\nimport logging\nlogger = logging.getLogger(__name__)\n\n"
-            
-            # Separa imports e funções existentes
-            existing_functions, imports_section = [], []
-            in_function, current_function = False, []
-            for line in existing_content.splitlines():
-                stripped_line = line.strip()
-                if stripped_line.startswith("def "):
-                    in_function = True
-                    if current_function:
-                        existing_functions.append("\n".join(current_function))
-                    current_function = [line]
-                elif in_function and not stripped_line:
-                    in_function = False
-                    existing_functions.append("\n".join(current_function))
-                    current_function = []
-                elif in_function:
-                    current_function.append(line)
-                else:
-                    imports_section.append(line)
-            if current_function:
-                existing_functions.append("\n".join(current_function))
-            
-            existing_functions.append(function_code)  # Adiciona a nova função
-            with open("preprocessing_custom.py", "w", encoding="utf-8") as f:
-                f.write("\n".join(imports_section) + "\n\n" + "\n\n".join(existing_functions))
-            
-            # Recarrega o módulo actualizado
-            if 'preprocessing_custom' in sys.modules:
-                del sys.modules['preprocessing_custom']
-            import preprocessing_custom
+            get_registry().add(function_name, function_code)
             
             self.load_functions()
             QMessageBox.information(self, "Sucesso", f"Função '{function_name}' adicionada com sucesso!")
@@ -244,44 +187,9 @@ class CustomFunctionManagerWindow(QDialog):
             QMessageBox.warning(self, "Erro", "Formato inválido da função. Use 'def nome(df, column):'.")
             return
         
-        # Substitui a função no ficheiro
+        # Substitui a função no registo; só é recompilada se o código mudou
         try:
-            with open("preprocessing_custom.py", "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            
-            new_lines, in_function, function_found = [], False, False
-            i = 0
-            while i < len(lines):
-                line = lines[i]
-                if line.strip().startswith(f"def {function_name}("):
-                    function_found = True
-                    in_function = True
-                    new_lines.append(new_function_code + "\n")  # Substitui pela nova função
-                    i += 1
-                    while i < len(lines) and (lines[i].startswith(" ") or lines[i].strip() == ""):
-                        i += 1
-                else:
-                    if not in_function:
-                        new_lines.append(line)
-                    i += 1
-                if in_function and i < len(lines) and not lines[i].strip():
-                    in_function = False
-            
-            if not function_found:
-                QMessageBox.warning(self, "Erro", f"Função '{function_name}' não encontrada.")
-                return
-            
-            with open("preprocessing_custom.py", "w", encoding="utf-8") as f:
-                f.writelines(new_lines)
-            
-            # Recarrega o módulo
-            if 'preprocessing_custom' in sys.modules:
-                del sys.modules['preprocessing_custom']
-            try:
-                import preprocessing_custom
-            except Exception as e:
-                QMessageBox.critical(self, "Erro", f"Erro ao recarregar o módulo preprocessing_custom: {str(e)}")
-                return
+            changes = get_registry().update(function_name, new_function_name, new_function_code)
             
             self.function_selector.blockSignals(True)  # Evita eventos durante actualização
             self.load_functions()
@@ -291,7 +199,10 @@ class CustomFunctionManagerWindow(QDialog):
             self.name_input.clear()
             self.code_input.clear()
             
-            QMessageBox.information(self, "Sucesso", f"Função '{function_name}' editada com sucesso!")
+            if any(changes.values()):
+                QMessageBox.information(self, "Sucesso", f"Função '{function_name}' editada com sucesso!")
+            else:
+                QMessageBox.information(self, "Sem Alterações", f"O código da função '{function_name}' não foi alterado.")
             if self.app_parent:
                 self.app_parent.refresh_custom_functions()
         except Exception as e:
@@ -312,47 +223,7 @@ class CustomFunctionManagerWindow(QDialog):
             return
         
         try:
-            with open("preprocessing_custom.py", "r", encoding="utf-8") as f:
-                lines = f.readlines()
-            
-            # Remove a função seleccionada
-            new_lines = []
-            in_function = False
-            function_found = False
-            i = 0
-            while i < len(lines):
-                line = lines[i]
-                if not line.startswith(" ") and line.strip().startswith(f"def {function_name}("):
-                    function_found = True
-                    in_function = True
-                    i += 1
-                    while i < len(lines):
-                        if not lines[i].startswith(" ") and (lines[i].strip().startswith("def ") or lines[i].strip() == ""):
-                            break
-                        i += 1
-                    if i < len(lines) and lines[i].strip() == "":
-                        i += 1
-                    in_function = False
-                else:
-                    new_lines.append(line)
-                    i += 1
-            
-            if not function_found:
-                QMessageBox.warning(self, "Erro", f"Função '{function_name}' não encontrada.")
-                return
-            
-            # Remove linhas em branco extras
-            new_lines = [line for line in new_lines if line.strip() != "" or new_lines.index(line) == 0]
-            while len(new_lines) > 1 and new_lines[-1].strip() == "":
-                new_lines.pop()
-            
-            with open("preprocessing_custom.py", "w", encoding="utf-8") as f:
-                f.writelines(new_lines)
-            
-            # Recarrega o módulo
-            if 'preprocessing_custom' in sys.modules:
-                del sys.modules['preprocessing_custom']
-            import preprocessing_custom
+            get_registry().remove(function_name)  # Remove a função do ficheiro e do módulo
             
             self.function_selector.blockSignals(True)
             self.load_functions()
@@ -364,42 +235,47 @@ class CustomFunctionManagerWindow(QDialog):
             
             QMessageBox.information(self, "Sucesso", f"Função '{function_name}' excluída com sucesso!")
             if self.app_parent:
-                column = self.app_parent.column
-                df = self.app_parent.df
-                update_callback = self.app_parent.update_callback
-                parent = self.app_parent.app_parent
-                
-                col_data = df[column]
-                dtype = str(col_data.dtype)
-                null_count = col_data.isnull().sum()
-                unique_values = col_data.dropna().unique()
-                try:
-                    unique_values = [float(val) for val in unique_values]
-                except (ValueError, TypeError):
-                    unique_values = [str(val) for val in unique_values]
-                unique_values = sorted(unique_values)
-                unique_str = ", ".join(map(str, unique_values[:5 if len(unique_values) > 10 else len(unique_values)]))
-                if len(unique_values) > 10:
-                    unique_str += f" (primeiros 5 de {len(unique_values)} valores únicos)"
-                details = f"Detalhes da coluna '{column}':\n- Tipo de dados: {dtype}\n- Contagem de valores nulos: {null_count}\n- Valores únicos: {unique_str}"
-                
-                self.app_parent.close()
-                QTimer.singleShot(100, lambda: self.reopen_details_window(column, details, df, update_callback, parent))  # Reabre janela com atraso
-            
-            self.close()
+                self.app_parent.refresh_custom_functions()  # Remove o botão sem reabrir a janela de detalhes
         except Exception as e:
-            raise
+            QMessageBox.critical(self, "Erro", f"Erro ao excluir a função: {str(e)}")
 
-    def reopen_details_window(self, column, details, df, update_callback, parent):
-        """Reabre a janela de detalhes com os dados fornecidos.
+    def profile_function(self):
+        """Mede a função seleccionada em amostras crescentes dos dados actuais, em segundo plano."""
+        function_name = self.function_selector.currentText()
+        function = get_registry().get_function(function_name)
+        if function is None:
+            QMessageBox.warning(self, "Erro", "Selecione uma função para perfilar.")
+            return
         
-        Args:
-            column: Nome da coluna a detalhar.
-            details: Texto com os detalhes da coluna.
-            df: DataFrame actualizado.
-            update_callback: Função de retorno para actualizar a interface.
-            parent: Janela pai.
-        """
-        from ui.details_window import ColumnDetailsWindow
-        new_details_window = ColumnDetailsWindow(column, details, df, update_callback, parent)
-        new_details_window.exec_()  # Mostra a nova janela de detalhes
\ No newline at end of file
+        # Com a pré-visualização activa, a estimativa é feita para o ficheiro completo
+        main_window = getattr(self.app_parent, 'app_parent', None)
+        full_df = getattr(main_window, 'full_df', None)
+        target_rows = len(full_df) if full_df is not None else None
+        
+        self.profile_btn.setEnabled(False)
+        self.status_label.setText(f"A perfilar '{function_name}' na coluna '{self.app_parent.column}'...")
+        self.profile_worker = FunctionWorker(profile_custom_function, self.app_parent.df, function,
+                                             self.app_parent.column, target_rows=target_rows)
+        self.profile_worker.result_ready.connect(self.show_profile)
+        self.profile_worker.failed.connect(self.show_profile_error)
+        self.profile_worker.start()
+
+    def show_profile(self, report):
+        """Mostra o relatório do perfil."""
+        self.profile_btn.setEnabled(True)
+        self.status_label.setText("")
+        QMessageBox.information(self, "Perfil da Função", format_profile_report(report))
+
+    def show_profile_error(self, message):
+        """Mostra o erro do perfil."""
+        self.profile_btn.setEnabled(True)
+        self.status_label.setText("")
+        QMessageBox.critical(self, "Erro", f"Erro ao perfilar a função: {message}")
+
+    def closeEvent(self, event):
+        """Espera pelo fim do perfil em curso antes de fechar."""
+        if self.profile_worker is not None and self.profile_worker.isRunning():
+            self.status_label.setText("Aguarde o fim do perfil em curso.")
+            event.ignore()
+            return
+        super().closeEvent(event)
\ No newline at end of file
@@ -1,106 +1,352 @@
 # ui/data_manager.py
+import os
 import pandas as pd
 import logging
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QFileDialog, QTableWidgetItem, QMessageBox
 from preprocessing_generic import update_valid_values as update_valid_values_generic
 from ui.column_interface import display_columns
-from model import predict_new_client
+from ui.workers import FunctionWorker, CsvLoadWorker
+from model import score_test_csv
+from schema import ScoringSchema
+from hot_folder import HotFolderScorer
+from preprocessing_pipeline import apply_steps
+from sampling import stratified_sample
+from memory_tracking import MemoryTracker
 
 logger = logging.getLogger(__name__)
 
 def load_csv(app):
-    """Carrega um ficheiro CSV e actualiza a interface da Tela 1.
+    """Carrega um ficheiro CSV por blocos e actualiza a interface da Tela 1.
+    
+    O primeiro bloco é mostrado de imediato (colunas e pré-visualização, ainda sem edição);
+    o resto é lido em segundo plano, com barra de progresso, resumo das colunas e cancelamento.
     
     Args:
         app: Instância de MLApp contendo o estado global (df, result_label, columns_header_label).
     """
+    if is_loading_csv(app):
+        return  # Já existe um carregamento em curso
     file_name, _ = QFileDialog.getOpenFileName(app, "Abrir CSV", "", "CSV Files (*.csv)")
     if not file_name:
         return  # Sai se nenhum ficheiro for seleccionado
     
-    try:
-        app.df = pd.read_csv(file_name)  # Carrega o CSV para o DataFrame
-        logger.debug(f"Colunas do DataFrame após carregamento: {list(app.df.columns)}")
-        if 'result' not in app.df.columns:
+    # Repostos se o carregamento for cancelado
+    previous_df, previous_full_df, previous_loaded_df = app.df, app.full_df, app.loaded_df
+    tracker = MemoryTracker('load_csv').start()
+    worker = CsvLoadWorker(file_name)
+    app.csv_load_worker = worker
+    
+    def show_first_chunk(chunk):
+        logger.debug(f"Colunas do DataFrame após o primeiro bloco: {list(chunk.columns)}")
+        if 'result' not in chunk.columns:
+            worker.requestInterruption()
             logger.warning("Coluna 'result' não encontrada no CSV")
             app.result_label.setText("Este CSV não é um CSV de treino. A coluna 'result' é obrigatória.")
             QMessageBox.warning(app, "Coluna Ausente", 
                                 "O CSV carregado não contém a coluna 'result', que é obrigatória para o treino do modelo. "
                                 "Por favor, carregue um CSV que contenha a coluna 'result'.")
-            app.df = None  # Repõe o DataFrame para None
-            app.columns_header_label.setVisible(False)  # Esconde o cabeçalho das colunas
-            display_columns(app)  # Actualiza a interface para mostrar o estado vazio
             return
-        
+        app.df = chunk  # Pré-visualização: só leitura até o ficheiro estar completo
+        app.full_df = None
+        app.columns_header_label.setText(f"Colunas do CSV (a carregar {os.path.basename(file_name)}...)")
+        app.columns_header_label.setVisible(True)
+        display_columns(app)
+        app.columns_widget.setEnabled(False)
+        _fill_preview_table(app, chunk)
+    
+    def show_progress(fraction, rows, summary):
+        app.load_progress.setValue(int(fraction * 100))
+        app.load_stats_label.setText(_format_load_summary(rows, summary))
+    
+    def finish(df, sketches):
+        if 'result' not in df.columns:
+            restore()  # Ficheiro pequeno lido por completo antes de o primeiro bloco ser rejeitado
+            return
+        tracker.stop(df=df, file=file_name)
+        _end_loading(app)
+        app.df = df
+        app.loaded_df = df.copy(deep=False)  # Objecto próprio: com copy-on-write, as transformações de app.df não o alteram
+        app.full_df = None  # Um ficheiro novo descarta a pré-visualização anterior
+        app.sketch_cache.adopt(df, sketches)  # Os resumos dos blocos servem para preencher nulos e outliers
+        if app.preview_checkbox.isChecked():
+            enter_preview_mode(app)  # Mostra apenas a amostra estratificada
+        else:
+            app.columns_header_label.setText("Colunas do CSV")
         display_columns(app)  # Mostra as colunas na interface
         update_valid_values(app)  # Calcula os valores válidos
         app.columns_header_label.setVisible(True)  # Torna o cabeçalho visível
-    except Exception as e:
-        logger.error(f"Erro ao carregar o CSV: {str(e)}")
-        app.df = None
-        app.columns_header_label.setVisible(False)
-        display_columns(app)  # Reflecte o erro na interface
-        QMessageBox.critical(app, "Erro", f"Erro ao carregar o CSV: {str(e)}")
+    
+    def restore(message=None):
+        tracker.abort()
+        _end_loading(app)
+        app.df, app.full_df, app.loaded_df = previous_df, previous_full_df, previous_loaded_df
+        app.columns_header_label.setVisible(app.df is not None)
+        display_columns(app)  # Volta ao estado anterior ao carregamento
+        if message is not None:
+            logger.error(f"Erro ao carregar o CSV: {message}")
+            QMessageBox.critical(app, "Erro", f"Erro ao carregar o CSV: {message}")
+    
+    worker.first_chunk.connect(show_first_chunk)
+    worker.progress.connect(show_progress)
+    worker.loaded.connect(finish)
+    worker.cancelled.connect(restore)
+    worker.failed.connect(restore)
+    worker.finished.connect(worker.deleteLater)
+    
+    app.load_btn.setEnabled(False)
+    app.preview_checkbox.setEnabled(False)
+    app.load_progress.setValue(0)
+    app.load_progress.setVisible(True)
+    app.cancel_load_btn.setVisible(True)
+    app.load_stats_label.setText("A ler o cabeçalho e o primeiro bloco...")
+    app.load_stats_label.setVisible(True)
+    worker.start()
+
+def cancel_csv_load(app):
+    """Cancela o carregamento em curso; os blocos já lidos são descartados.
+    
+    Args:
+        app: Instância de MLApp com csv_load_worker.
+    """
+    if is_loading_csv(app):
+        app.load_stats_label.setText("A cancelar o carregamento...")
+        app.csv_load_worker.requestInterruption()
+
+def is_loading_csv(app):
+    """Indica se há um CSV a ser carregado em segundo plano."""
+    worker = getattr(app, 'csv_load_worker', None)
+    return worker is not None and worker.isRunning()
+
+def _end_loading(app):
+    """Esconde os controlos de carregamento e volta a permitir a edição."""
+    app.csv_load_worker = None
+    app.load_btn.setEnabled(True)
+    app.preview_checkbox.setEnabled(True)
+    app.columns_widget.setEnabled(True)
+    app.load_progress.setVisible(False)
+    app.cancel_load_btn.setVisible(False)
+    app.load_stats_label.setVisible(False)
+    app.csv_preview_table.setVisible(False)
+    app.csv_preview_table.clear()
+
+def _fill_preview_table(app, chunk, max_rows=20):
+    """Mostra as primeiras linhas do CSV na tabela de pré-visualização."""
+    head = chunk.head(max_rows)
+    app.csv_preview_table.setRowCount(len(head))
+    app.csv_preview_table.setColumnCount(len(head.columns))
+    app.csv_preview_table.setHorizontalHeaderLabels([str(col) for col in head.columns])
+    for i, row in enumerate(head.itertuples(index=False)):
+        for j, value in enumerate(row):
+            app.csv_preview_table.setItem(i, j, QTableWidgetItem("" if pd.isna(value) else str(value)))
+    app.csv_preview_table.setVisible(True)
+
+def _format_load_summary(rows, summary):
+    """Formata o resumo das colunas lidas até ao momento."""
+    lines = [f"{rows} linhas lidas"]
+    for column, stats in summary.items():
+        text = f"{column}: {stats['nulls']} nulos"
+        if stats['mean'] is not None:
+            text += f", média {stats['mean']:.4g}, mediana {stats['median']:.4g}"
+        elif stats['mode'] is not None:
+            text += f", moda {stats['mode']}"
+        lines.append(text)
+    return "\n".join(lines)
 
 def load_test_csv(app):
     """Carrega um CSV de teste e gera previsões para múltiplas linhas na Tela 3.
     
+    O ficheiro é validado e previsto por blocos com o esquema do modelo; as linhas inválidas
+    vão para '<nome>_quarantine.csv', com o motivo, sem impedir a previsão das restantes.
+    
     Args:
-        app: Instância de MLApp com training_columns, knn, scaler e test_result_table.
+        app: Instância de MLApp com training_columns, valid_values, knn, scaler e test_result_table.
     """
     file_name, _ = QFileDialog.getOpenFileName(app, "Abrir CSV de Teste", "", "CSV Files (*.csv)")
     if not file_name:
         return  # Sai se nenhum ficheiro for seleccionado
     
     try:
-        test_df = pd.read_csv(file_name)  # Carrega o CSV de teste
-        
-        # Verifica se todas as colunas de treino estão presentes
-        missing_cols = [col for col in app.training_columns if col not in test_df.columns]
-        if missing_cols:
-            app.predict_result.setText(f"Colunas em falta no CSV de teste: {', '.join(missing_cols)}")
+        schema = ScoringSchema.from_model(app.training_columns, app.valid_values)
+        try:
+            summary = score_test_csv(file_name, app.knn, app.scaler, app.training_columns, schema,
+                                     include_neighbors=app.include_neighbors_checkbox.isChecked(),
+                                     cache=app.prediction_cache, model_version=app.model_version)
+        except ValueError as e:
+            app.predict_result.setText(str(e))  # Colunas obrigatórias em falta
             return
         
-        # Garante que as colunas sejam numéricas e sem valores nulos
-        for col in app.training_columns:
-            if not pd.api.types.is_numeric_dtype(test_df[col]):
-                app.predict_result.setText(f"A coluna '{col}' no CSV de teste contém valores não numéricos.")
-                return
-            if test_df[col].isnull().any():
-                app.predict_result.setText(f"A coluna '{col}' no CSV de teste contém valores NaN.")
-                return
-        
-        # Valida o intervalo de 'bdate_age', se aplicável
-        if 'bdate_age' in app.training_columns:
-            invalid_rows = test_df[(test_df['bdate_age'] < 16) | (test_df['bdate_age'] > 75)]
-            if not invalid_rows.empty:
-                app.predict_result.setText(f"A coluna 'bdate_age' contém valores fora do intervalo (16 a 75 anos).")
-                return
-        
-        # Prepara os dados e gera previsões com o modelo treinado
-        X_test = test_df[app.training_columns]
-        predictions, probabilities = predict_new_client(X_test.values, app.knn, app.scaler, app.training_columns)
-        
         # Preenche a tabela com os resultados das previsões
-        app.test_result_table.setRowCount(len(predictions))
-        for i, (pred, prob) in enumerate(zip(predictions, probabilities)):
-            app.test_result_table.setItem(i, 0, QTableWidgetItem(str(test_df['id'].iloc[i] if 'id' in test_df else i)))
-            app.test_result_table.setItem(i, 1, QTableWidgetItem(f"{pred} (Prob: {prob[1]:.2f})"))
+        output_df = pd.read_csv(summary['output_file'])
+        app.test_result_table.setRowCount(len(output_df))
+        for i, (pred, prob) in enumerate(zip(output_df['prediction'], output_df['probability'])):
+            app.test_result_table.setItem(i, 0, QTableWidgetItem(str(output_df['id'].iloc[i] if 'id' in output_df else i)))
+            app.test_result_table.setItem(i, 1, QTableWidgetItem(f"{pred} (Prob: {prob:.2f})"))
         
-        # Guarda o CSV com as previsões
-        test_df['prediction'] = predictions
-        test_df['probability'] = [prob[1] for prob in probabilities]
-        output_file = file_name.replace('.csv', '_predictions.csv')
-        test_df.to_csv(output_file, index=False)
-        app.predict_result.setText(f"Previsões concluídas! Resultados guardados em {output_file}")
+        stats = app.prediction_cache.stats()
+        message = f"Previsões concluídas! {summary['scored']} linhas guardadas em {summary['output_file']}\n"
+        if summary['quarantined']:
+            reasons = ", ".join(f"{col}: {count}" for col, count in sorted(summary['reasons'].items()))
+            message += (f"{summary['quarantined']} linhas inválidas em quarentena em {summary['quarantine_file']} "
+                        f"({reasons})\n")
+        app.predict_result.setText(message + f"Cache: {stats['hits']} acertos, {stats['misses']} falhas")
     except Exception as e:
         logger.error(f"Erro ao processar o CSV de teste: {str(e)}")
         app.predict_result.setText(f"Erro ao processar o CSV de teste: {str(e)}")
 
+def toggle_hot_folder(app):
+    """Inicia a vigilância de uma pasta de CSVs de teste com o modelo actual, ou pára a que está em curso.
+    
+    Cada CSV novo na pasta é previsto em segundo plano num pool de processos e gravado como
+    '<nome>_predictions.csv'; o manifesto da pasta evita repetir ficheiros entre execuções.
+    
+    Args:
+        app: Instância de MLApp com knn, scaler, training_columns, hot_folder_btn e hot_folder_label.
+    """
+    if app.hot_folder is not None:
+        app.hot_folder.stop()  # Os ficheiros em curso terminam antes de a thread regressar
+        app.hot_folder_btn.setEnabled(False)
+        app.hot_folder_label.setText("A terminar os ficheiros em curso...")
+        return
+    folder = QFileDialog.getExistingDirectory(app, "Pasta de CSVs de Teste a Vigiar")
+    if not folder:
+        return  # Sai se nenhuma pasta for seleccionada
+    try:
+        scorer = HotFolderScorer(folder, app.knn, app.scaler, app.training_columns, valid_values=app.valid_values,
+                                 include_neighbors=app.include_neighbors_checkbox.isChecked())
+    except ValueError as e:
+        app.predict_result.setText(str(e))
+        return
+    
+    worker = FunctionWorker(scorer.run)
+    timer = QTimer(app)
+    timer.timeout.connect(lambda: show_hot_folder_status(app))
+    
+    def finish(result=None):
+        timer.stop()
+        app.hot_folder = app.hot_folder_worker = None
+        show_hot_folder_status(app, scorer.last_metrics)
+    
+    def fail(message):
+        finish()
+        app.predict_result.setText(f"A vigilância da pasta parou com um erro: {message}")
+    
+    worker.result_ready.connect(finish)
+    worker.failed.connect(fail)
+    app.hot_folder, app.hot_folder_worker = scorer, worker
+    worker.start()
+    timer.start(1000)
+    show_hot_folder_status(app)
+
+def show_hot_folder_status(app, metrics=None):
+    """Mostra o estado da vigilância da pasta (ou as métricas finais) na Tela 3.
+    
+    Args:
+        app: Instância de MLApp com hot_folder, hot_folder_btn e hot_folder_label.
+        metrics: Métricas finais de uma vigilância terminada, opcional.
+    """
+    if getattr(app, 'hot_folder_label', None) is None:
+        return  # A Tela 3 ainda não foi construída
+    scorer = app.hot_folder
+    app.hot_folder_btn.setEnabled(True)
+    app.hot_folder_btn.setText("Parar Vigilância" if scorer is not None else "Vigiar Pasta de CSVs de Teste")
+    metrics = scorer.last_metrics if scorer is not None else metrics
+    if metrics is None:
+        app.hot_folder_label.setText(f"A vigiar {scorer.watch_dir}..." if scorer is not None else "")
+        return
+    state = f"A vigiar {scorer.watch_dir}" if scorer is not None else "Vigilância terminada"
+    app.hot_folder_label.setText(f"{state}: {metrics['files_done']} ficheiros previstos "
+                                 f"({metrics['rows_scored']} linhas, {metrics['rows_quarantined']} em quarentena), "
+                                 f"{metrics['files_failed']} com erro, "
+                                 f"{metrics['backlog']} em espera; {metrics['rows_per_second']} linhas/s")
+
+def stop_hot_folder(app):
+    """Pára a vigilância da pasta e espera pelos ficheiros em curso (ao fechar a aplicação).
+    
+    Args:
+        app: Instância de MLApp com hot_folder e hot_folder_worker.
+    """
+    if app.hot_folder is not None:
+        app.hot_folder.stop()
+        app.hot_folder_worker.wait()
+
 def update_valid_values(app):
     """Actualiza os valores válidos do DataFrame usando a função de preprocessing_generic.
     
     Args:
         app: Instância de MLApp contendo o DataFrame (app.df) e o dicionário valid_values.
     """
-    app.valid_values = update_valid_values_generic(app.df)  # Calcula e armazena os valores válidos
\ No newline at end of file
+    app.valid_values = update_valid_values_generic(app.df)  # Calcula e armazena os valores válidos
+
+def toggle_preview_mode(app, state):
+    """Activa ou termina o modo de pré-visualização ao alterar a caixa de selecção da Tela 1.
+    
+    Args:
+        app: Instância de MLApp contendo df, full_df e transform_recipe.
+        state: Estado da caixa de selecção (Qt.Checked ou Qt.Unchecked).
+    """
+    if app.df is None:
+        return
+    if state and app.full_df is None:
+        enter_preview_mode(app)
+        display_columns(app)
+        update_valid_values(app)
+    elif not state and app.full_df is not None:
+        commit_preview(app)  # Sair da pré-visualização aplica as transformações ao conjunto completo
+
+def enter_preview_mode(app):
+    """Substitui app.df por uma amostra estratificada por 'result', guardando o conjunto completo.
+    
+    Args:
+        app: Instância de MLApp contendo df, preview_size_input e transform_recipe.
+    """
+    app.full_df = app.df
+    app.preview_recipe_start = len(app.transform_recipe)  # Passos seguintes serão reaplicados no conjunto completo
+    app.df = stratified_sample(app.full_df, app.preview_size_input.value())
+    app.columns_header_label.setText(f"Colunas do CSV (pré-visualização: {len(app.df)} de {len(app.full_df)} linhas)")
+    logger.debug(f"Modo de pré-visualização activado com {len(app.df)} linhas")
+
+def commit_preview(app, on_done=None):
+    """Reaplica em segundo plano, numa única passagem, as transformações da amostra ao conjunto completo.
+    
+    Args:
+        app: Instância de MLApp em modo de pré-visualização (full_df definido).
+        on_done: Função opcional chamada sem argumentos quando o conjunto completo estiver pronto.
+    """
+    if app.full_df is None:
+        if on_done:
+            on_done()
+        return
+    if getattr(app, 'replay_worker', None) is not None and app.replay_worker.isRunning():
+        return  # Já existe uma reaplicação em curso
+    
+    steps = app.transform_recipe[app.preview_recipe_start:]
+    app.columns_header_label.setText(f"A aplicar {len(steps)} transformações a {len(app.full_df)} linhas...")
+    app.preview_checkbox.setEnabled(False)
+    
+    def finish(full_df):
+        app.df = full_df
+        app.full_df = None
+        app.preview_checkbox.blockSignals(True)
+        app.preview_checkbox.setChecked(False)
+        app.preview_checkbox.blockSignals(False)
+        app.preview_checkbox.setEnabled(True)
+        app.columns_header_label.setText("Colunas do CSV")
+        display_columns(app)
+        update_valid_values(app)
+        logger.debug(f"Pré-visualização aplicada ao conjunto completo ({len(full_df)} linhas)")
+        if on_done:
+            on_done()
+    
+    def fail(message):
+        app.preview_checkbox.setEnabled(True)
+        app.preview_checkbox.blockSignals(True)
+        app.preview_checkbox.setChecked(True)  # Continua em pré-visualização para o utilizador corrigir
+        app.preview_checkbox.blockSignals(False)
+        app.columns_header_label.setText("Colunas do CSV (pré-visualização)")
+        QMessageBox.critical(app, "Erro", f"Erro ao aplicar as transformações ao conjunto completo: {message}")
+    
+    app.replay_worker = FunctionWorker(apply_steps, app.full_df, steps, cache=app.transform_cache)
+    app.replay_worker.result_ready.connect(finish)
+    app.replay_worker.failed.connect(fail)
+    app.replay_worker.start()
\ No newline at end of file
@@ -1,16 +1,20 @@
 # ui/details_window.py
-import inspect
 import importlib
 import logging
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTextEdit, 
-                             QLabel, QMessageBox, QApplication)
+                             QLabel, QMessageBox, QApplication, QCheckBox)
 from preprocessing_generic import (convert_to_numeric, fill_missing_values, encode_categorical, 
-                                   convert_to_datetime, remove_outliers)
-import preprocessing_custom
+                                   encode_one_hot_sparse, encode_hashing_sparse, encode_multilabel_bits,
+                                   convert_to_datetime, extract_date_features, remove_outliers, remove_nulls)
+from preprocessing_pipeline import make_step, run_custom_function
+from custom_function_registry import get_registry
+from memory_tracking import MemoryTracker
 from ui.custom_function_manager import CustomFunctionManagerWindow
 
 logger = logging.getLogger(__name__)
 
+CACHE_LEVELS = {'memory': 'memória', 'disk': 'disco'}
+
 class ColumnDetailsWindow(QDialog):
     """Janela para visualizar e transformar uma coluna do DataFrame."""
     
@@ -32,6 +36,9 @@ class ColumnDetailsWindow(QDialog):
         self.df = df
         self.update_callback = update_callback
         self.df_history = []  # Histórico para desfazer alterações
+        self.recorded_history = []  # Indica, por estado do histórico, se o passo foi registado na receita
+        self.memory_tracker = None  # Medição de memória da transformação em curso
+        self.cache_source = None  # Nível da cache de transformações de onde veio o último resultado, se veio
         self.app_parent = parent
         
         layout = QVBoxLayout()  # Layout principal vertical
@@ -45,13 +52,20 @@ class ColumnDetailsWindow(QDialog):
         # Secção de funções genéricas
         generic_layout = QVBoxLayout()
         generic_layout.addWidget(QLabel("Funções Genéricas"))
+        # Mediana, moda e quartis aproximados a partir de um resumo reutilizável da coluna
+        self.sketch_checkbox = QCheckBox("Usar Resumos Aproximados (Sketches)")
+        generic_layout.addWidget(self.sketch_checkbox)
         for btn_text, action in [
             ("Converter para Numérico", self.convert_to_numeric),
             ("Preencher Nulos com Mediana", lambda: self.fill_missing_values('median')),
             ("Preencher Nulos com Média", lambda: self.fill_missing_values('mean')),
             ("Preencher Nulos com Moda", lambda: self.fill_missing_values('mode')),
             ("Codificar Categóricos (LabelEncoder)", self.encode_categorical),
+            ("Codificar One-Hot Esparso (Top 50)", self.encode_one_hot_sparse),
+            ("Codificar por Hashing Esparso (32)", self.encode_hashing_sparse),
+            ("Separar Multi-Etiqueta (Top 16)", self.encode_multilabel_bits),
             ("Converter para Datetime", self.convert_to_datetime),
+            ("Extrair Atributos de Data", self.extract_date_features),
             ("Remover Outliers (IQR)", self.remove_outliers),
             ("Remover Nulos", self.remove_nulls)
         ]:
@@ -91,27 +105,18 @@ class ColumnDetailsWindow(QDialog):
         logger.debug("ColumnDetailsWindow inicializado com sucesso")
 
     def load_custom_functions(self):
-        """Carrega funções personalizadas do módulo preprocessing_custom como botões."""
+        """Carrega funções personalizadas do registo como botões."""
         logger.debug("Iniciando load_custom_functions")
-        import preprocessing_custom
-        functions = inspect.getmembers(preprocessing_custom, inspect.isfunction)
-        logger.debug(f"Funções carregadas: {[name for name, _ in functions]}")
+        registry = get_registry()
+        logger.debug(f"Funções carregadas: {registry.names()}")
         
         # Remove botões existentes para evitar duplicação
         for name in list(self.custom_buttons.keys()):
-            btn = self.custom_buttons.pop(name)
-            self.custom_buttons_layout.removeWidget(btn)
-            btn.setParent(None)
-            btn.deleteLater()
-            logger.debug(f"Botão '{name}' removido do layout")
+            self._remove_custom_button(name)
         
         # Adiciona botões para cada função personalizada
-        for name, func in functions:
-            btn = QPushButton(name.replace('_', ' ').title())  # Formata o nome para legibilidade
-            btn.clicked.connect(lambda checked, f=func: self.apply_custom_function(f))
-            self.custom_buttons_layout.addWidget(btn)
-            self.custom_buttons[name] = btn
-            logger.debug(f"Botão '{name}' adicionado ao layout")
+        for name in registry.names():
+            self._add_custom_button(name)
         
         QApplication.processEvents()  # Garante actualização da interface
         self.custom_layout.activate()
@@ -120,11 +125,34 @@ class ColumnDetailsWindow(QDialog):
         logger.debug("load_custom_functions concluído")
 
     def refresh_custom_functions(self):
-        """Actualiza a lista de funções personalizadas exibidas."""
+        """Actualiza no local os botões de funções personalizadas que mudaram no registo."""
         logger.debug("Iniciando refresh_custom_functions")
-        self.load_custom_functions()  # Recarrega os botões
+        names = get_registry().names()
+        for name in [name for name in self.custom_buttons if name not in names]:
+            self._remove_custom_button(name)  # Função removida ou renomeada
+        for name in names:
+            if name not in self.custom_buttons:
+                self._add_custom_button(name)  # Função nova
+        # As funções editadas não precisam de novos botões: cada botão obtém a versão actual ao ser clicado
+        self.custom_layout.activate()
         logger.debug("refresh_custom_functions concluído")
 
+    def _add_custom_button(self, name):
+        """Cria o botão de uma função personalizada, resolvida no registo no momento do clique."""
+        btn = QPushButton(name.replace('_', ' ').title())  # Formata o nome para legibilidade
+        btn.clicked.connect(lambda checked, n=name: self.apply_custom_function(get_registry().get_function(n)))
+        self.custom_buttons_layout.addWidget(btn)
+        self.custom_buttons[name] = btn
+        logger.debug(f"Botão '{name}' adicionado ao layout")
+
+    def _remove_custom_button(self, name):
+        """Remove o botão de uma função personalizada."""
+        btn = self.custom_buttons.pop(name)
+        self.custom_buttons_layout.removeWidget(btn)
+        btn.setParent(None)
+        btn.deleteLater()
+        logger.debug(f"Botão '{name}' removido do layout")
+
     def open_custom_function_manager(self):
         """Abre a janela de gestão de funções personalizadas."""
         logger.debug("Abrindo CustomFunctionManagerWindow")
@@ -136,62 +164,145 @@ class ColumnDetailsWindow(QDialog):
         logger.debug(f"Aplicando função personalizada '{func.__name__}' na coluna '{self.column}'")
         self.save_state()  # Guarda o estado antes da alteração
         try:
-            result = func(self.df, self.column)
+            result, report = run_custom_function(self.df, func, self.column,
+                                                 cache=getattr(self.app_parent, 'transform_cache', None))
             if result is None:
                 logger.error(f"A função '{func.__name__}' retornou None")
                 raise ValueError(f"A função {func.__name__} retornou None. Ela deve retornar um DataFrame.")
             self.df = result
+            self._record_step(func)
+            if getattr(self.app_parent, 'sketch_cache', None) is not None:
+                self.app_parent.sketch_cache.invalidate()  # A função pode ter alterado várias colunas
             if not hasattr(self.app_parent, 'df'):
                 logger.error("self.app_parent não tem atributo 'df'")
                 raise AttributeError("self.app_parent não tem atributo 'df'")
             self.app_parent.df = self.df  # Sincroniza com o DataFrame pai
             self.update_callback(self.app_parent)  # Chama a função de retorno
             self.update_details()  # Actualiza os detalhes exibidos
+            self._finish_memory_tracking()
+            self.details_text.setText(self.details_text.toPlainText() + self._format_execution_report(report))
             logger.debug(f"Função '{func.__name__}' aplicada com sucesso")
         except Exception as e:
             logger.error(f"Erro ao aplicar a função '{func.__name__}': {str(e)}")
+            self._abort_memory_tracking()
             self.details_text.setText(self.details_text.toPlainText() + f"\nErro ao aplicar a função: {str(e)}")
 
+    @staticmethod
+    def _format_execution_report(report):
+        """Descreve como a função personalizada foi executada e a aceleração obtida."""
+        if report['mode'] == 'cache':
+            return f"\nResultado reutilizado da cache de transformações ({CACHE_LEVELS[report['reason']]})"
+        if report['mode'] == 'uniques':
+            text = (f"\nExecutada sobre {report['uniques']} valores distintos ({report['rows']} linhas) "
+                    f"em {report['seconds']:.3f}s")
+            if report['speedup'] is not None:
+                text += f"; aceleração estimada: {report['speedup']:.1f}x"
+            return text
+        return f"\nExecutada linha a linha em {report['seconds']:.3f}s ({report['reason']})"
+
+    def _transform(self, function, **params):
+        """Aplica uma função genérica à coluna, reutilizando o resultado da cache de transformações se existir."""
+        cache = getattr(self.app_parent, 'transform_cache', None)
+        try:
+            if cache is None:
+                return function(self.df, self.column, **params)
+            result, self.cache_source = cache.run(self.df, function, self.column, params)
+            return result
+        except Exception:
+            self._abort_memory_tracking()  # A medição não deve ficar aberta nem ser registada como sucesso
+            raise
+
     def save_state(self):
         """Guarda o estado actual do DataFrame no histórico para desfazer alterações."""
         logger.debug("Guardando estado do DataFrame no histórico")
+        if self.memory_tracker is not None:
+            self.memory_tracker.abort()  # A transformação anterior falhou antes de terminar
+        self.memory_tracker = MemoryTracker(f"transform:{self.column}").start()  # Inclui a cópia para o histórico
         self.df_history.append(self.df.copy())
+        self.recorded_history.append(False)
         logger.debug(f"Histórico agora tem {len(self.df_history)} estados")
 
     def convert_to_numeric(self):
         """Converte a coluna seleccionada para tipo numérico."""
         logger.debug(f"Convertendo coluna '{self.column}' para numérico")
         self.save_state()
-        self.df = convert_to_numeric(self.df, self.column)
+        self.df = self._transform(convert_to_numeric)
+        self._record_step(convert_to_numeric)
         self._apply_changes()
 
     def fill_missing_values(self, method):
         """Preenche valores nulos na coluna com o método especificado."""
         logger.debug(f"Preenchendo valores nulos na coluna '{self.column}' com método '{method}'")
+        sketch = self._get_sketch()
         self.save_state()
-        self.df = fill_missing_values(self.df, self.column, method)
+        self.df = self._transform(fill_missing_values, method=method, sketch=sketch)
+        # A receita guarda a escolha aproximada/exacta; o resumo é reconstruído sobre os dados reaplicados
+        self._record_step(fill_missing_values, method=method, **self._approximate_params(sketch))
         self._apply_changes()
+        self._report_sketch(sketch, 'mode' if method == 'mode' else 'quantile')
 
     def encode_categorical(self):
         """Codifica a coluna categórica usando LabelEncoder."""
         logger.debug(f"Codificando coluna categórica '{self.column}'")
         self.save_state()
-        self.df = encode_categorical(self.df, self.column)
+        self.df = self._transform(encode_categorical)
+        self._record_step(encode_categorical)
+        self._apply_changes()
+
+    def encode_one_hot_sparse(self):
+        """Substitui a coluna por colunas one-hot esparsas das 50 categorias mais frequentes."""
+        logger.debug(f"Codificando coluna '{self.column}' em one-hot esparso")
+        self.save_state()
+        before = set(self.df.columns)
+        self.df = self._transform(encode_one_hot_sparse)
+        # A receita guarda as categorias escolhidas aqui: reaplicada ao conjunto completo, as mais
+        # frequentes podiam ser outras e dar colunas diferentes das da pré-visualização
+        prefix = f"{self.column}__"
+        categories = [col[len(prefix):] for col in self.df.columns if col not in before]
+        self._record_step(encode_one_hot_sparse, categories=categories)
+        self._apply_changes()
+
+    def encode_hashing_sparse(self):
+        """Substitui a coluna por 32 colunas esparsas obtidas por hashing."""
+        logger.debug(f"Codificando coluna '{self.column}' por hashing esparso")
+        self.save_state()
+        self.df = self._transform(encode_hashing_sparse)
+        self._record_step(encode_hashing_sparse)
+        self._apply_changes()
+
+    def encode_multilabel_bits(self):
+        """Substitui uma coluna multi-etiqueta (ex.: 'pt;en') por indicadores 0/1 das 16 etiquetas mais frequentes."""
+        logger.debug(f"Separando coluna multi-etiqueta '{self.column}'")
+        self.save_state()
+        self.df = self._transform(encode_multilabel_bits)
+        self._record_step(encode_multilabel_bits)
         self._apply_changes()
 
     def convert_to_datetime(self):
         """Converte a coluna para formato datetime."""
         logger.debug(f"Convertendo coluna '{self.column}' para datetime")
         self.save_state()
-        self.df = convert_to_datetime(self.df, self.column)
+        self.df = self._transform(convert_to_datetime)
+        self._record_step(convert_to_datetime)
+        self._apply_changes()
+
+    def extract_date_features(self):
+        """Substitui a coluna de datas por ano, mês, idade, dias decorridos e indicador de data parcial."""
+        logger.debug(f"Extraindo atributos de data da coluna '{self.column}'")
+        self.save_state()
+        self.df = self._transform(extract_date_features)
+        self._record_step(extract_date_features)
         self._apply_changes()
 
     def remove_outliers(self):
         """Remove outliers da coluna usando o método IQR."""
         logger.debug(f"Removendo outliers da coluna '{self.column}'")
+        sketch = self._get_sketch()
         self.save_state()
-        self.df = remove_outliers(self.df, self.column)
+        self.df = self._transform(remove_outliers, sketch=sketch)
+        self._record_step(remove_outliers, **self._approximate_params(sketch))
         self._apply_changes()
+        self._report_sketch(sketch, 'quantile')
 
     def remove_nulls(self):
         """Remove linhas com valores nulos na coluna seleccionada após confirmação."""
@@ -203,7 +314,7 @@ class ColumnDetailsWindow(QDialog):
             return
         
         original_size = len(self.df)
-        temp_df = self.df.dropna(subset=[self.column])  # Remove linhas com nulos na coluna
+        temp_df = self._transform(remove_nulls)  # Remove linhas com nulos na coluna
         rows_to_remove = original_size - len(temp_df)
         
         message = (f"A remoção de nulos afectará apenas as linhas com valores ausentes na coluna '{self.column}'.\n"
@@ -216,10 +327,12 @@ class ColumnDetailsWindow(QDialog):
         if reply == QMessageBox.Yes:
             self.save_state()
             self.df = temp_df
+            self._record_step(remove_nulls)
             self._apply_changes()
             logger.debug(f"{rows_to_remove} linhas removidas")
             QMessageBox.information(self, "Sucesso", f"{rows_to_remove} linhas com nulos removidas.")
         else:
+            self.cache_source = None
             logger.debug("Remoção de nulos cancelada pelo utilizador")
 
     def undo_last_modification(self):
@@ -227,6 +340,9 @@ class ColumnDetailsWindow(QDialog):
         logger.debug("Desfazendo última modificação")
         if self.df_history:
             self.df = self.df_history.pop()  # Restaura o estado anterior
+            recipe = getattr(self.app_parent, 'transform_recipe', None)
+            if self.recorded_history.pop() and recipe:
+                recipe.pop()  # Remove da receita o passo desfeito
             self._apply_changes()
             logger.debug("Modificação desfeita com sucesso")
         else:
@@ -236,6 +352,12 @@ class ColumnDetailsWindow(QDialog):
     def update_details(self):
         """Actualiza os detalhes exibidos da coluna após alterações."""
         logger.debug(f"Actualizando detalhes da coluna '{self.column}'")
+        if self.column not in self.df.columns:
+            # A coluna foi substituída por outras (ex.: codificação one-hot)
+            derived = [col for col in self.df.columns if col.startswith(f"{self.column}__")]
+            self.details_text.setText(f"A coluna '{self.column}' foi substituída por {len(derived)} colunas: "
+                                      + ", ".join(derived[:10]) + (" ..." if len(derived) > 10 else ""))
+            return
         col_data = self.df[self.column]
         dtype = str(col_data.dtype)
         null_count = col_data.isnull().sum()
@@ -256,10 +378,67 @@ class ColumnDetailsWindow(QDialog):
         self.details_text.setText(details)
         logger.debug("Detalhes actualizados com sucesso")
 
+    def _get_sketch(self):
+        """Devolve o resumo da coluna se os sketches estiverem activos, ou None para o cálculo exacto."""
+        cache = getattr(self.app_parent, 'sketch_cache', None)
+        if cache is None or not self.sketch_checkbox.isChecked():
+            return None
+        if self.column not in self.df.columns:
+            return None
+        return cache.get(self.df, self.column)
+
+    @staticmethod
+    def _approximate_params(sketch):
+        """Parâmetros que registam na receita um passo calculado sobre um resumo aproximado."""
+        return {'approximate': True} if sketch is not None else {}
+
+    def _report_sketch(self, sketch, kind):
+        """Acrescenta aos detalhes o limite de erro da estatística aproximada."""
+        if sketch is None:
+            return
+        bounds = sketch.error_bounds()
+        if kind == 'quantile':
+            text = f"\nQuantis aproximados: erro de ordem até {bounds['rank_error']:.2%} das linhas"
+        else:
+            text = (f"\nModa aproximada: contagens subestimadas até {bounds['mode_error']:.2%} das linhas"
+                    + (" (moda garantida)" if bounds['mode_exact'] else ""))
+        self.details_text.setText(self.details_text.toPlainText() + text)
+
+    def _record_step(self, function, **params):
+        """Regista a transformação aplicada na receita da aplicação, para reaplicação em lote."""
+        recipe = getattr(self.app_parent, 'transform_recipe', None)
+        if recipe is not None:
+            recipe.append(make_step(function, self.column, **params))
+            if self.recorded_history:
+                self.recorded_history[-1] = True
+            logger.debug(f"Passo '{function.__name__}' registado na receita ({len(recipe)} passos)")
+        if self.memory_tracker is not None:
+            self.memory_tracker.operation = f"{function.__name__}:{self.column}"
+
     def _apply_changes(self):
         """Aplica as alterações ao DataFrame e actualiza a interface."""
         logger.debug("Aplicando mudanças ao DataFrame")
+        cache = getattr(self.app_parent, 'sketch_cache', None)
+        if cache is not None:
+            cache.invalidate(self.column)  # O resumo da coluna alterada deixa de ser válido
         self.app_parent.df = self.df  # Sincroniza com o DataFrame pai
         self.update_callback(self.app_parent)  # Notifica a interface pai
         self.update_details()  # Actualiza os detalhes exibidos
-        logger.debug("Mudanças aplicadas com sucesso")
\ No newline at end of file
+        self._finish_memory_tracking()
+        if self.cache_source is not None:
+            self.details_text.setText(self.details_text.toPlainText()
+                                      + f"\nResultado reutilizado da cache de transformações ({CACHE_LEVELS[self.cache_source]})")
+            self.cache_source = None
+        logger.debug("Mudanças aplicadas com sucesso")
+
+    def _finish_memory_tracking(self):
+        """Regista a memória da transformação, incluindo o DataFrame e o histórico para desfazer."""
+        if self.memory_tracker is not None:
+            self.memory_tracker.stop(df=self.df, history=self.df_history)
+            self.memory_tracker = None
+
+    def _abort_memory_tracking(self):
+        """Descarta a medição de memória da transformação que falhou."""
+        if self.memory_tracker is not None:
+            self.memory_tracker.abort()
+            self.memory_tracker = None
\ No newline at end of file
@@ -0,0 +1,129 @@
+# ui/feature_selection_window.py
+import logging
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox, QSpinBox,
+                             QTableWidget, QTableWidgetItem, QAbstractItemView)
+from feature_selection import select_features, candidate_columns
+from ui.workers import FunctionWorker
+
+logger = logging.getLogger(__name__)
+
+class FeatureSelectionWindow(QDialog):
+    """Janela de selecção automática de colunas com a lista ordenada de conjuntos avaliados."""
+
+    def __init__(self, df, n_neighbors=5, on_select=None, parent=None):
+        """Inicializa a janela.
+
+        Args:
+            df: DataFrame processado com a coluna 'result'.
+            n_neighbors: Número de vizinhos usado na avaliação (padrão: 5).
+            on_select: Função chamada com a lista de colunas escolhida.
+            parent: Instância de MLApp, opcional, como janela pai.
+        """
+        super().__init__(parent)
+        self.setWindowTitle("Selecção Automática de Colunas")
+        self.setGeometry(200, 200, 700, 500)
+        self.df = df
+        self.on_select = on_select
+        self.results = []
+        self.worker = None
+
+        layout = QVBoxLayout()
+        candidates = candidate_columns(df)
+        excluded = [col for col in df.columns if col not in candidates and col not in ('id', 'result')]
+        info = f"Colunas candidatas: {', '.join(candidates) or 'nenhuma'}"
+        if excluded:
+            info += f"\nExcluídas (não numéricas ou com nulos): {', '.join(excluded)}"
+        info_label = QLabel(info)
+        info_label.setWordWrap(True)
+        layout.addWidget(info_label)
+
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(QLabel("Direcção:"))
+        self.direction_input = QComboBox()
+        self.direction_input.addItem("Para a frente (acrescentar)", 'forward')
+        self.direction_input.addItem("Para trás (retirar)", 'backward')
+        options_layout.addWidget(self.direction_input)
+        options_layout.addWidget(QLabel("Vizinhos (k):"))
+        self.neighbors_input = QSpinBox()
+        self.neighbors_input.setRange(1, 100)
+        self.neighbors_input.setValue(n_neighbors)
+        options_layout.addWidget(self.neighbors_input)
+        options_layout.addWidget(QLabel("Paciência:"))
+        self.patience_input = QSpinBox()
+        self.patience_input.setRange(1, 20)
+        self.patience_input.setValue(2)
+        options_layout.addWidget(self.patience_input)
+        layout.addLayout(options_layout)
+
+        self.run_btn = QPushButton("Avaliar Conjuntos")
+        self.run_btn.clicked.connect(self.run_selection)
+        self.run_btn.setEnabled(bool(candidates))
+        layout.addWidget(self.run_btn)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        self.results_table = QTableWidget()
+        self.results_table.setColumnCount(3)
+        self.results_table.setHorizontalHeaderLabels(["Colunas", "Acurácia", "Latência (ms/1000)"])
+        self.results_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.results_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        layout.addWidget(self.results_table)
+
+        buttons_layout = QHBoxLayout()
+        self.use_btn = QPushButton("Usar Conjunto Seleccionado")
+        self.use_btn.clicked.connect(self.use_selected)
+        self.use_btn.setEnabled(False)
+        buttons_layout.addWidget(self.use_btn)
+        close_btn = QPushButton("Fechar")
+        close_btn.clicked.connect(self.close)
+        buttons_layout.addWidget(close_btn)
+        layout.addLayout(buttons_layout)
+        self.setLayout(layout)
+
+    def run_selection(self):
+        """Executa a selecção em segundo plano (num pool de processos)."""
+        self.run_btn.setEnabled(False)
+        self.use_btn.setEnabled(False)
+        self.status_label.setText("A avaliar conjuntos de colunas...")
+        self.worker = FunctionWorker(select_features, self.df, direction=self.direction_input.currentData(),
+                                     n_neighbors=self.neighbors_input.value(), patience=self.patience_input.value())
+        self.worker.result_ready.connect(self.show_results)
+        self.worker.failed.connect(self.show_error)
+        self.worker.start()
+
+    def show_results(self, results):
+        """Preenche a tabela com os conjuntos ordenados por acurácia."""
+        self.results = results
+        self.results_table.setRowCount(len(results))
+        for i, item in enumerate(results):
+            self.results_table.setItem(i, 0, QTableWidgetItem(", ".join(item['columns'])))
+            self.results_table.setItem(i, 1, QTableWidgetItem(f"{item['accuracy']:.4f}"))
+            self.results_table.setItem(i, 2, QTableWidgetItem(f"{item['latency_ms']:.2f}"))
+        self.results_table.resizeColumnsToContents()
+        if results:
+            self.results_table.selectRow(0)
+        self.status_label.setText(f"{len(results)} conjuntos ordenados por acurácia (empates: menos colunas primeiro).")
+        self.run_btn.setEnabled(True)
+        self.use_btn.setEnabled(bool(results))
+
+    def show_error(self, message):
+        """Mostra o erro da selecção."""
+        self.status_label.setText(f"Erro na selecção automática: {message}")
+        self.run_btn.setEnabled(True)
+
+    def use_selected(self):
+        """Aplica o conjunto seleccionado às caixas de selecção da Tela 1 e fecha a janela."""
+        rows = self.results_table.selectionModel().selectedRows()
+        if not rows or self.on_select is None:
+            return
+        self.on_select(self.results[rows[0].row()]['columns'])
+        self.accept()
+
+    def closeEvent(self, event):
+        """Espera pelo fim da avaliação em curso antes de fechar (o pool é encerrado pela própria tarefa)."""
+        if self.worker is not None and self.worker.isRunning():
+            self.status_label.setText("Aguarde o fim da avaliação em curso.")
+            event.ignore()
+            return
+        super().closeEvent(event)
\ No newline at end of file
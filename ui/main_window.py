@@ -1,11 +1,16 @@
 # ui/main_window.py
 import logging
-from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QStackedWidget, QLabel, QPushButton, QHBoxLayout, QLineEdit, QTableWidget, QTableWidgetItem
+from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QStackedWidget, QLabel, QPushButton, QHBoxLayout, QLineEdit, QTableWidget, QTableWidgetItem, QCheckBox, QComboBox
 from ui.screens import setup_screen1, setup_screen2
-from ui.data_manager import load_csv, load_test_csv
+from ui.data_manager import load_csv, load_test_csv, is_loading_csv, toggle_hot_folder, show_hot_folder_status, stop_hot_folder
 from ui.column_interface import display_columns
-from ui.model_interface import train_model, save_model, load_model, predict_new_client, show_plots
+from ui.model_interface import train_model, save_model, load_model, predict_new_client, show_plots, select_registered_model
 from ui.utils import clear_layout
+from ui.memory_gauge import MemoryGauge
+from prediction_cache import PredictionCache
+from sketches import SketchCache
+from transform_cache import TransformCache
+from model_registry import ModelRegistry
 
 logger = logging.getLogger(__name__)
 
@@ -19,12 +24,28 @@ class MLApp(QMainWindow):
         self.setGeometry(100, 100, 800, 600)
         
         # Estado global da aplicação
-        self.df = None  # DataFrame carregado
+        self.df = None  # DataFrame carregado (ou amostra, em modo de pré-visualização)
+        self.full_df = None  # Conjunto completo enquanto a pré-visualização está activa
+        self.loaded_df = None  # DataFrame tal como foi lido do CSV, ponto de partida da reaplicação da receita
+        self.preview_recipe_start = 0  # Primeiro passo da receita aplicado à amostra
         self.knn = None  # Modelo KNN treinado
         self.scaler = None  # Normalizador para os dados
         self.selected_columns = []  # Colunas seleccionadas para treino
         self.training_columns = []  # Colunas usadas no treino
         self.valid_values = {}  # Valores válidos das colunas
+        self.transform_recipe = []  # Passos de pré-processamento aplicados, para reaplicação em lote
+        self.model_version = 0  # Incrementada sempre que o modelo é treinado ou carregado
+        self.prediction_cache = PredictionCache()  # Cache LRU de previsões repetidas
+        self.sketch_cache = SketchCache()  # Resumos aproximados por coluna (quantis e moda)
+        # Resultados de transformações já calculados, em memória e em disco, para desfazer/refazer e reaplicar receitas
+        self.transform_cache = TransformCache(memory_budget_mb=256, disk_budget_mb=1024)
+        self.csv_load_worker = None  # Leitura por blocos do CSV em curso, se houver
+        self.hot_folder = None  # Vigilância de uma pasta de CSVs de teste, se activa
+        self.hot_folder_worker = None
+        # Registo de modelos com os mais recentes já em memória, para alternar sem recarregar
+        self.model_registry = ModelRegistry(memory_budget_mb=512, eviction='lru', preload='recent')
+        self.registered_model_name = None  # Nome do modelo activo no registo, se vier de lá
+        self.model_registry.preload_models()
         
         # Configura o widget central com um layout para alternar telas
         self.central_widget = QWidget()
@@ -34,6 +55,10 @@ class MLApp(QMainWindow):
         self.stacked_widget = QStackedWidget()  # Permite alternar entre telas
         self.layout.addWidget(self.stacked_widget)
         
+        # Indicador de memória permanente, comum às três telas
+        self.memory_gauge = MemoryGauge(self)
+        self.layout.addWidget(self.memory_gauge)
+        
         # Inicializa as três telas da aplicação
         self.screen1_widget = QWidget()
         self.screen1_layout = QVBoxLayout(self.screen1_widget)
@@ -69,7 +94,9 @@ class MLApp(QMainWindow):
         Args:
             checked: Estado do evento (não utilizado), padrão False.
         """
-        if self.df is not None and self.selected_columns:
+        if is_loading_csv(self):
+            self.columns_header_label.setText("Aguarde o fim do carregamento do CSV antes de prosseguir.")
+        elif self.df is not None and self.selected_columns:
             self.stacked_widget.setCurrentIndex(1)  # Define a Tela 2 como activa
         else:
             self.result_label.setText("Carregue um CSV e seleccione colunas antes de prosseguir.")
@@ -81,8 +108,27 @@ class MLApp(QMainWindow):
             checked: Estado do evento (não utilizado), padrão False.
         """
         clear_layout(self.screen3_layout)  # Limpa o layout para reconstrução
+        self.hot_folder_btn = self.hot_folder_label = None  # Recriados abaixo se houver modelo
         self.screen3_layout.addWidget(QLabel("Ecrã 3: Prever Novo Cliente"))
         
+        # Selector dos modelos registados; a troca usa a cache de modelos em memória
+        registered = self.model_registry.list_models()
+        if registered:
+            model_layout = QHBoxLayout()
+            model_layout.addWidget(QLabel("Modelo:"))
+            self.model_selector = QComboBox()
+            if self.registered_model_name is None and self.knn is not None:
+                self.model_selector.addItem("(modelo actual, não registado)", None)
+            for metadata in registered:
+                accuracy = f"{metadata['accuracy']:.2f}" if metadata['accuracy'] is not None else "n/d"
+                self.model_selector.addItem(f"{metadata['name']} (k={metadata['n_neighbors']}, "
+                                            f"{len(metadata['columns'])} colunas, acurácia {accuracy})", metadata['name'])
+            current = self.model_selector.findData(self.registered_model_name)
+            self.model_selector.setCurrentIndex(max(current, 0))
+            self.model_selector.activated.connect(self.switch_model)
+            model_layout.addWidget(self.model_selector)
+            self.screen3_layout.addLayout(model_layout)
+        
         if self.knn and self.scaler and self.training_columns:
             # Cria campos de entrada para cada coluna de treino
             self.inputs = {}
@@ -99,10 +145,23 @@ class MLApp(QMainWindow):
             self.predict_result = QLabel("Resultado da previsão aparecerá aqui.")
             self.screen3_layout.addWidget(self.predict_result)
             
+            # Colunas opcionais com os vizinhos de treino que decidiram cada previsão
+            self.include_neighbors_checkbox = QCheckBox("Incluir vizinhos (ids e distâncias) no CSV de previsões")
+            self.screen3_layout.addWidget(self.include_neighbors_checkbox)
+            
             load_test_btn = QPushButton("Carregar CSV de Teste")
             load_test_btn.clicked.connect(lambda: load_test_csv(self))  # Carrega CSV de teste
             self.screen3_layout.addWidget(load_test_btn)
             
+            # Previsão automática dos CSVs que chegam a uma pasta, com o modelo activo ao iniciar
+            self.hot_folder_btn = QPushButton()
+            self.hot_folder_btn.clicked.connect(lambda: toggle_hot_folder(self))
+            self.screen3_layout.addWidget(self.hot_folder_btn)
+            self.hot_folder_label = QLabel("")
+            self.hot_folder_label.setWordWrap(True)
+            self.screen3_layout.addWidget(self.hot_folder_label)
+            show_hot_folder_status(self)
+            
             self.test_result_table = QTableWidget()
             self.test_result_table.setColumnCount(2)
             self.test_result_table.setHorizontalHeaderLabels(["ID", "Previsão"])  # Configura tabela de resultados
@@ -134,10 +193,25 @@ class MLApp(QMainWindow):
         """Carrega um modelo previamente guardado."""
         load_model(self)
 
+    def switch_model(self, index):
+        """Activa o modelo registado escolhido no selector da Tela 3 e reconstrói os campos.
+        
+        Args:
+            index: Posição escolhida no selector de modelos.
+        """
+        name = self.model_selector.itemData(index)
+        if name is not None and name != self.registered_model_name and select_registered_model(self, name):
+            self.show_screen3()  # As colunas de entrada dependem do modelo
+
     def predict_new_client(self):
         """Realiza a previsão para um novo cliente com base nas entradas."""
         predict_new_client(self)
 
     def show_plots(self):
         """Mostra gráficos relacionados com o modelo treinado."""
-        show_plots(self)
\ No newline at end of file
+        show_plots(self)
+
+    def closeEvent(self, event):
+        """Termina a vigilância da pasta, se activa, antes de fechar a aplicação."""
+        stop_hot_folder(self)
+        super().closeEvent(event)
\ No newline at end of file
@@ -0,0 +1,86 @@
+# ui/memory_gauge.py
+import logging
+import weakref
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QProgressBar, QSpinBox
+from memory_tracking import (current_rss, dataframe_footprint, format_bytes, last_record, set_memory_budget,
+                             get_memory_budget)
+
+logger = logging.getLogger(__name__)
+
+class MemoryGauge(QWidget):
+    """Indicador de memória da aplicação: memória residente face ao orçamento e último registo."""
+
+    def __init__(self, app, interval_ms=1000, budget_mb=2048, parent=None):
+        """Cria o indicador e inicia a actualização periódica.
+
+        Args:
+            app: Instância de MLApp (para medir o DataFrame carregado).
+            interval_ms: Intervalo de actualização em milissegundos (padrão: 1000).
+            budget_mb: Orçamento inicial de memória residente em MB (padrão: 2048).
+            parent: Widget pai, opcional.
+        """
+        super().__init__(parent)
+        self.app = app
+        self._frame = None  # Referência fraca ao último DataFrame medido
+        self._frame_bytes = 0
+        self._record = None
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel("Memória:"))
+        self.bar = QProgressBar()
+        self.bar.setFormat("%v / %m MB")
+        layout.addWidget(self.bar)
+        layout.addWidget(QLabel("Orçamento (MB):"))
+        self.budget_input = QSpinBox()
+        self.budget_input.setRange(128, 1048576)
+        self.budget_input.setValue(budget_mb)
+        self.budget_input.valueChanged.connect(self.set_budget)
+        layout.addWidget(self.budget_input)
+        self.details_label = QLabel()
+        layout.addWidget(self.details_label)
+        self.set_budget(budget_mb)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(interval_ms)
+
+    def set_budget(self, budget_mb):
+        """Actualiza o orçamento global de memória usado nos registos de cada operação."""
+        set_memory_budget(budget_mb)
+        self.bar.setMaximum(budget_mb)
+        self.refresh()
+
+    def _dataframe_bytes(self):
+        """Memória profunda do DataFrame da aplicação, recalculada só quando muda."""
+        df = self.app.df
+        record = last_record()
+        if df is None:
+            return 0
+        if self._frame is None or self._frame() is not df or record is not self._record:
+            # Usa o valor do último registo se foi medido sobre este DataFrame; senão mede-o
+            if record is not None and record is not self._record and record.get('df_bytes') is not None:
+                self._frame_bytes = record['df_bytes']
+            else:
+                self._frame_bytes = dataframe_footprint(df)['total_bytes']
+            self._frame = weakref.ref(df)
+            self._record = record
+        return self._frame_bytes
+
+    def refresh(self):
+        """Lê a memória residente e actualiza a barra e o resumo."""
+        rss = current_rss()
+        budget_mb = get_memory_budget() or self.budget_input.value()
+        rss_mb = int(rss / (1024 * 1024)) if rss is not None else 0
+        self.bar.setValue(min(rss_mb, budget_mb))
+        over = rss_mb > budget_mb
+        self.bar.setStyleSheet("QProgressBar::chunk { background-color: #d9534f; }" if over else "")
+
+        text = f"DataFrame {format_bytes(self._dataframe_bytes())}"
+        record = last_record()
+        if record is not None:
+            if record.get('history_bytes') is not None:
+                text += f" | Histórico {format_bytes(record['history_bytes'])} ({record['history_length']} estados)"
+            text += f" | Última operação: {record['operation']} (delta {format_bytes(record['rss_delta'])})"
+        self.details_label.setText(text)
\ No newline at end of file
@@ -1,11 +1,15 @@
 # ui/model_interface.py
-import os
 import logging
 import joblib
-from model import train_and_save_model, predict_new_client as predict_new_client_model
+from model import (train_and_save_model, load_model_bundle, evaluate_projection_tradeoff,
+                   predict_new_client as predict_new_client_model)
+from out_of_core import train_out_of_core
+from evaluation import format_evaluation_report, export_evaluation_report
+from memory_tracking import track_memory
 from ui.visualization import VisualizationWindow
-from PyQt5.QtWidgets import QFileDialog
+from PyQt5.QtWidgets import QFileDialog, QInputDialog
 from ui.column_interface import display_columns
+from ui.data_manager import commit_preview
 
 logger = logging.getLogger(__name__)
 
@@ -15,12 +19,29 @@ def train_model(app):
     Args:
         app: Instância de MLApp contendo df, selected_columns, valid_values e widgets da UI.
     """
+    if app.full_df is not None:
+        # Em pré-visualização, aplica primeiro as transformações ao conjunto completo e treina no fim
+        app.result_label.setText("A aplicar as transformações ao conjunto completo antes do treino...")
+        commit_preview(app, on_done=lambda: train_model(app))
+        return
+    
     try:
         n_neighbors = app.neighbors_input.value()  # Obtém o número de vizinhos definido pelo utilizador
-        app.knn, app.scaler, accuracy, train_size, test_size, app.training_columns = train_and_save_model(
-            app.df, app.selected_columns, app.valid_values, n_neighbors=n_neighbors
-        )
-        app.result_label.setText(f"Dados de Treino: {train_size}, Dados de Teste: {test_size}\nAcurácia: {accuracy:.2f}")
+        projection = app.projection_input.currentData()  # None, 'pca' ou 'random'
+        with track_memory('train_model', n_neighbors=n_neighbors):
+            app.knn, app.scaler, accuracy, train_size, test_size, app.training_columns = train_and_save_model(
+                app.df, app.selected_columns, app.valid_values, n_neighbors=n_neighbors,
+                projection=projection, projection_target=app.projection_target_input.value() if projection else None,
+                metric=app.metric_input.currentData(), engine=app.engine_input.currentData(),
+                deduplicate=app.deduplicate_checkbox.isChecked()
+            )
+        invalidate_predictions(app)  # O novo modelo torna obsoletas as previsões em cache
+        app.registered_model_name = None  # O modelo novo ainda não está no registo
+        summary = f"Dados de Treino: {train_size}, Dados de Teste: {test_size}\nAcurácia: {accuracy:.2f}"
+        if hasattr(app.knn, 'class_counts_'):
+            summary += f"\nPontos distintos no índice: {len(app.knn.class_counts_)} ({train_size} linhas)"
+        app.result_label.setText(summary)
+        show_evaluation(app)
         app.plot_btn.setVisible(True)  # Mostra o botão de gráficos após o treino
     except ValueError as e:
         logger.error(f"Erro ao treinar o modelo: {str(e)}")
@@ -29,6 +50,57 @@ def train_model(app):
         logger.error(f"Erro inesperado ao treinar o modelo: {str(e)}")
         app.result_label.setText(f"Erro ao treinar o modelo: {str(e)}")
 
+def compare_projections(app):
+    """Mostra a acurácia e a latência de previsão do KNN para vários alvos da projecção seleccionada.
+    
+    Args:
+        app: Instância de MLApp contendo df, selected_columns e widgets da UI (projection_input, neighbors_input).
+    """
+    projection = app.projection_input.currentData() or 'pca'
+    try:
+        report = evaluate_projection_tradeoff(app.df, app.selected_columns, n_neighbors=app.neighbors_input.value(),
+                                              projection=projection)
+        lines = [f"Compromisso acurácia/latência ({'PCA' if projection == 'pca' else 'Projecção Aleatória'}):"]
+        for row in report:
+            target = "sem projecção" if row['target'] is None else f"alvo {row['target']}"
+            lines.append(f"- {target}: {row['dimensions']} dimensões, acurácia {row['accuracy']:.3f}, "
+                         f"{row['latency_ms']:.2f} ms por 1000 previsões")
+        app.result_label.setText("\n".join(lines))
+    except ValueError as e:
+        logger.error(f"Erro ao comparar projecções: {str(e)}")
+        app.result_label.setText(str(e))
+
+def train_model_out_of_core(app):
+    """Treina o modelo KNN a partir de um CSV lido por blocos, sem o carregar todo em memória.
+    
+    Args:
+        app: Instância de MLApp contendo selected_columns e widgets da UI (neighbors_input, memory_budget_input).
+    """
+    if len([col for col in app.selected_columns if col not in ['id', 'result']]) == 0:
+        app.result_label.setText("Seleccione as colunas de treino na Tela 1 antes de treinar fora da memória.")
+        return
+    
+    file_name, _ = QFileDialog.getOpenFileName(app, "Abrir CSV de Treino", "", "CSV Files (*.csv)")
+    if not file_name:
+        return  # Sai se nenhum ficheiro for seleccionado
+    
+    try:
+        n_neighbors = app.neighbors_input.value()
+        memory_budget_mb = app.memory_budget_input.value()  # Orçamento de memória definido pelo utilizador
+        app.knn, app.scaler, accuracy, train_size, test_size, app.training_columns = train_out_of_core(
+            file_name, app.selected_columns, n_neighbors=n_neighbors, memory_budget_mb=memory_budget_mb
+        )
+        invalidate_predictions(app)
+        app.registered_model_name = None
+        show_evaluation(app)
+        app.result_label.setText(f"Treino fora da memória concluído.\nDados de Treino: {train_size}, Dados de Teste: {test_size}\nAcurácia: {accuracy:.2f}")
+    except ValueError as e:
+        logger.error(f"Erro ao treinar o modelo fora da memória: {str(e)}")
+        app.result_label.setText(str(e))
+    except Exception as e:
+        logger.error(f"Erro inesperado ao treinar o modelo fora da memória: {str(e)}")
+        app.result_label.setText(f"Erro ao treinar o modelo: {str(e)}")
+
 def save_model(app):
     """Guarda o modelo treinado, normalizador e dados relacionados em ficheiros .pkl.
     
@@ -36,11 +108,12 @@ def save_model(app):
         app: Instância de MLApp com knn, scaler, training_columns, df e valid_values.
     """
     if app.knn and app.scaler and app.training_columns and app.df is not None and app.valid_values:
-        joblib.dump(app.knn, 'knn_model.pkl')  # Guarda o modelo KNN
-        joblib.dump(app.scaler, 'scaler.pkl')  # Guarda o normalizador
-        joblib.dump(app.training_columns, 'training_columns.pkl')  # Guarda as colunas de treino
-        joblib.dump(app.df, 'dataframe.pkl')  # Guarda o DataFrame
-        joblib.dump(app.valid_values, 'valid_values.pkl')  # Guarda os valores válidos
+        with track_memory('save_model'):  # O DataFrame é serializado com o modelo
+            joblib.dump(app.knn, 'knn_model.pkl')  # Guarda o modelo KNN
+            joblib.dump(app.scaler, 'scaler.pkl')  # Guarda o normalizador
+            joblib.dump(app.training_columns, 'training_columns.pkl')  # Guarda as colunas de treino
+            joblib.dump(app.df, 'dataframe.pkl')  # Guarda o DataFrame
+            joblib.dump(app.valid_values, 'valid_values.pkl')  # Guarda os valores válidos
         app.result_label.setText("Modelo, normalizador, colunas de treino, DataFrame e valores válidos guardados com sucesso!")
     else:
         app.result_label.setText("Treine o modelo antes de guardar.")
@@ -56,28 +129,68 @@ def load_model(app):
         return  # Sai se nenhum ficheiro for seleccionado
     
     try:
-        app.knn = joblib.load(file_name)  # Carrega o modelo KNN
-        scaler_file = file_name.replace('knn_model.pkl', 'scaler.pkl')
-        columns_file = file_name.replace('knn_model.pkl', 'training_columns.pkl')
-        dataframe_file = file_name.replace('knn_model.pkl', 'dataframe.pkl')
-        valid_values_file = file_name.replace('knn_model.pkl', 'valid_values.pkl')
-        
-        # Verifica e carrega cada ficheiro relacionado
-        for file_path, attr_name in [
-            (scaler_file, 'scaler'), (columns_file, 'training_columns'),
-            (dataframe_file, 'df'), (valid_values_file, 'valid_values')
-        ]:
-            if os.path.exists(file_path):
-                setattr(app, attr_name, joblib.load(file_path))
-            else:
-                raise ValueError(f"Ficheiro {os.path.basename(file_path)} não encontrado.")
+        bundle = load_model_bundle(file_name, include_dataframe=True)  # Verifica e carrega cada ficheiro relacionado
+        app.knn, app.scaler, app.training_columns = bundle['knn'], bundle['scaler'], bundle['training_columns']
+        app.df, app.valid_values = bundle['df'], bundle['valid_values']
+        app.full_df = None  # O DataFrame do modelo substitui qualquer pré-visualização
+        app.loaded_df = None  # O DataFrame do modelo já vem transformado: não há origem para reaplicar a receita
         
+        invalidate_predictions(app)  # O modelo carregado torna obsoletas as previsões em cache
+        app.registered_model_name = None
         app.result_label.setText("Modelo, normalizador, colunas de treino, DataFrame e valores válidos carregados com sucesso!")
+        show_evaluation(app)
         display_columns(app)  # Actualiza a exibição das colunas
     except Exception as e:
         logger.error(f"Erro ao carregar o modelo: {str(e)}")
         app.result_label.setText(f"Erro ao carregar o modelo: {str(e)}")
 
+def register_model(app):
+    """Guarda o modelo actual no registo de modelos, com um nome pedido ao utilizador.
+    
+    Args:
+        app: Instância de MLApp com knn, scaler, training_columns, valid_values e model_registry.
+    """
+    if not (app.knn and app.scaler and app.training_columns):
+        app.result_label.setText("Treine o modelo antes de o registar.")
+        return
+    default_name = f"knn_k{app.knn.n_neighbors}_{len(app.training_columns)}col"
+    name, ok = QInputDialog.getText(app, "Registar Modelo", "Nome do modelo:", text=default_name)
+    if not ok or not name:
+        return
+    try:
+        with track_memory('register_model'):
+            metadata = app.model_registry.register(name, app.knn, app.scaler, app.training_columns, app.valid_values)
+        app.registered_model_name = name
+        accuracy = f"{metadata['accuracy']:.2f}" if metadata['accuracy'] is not None else "n/d"
+        app.result_label.setText(f"Modelo '{name}' registado ({len(metadata['columns'])} colunas, k={metadata['n_neighbors']}, "
+                                 f"acurácia {accuracy}).")
+    except (ValueError, OSError) as e:
+        logger.error(f"Erro ao registar o modelo: {str(e)}")
+        app.result_label.setText(f"Erro ao registar o modelo: {str(e)}")
+
+def select_registered_model(app, name):
+    """Torna activo um modelo do registo (da cache em memória, se já estiver carregado).
+    
+    Args:
+        app: Instância de MLApp com model_registry.
+        name: Nome do modelo registado.
+    
+    Returns:
+        bool: True se o modelo foi activado.
+    """
+    try:
+        bundle = app.model_registry.get(name)
+    except Exception as e:
+        logger.error(f"Erro ao carregar o modelo '{name}' do registo: {str(e)}")
+        app.predict_result.setText(f"Erro ao carregar o modelo '{name}': {str(e)}")
+        return False
+    app.knn, app.scaler, app.training_columns = bundle['knn'], bundle['scaler'], bundle['training_columns']
+    app.valid_values = bundle['valid_values']
+    app.registered_model_name = name
+    invalidate_predictions(app)  # As previsões em cache pertencem ao modelo anterior
+    logger.debug(f"Modelo activo: '{name}' ({app.model_registry.stats()})")
+    return True
+
 def predict_new_client(app):
     """Realiza a previsão para um novo cliente usando entradas da Tela 3.
     
@@ -95,8 +208,56 @@ def predict_new_client(app):
             app.predict_result.setText(f"Insira um valor numérico válido para '{col}'.")
             return
     
-    prediction, probability = predict_new_client_model([new_data], app.knn, app.scaler, app.training_columns)
-    app.predict_result.setText(f"Previsão: {prediction[0]} (0 = Não, 1 = Sim)\nProbabilidades: Não = {probability[0][0]:.2f}, Sim = {probability[0][1]:.2f}")
+    prediction, probability, neighbors = predict_new_client_model([new_data], app.knn, app.scaler, app.training_columns,
+                                                                  cache=app.prediction_cache, model_version=app.model_version,
+                                                                  return_neighbors=True)
+    stats = app.prediction_cache.stats()
+    neighbor_text = ", ".join(f"{neighbor_id} ({distance:.3f})"
+                              for neighbor_id, distance in zip(neighbors['ids'][0], neighbors['distances'][0]))
+    app.predict_result.setText(f"Previsão: {prediction[0]} (0 = Não, 1 = Sim)\nProbabilidades: Não = {probability[0][0]:.2f}, Sim = {probability[0][1]:.2f}\n"
+                               f"Vizinhos (id e distância): {neighbor_text}\n"
+                               f"Cache: {stats['hits']} acertos, {stats['misses']} falhas")
+
+def invalidate_predictions(app):
+    """Incrementa a versão do modelo e esvazia a cache de previsões.
+    
+    Args:
+        app: Instância de MLApp com model_version e prediction_cache.
+    """
+    app.model_version += 1
+    app.prediction_cache.clear()
+
+def show_evaluation(app):
+    """Mostra na Tela 2 o relatório de avaliação do modelo actual, se existir.
+    
+    Args:
+        app: Instância de MLApp com knn e os widgets evaluation_text e export_evaluation_btn.
+    """
+    report = getattr(app.knn, 'evaluation_report_', None)  # Modelos fora da memória ou antigos não têm relatório
+    app.evaluation_text.setVisible(report is not None)
+    app.export_evaluation_btn.setVisible(report is not None)
+    if report is not None:
+        app.evaluation_text.setText(format_evaluation_report(report))
+
+def export_evaluation(app):
+    """Exporta o relatório de avaliação do modelo actual para um ficheiro JSON.
+    
+    Args:
+        app: Instância de MLApp com knn treinado.
+    """
+    report = getattr(app.knn, 'evaluation_report_', None)
+    if report is None:
+        app.result_label.setText("Treine o modelo antes de exportar a avaliação.")
+        return
+    file_name, _ = QFileDialog.getSaveFileName(app, "Exportar Avaliação", "evaluation_report.json", "JSON Files (*.json)")
+    if not file_name:
+        return
+    try:
+        export_evaluation_report(report, file_name)
+        app.result_label.setText(f"Avaliação exportada para {file_name}")
+    except OSError as e:
+        logger.error(f"Erro ao exportar a avaliação: {str(e)}")
+        app.result_label.setText(f"Erro ao exportar a avaliação: {str(e)}")
 
 def show_plots(app):
     """Abre a janela de visualização de gráficos do modelo treinado.
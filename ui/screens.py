@@ -1,8 +1,11 @@
 # ui/screens.py
 import logging
-from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QHBoxLayout, QVBoxLayout, QSpinBox
-from ui.data_manager import load_csv
-from ui.model_interface import train_model, save_model, load_model
+from PyQt5.QtWidgets import (QWidget, QLabel, QPushButton, QHBoxLayout, QVBoxLayout, QSpinBox, QCheckBox, QComboBox,
+                             QDoubleSpinBox, QTextEdit, QProgressBar, QTableWidget)
+from ui.data_manager import load_csv, cancel_csv_load, toggle_preview_mode, commit_preview
+from ui.column_interface import apply_transform_recipe, clear_transform_recipe, open_feature_selection
+from ui.model_interface import (train_model, train_model_out_of_core, save_model, load_model, compare_projections,
+                                export_evaluation, register_model)
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +26,40 @@ def setup_screen1(app):
     app.load_btn.clicked.connect(lambda: load_csv(app))  # Associa o carregamento do CSV
     app.screen1_layout.addWidget(app.load_btn)
     
+    # Progresso do carregamento por blocos, visível apenas enquanto o ficheiro é lido
+    load_layout = QHBoxLayout()
+    app.load_progress = QProgressBar()
+    app.load_progress.setRange(0, 100)
+    app.load_progress.setVisible(False)
+    load_layout.addWidget(app.load_progress)
+    app.cancel_load_btn = QPushButton("Cancelar Carregamento")
+    app.cancel_load_btn.clicked.connect(lambda: cancel_csv_load(app))
+    app.cancel_load_btn.setVisible(False)
+    load_layout.addWidget(app.cancel_load_btn)
+    app.screen1_layout.addLayout(load_layout)
+    app.load_stats_label = QLabel()
+    app.load_stats_label.setVisible(False)
+    app.screen1_layout.addWidget(app.load_stats_label)
+    app.csv_preview_table = QTableWidget()  # Primeiras linhas do ficheiro durante o carregamento
+    app.csv_preview_table.setVisible(False)
+    app.screen1_layout.addWidget(app.csv_preview_table)
+    
+    # Modo de pré-visualização: a interface trabalha numa amostra estratificada por 'result'
+    preview_layout = QHBoxLayout()
+    app.preview_checkbox = QCheckBox("Modo de Pré-visualização (amostra)")
+    app.preview_checkbox.stateChanged.connect(lambda state: toggle_preview_mode(app, state))
+    preview_layout.addWidget(app.preview_checkbox)
+    preview_layout.addWidget(QLabel("Tamanho da Amostra:"))
+    app.preview_size_input = QSpinBox()
+    app.preview_size_input.setRange(100, 1000000)
+    app.preview_size_input.setValue(5000)
+    preview_layout.addWidget(app.preview_size_input)
+    commit_preview_btn = QPushButton("Aplicar ao Conjunto Completo")
+    commit_preview_btn.clicked.connect(lambda: commit_preview(app))
+    preview_layout.addWidget(commit_preview_btn)
+    preview_layout.addStretch()
+    app.screen1_layout.addLayout(preview_layout)
+    
     # Cabeçalho das colunas, visível apenas após carregamento do CSV
     app.columns_header_label = QLabel("Colunas do CSV")
     app.columns_header_label.setVisible(False)
@@ -33,6 +70,20 @@ def setup_screen1(app):
     app.columns_layout = QVBoxLayout(app.columns_widget)
     app.screen1_layout.addWidget(app.columns_widget)
     
+    # Reaplicação em lote dos passos de pré-processamento registados
+    recipe_layout = QHBoxLayout()
+    apply_recipe_btn = QPushButton("Reaplicar Receita em Lote")
+    apply_recipe_btn.clicked.connect(lambda: apply_transform_recipe(app))
+    recipe_layout.addWidget(apply_recipe_btn)
+    clear_recipe_btn = QPushButton("Limpar Receita")
+    clear_recipe_btn.clicked.connect(lambda: clear_transform_recipe(app))
+    recipe_layout.addWidget(clear_recipe_btn)
+    feature_selection_btn = QPushButton("Selecção Automática de Colunas")
+    feature_selection_btn.clicked.connect(lambda: open_feature_selection(app))  # Avalia conjuntos para a frente/para trás
+    recipe_layout.addWidget(feature_selection_btn)
+    recipe_layout.addStretch()
+    app.screen1_layout.addLayout(recipe_layout)
+    
     # Navegação para avançar para a Tela 2
     app.nav_layout_screen1 = QHBoxLayout()
     app.next_btn = QPushButton("Próximo")
@@ -61,11 +112,64 @@ def setup_screen2(app):
     neighbors_layout.addWidget(app.neighbors_input)
     app.screen2_layout.addLayout(neighbors_layout)
     
+    # Redução de dimensionalidade opcional entre o StandardScaler e o KNN
+    projection_layout = QHBoxLayout()
+    projection_layout.addWidget(QLabel("Projecção:"))
+    app.projection_input = QComboBox()
+    app.projection_input.addItem("Nenhuma", None)
+    app.projection_input.addItem("PCA", 'pca')
+    app.projection_input.addItem("Projecção Aleatória", 'random')
+    projection_layout.addWidget(app.projection_input)
+    projection_layout.addWidget(QLabel("Alvo (variância < 1 ou dimensões):"))
+    app.projection_target_input = QDoubleSpinBox()
+    app.projection_target_input.setRange(0.01, 10000)
+    app.projection_target_input.setValue(0.95)
+    projection_layout.addWidget(app.projection_target_input)
+    compare_btn = QPushButton("Comparar Dimensões")
+    compare_btn.clicked.connect(lambda: compare_projections(app))
+    projection_layout.addWidget(compare_btn)
+    app.screen2_layout.addLayout(projection_layout)
+    
+    # Distância do KNN; Jaccard e Hamming destinam-se a colunas indicadoras 0/1 (multi-etiqueta)
+    metric_layout = QHBoxLayout()
+    metric_layout.addWidget(QLabel("Distância:"))
+    app.metric_input = QComboBox()
+    app.metric_input.addItem("Euclidiana", 'minkowski')
+    app.metric_input.addItem("Jaccard (colunas 0/1)", 'jaccard')
+    app.metric_input.addItem("Hamming (colunas 0/1)", 'hamming')
+    metric_layout.addWidget(app.metric_input)
+    app.screen2_layout.addLayout(metric_layout)
+    
+    # Motor de pesquisa de vizinhos; o motor em blocos compensa em dados densos de muitas dimensões
+    engine_layout = QHBoxLayout()
+    engine_layout.addWidget(QLabel("Motor de Pesquisa:"))
+    app.engine_input = QComboBox()
+    app.engine_input.addItem("Padrão (scikit-learn)", 'sklearn')
+    app.engine_input.addItem("Força Bruta em Blocos", 'blocked')
+    engine_layout.addWidget(app.engine_input)
+    app.screen2_layout.addLayout(engine_layout)
+    
+    # Linhas de treino iguais passam a um único ponto com contagens por classe (aproximado nos empates)
+    app.deduplicate_checkbox = QCheckBox("Agrupar Linhas Repetidas (aproximado: empates no k-ésimo vizinho votam em proporção)")
+    app.screen2_layout.addWidget(app.deduplicate_checkbox)
+    
     # Botões para acções relacionadas com o modelo
     train_btn = QPushButton("Treinar Modelo")
     train_btn.clicked.connect(lambda: train_model(app))  # Inicia o treino
     app.screen2_layout.addWidget(train_btn)
     
+    # Treino por blocos a partir de um CSV maior do que a memória disponível
+    ooc_layout = QHBoxLayout()
+    ooc_layout.addWidget(QLabel("Orçamento de Memória (MB):"))
+    app.memory_budget_input = QSpinBox()
+    app.memory_budget_input.setRange(64, 65536)
+    app.memory_budget_input.setValue(512)
+    ooc_layout.addWidget(app.memory_budget_input)
+    ooc_train_btn = QPushButton("Treinar Fora da Memória (CSV)")
+    ooc_train_btn.clicked.connect(lambda: train_model_out_of_core(app))
+    ooc_layout.addWidget(ooc_train_btn)
+    app.screen2_layout.addLayout(ooc_layout)
+    
     save_btn = QPushButton("Guardar Modelo")
     save_btn.clicked.connect(lambda: save_model(app))  # Guarda o modelo treinado
     app.screen2_layout.addWidget(save_btn)
@@ -74,6 +178,10 @@ def setup_screen2(app):
     load_model_btn.clicked.connect(lambda: load_model(app))  # Carrega um modelo existente
     app.screen2_layout.addWidget(load_model_btn)
     
+    register_btn = QPushButton("Registar Modelo")
+    register_btn.clicked.connect(lambda: register_model(app))  # Guarda no registo para alternar na Tela 3
+    app.screen2_layout.addWidget(register_btn)
+    
     # Botão para gráficos, mostrado apenas após o treino
     app.plot_btn = QPushButton("Gerar Gráficos")
     app.plot_btn.clicked.connect(app.show_plots)
@@ -83,6 +191,16 @@ def setup_screen2(app):
     app.result_label = QLabel("Resultados aparecerão aqui após o treino.")
     app.screen2_layout.addWidget(app.result_label)
     
+    # Relatório de avaliação (matriz de confusão, ROC-AUC, calibração, acurácia por k)
+    app.evaluation_text = QTextEdit()
+    app.evaluation_text.setReadOnly(True)
+    app.evaluation_text.setVisible(False)
+    app.screen2_layout.addWidget(app.evaluation_text)
+    app.export_evaluation_btn = QPushButton("Exportar Avaliação")
+    app.export_evaluation_btn.clicked.connect(lambda: export_evaluation(app))
+    app.export_evaluation_btn.setVisible(False)
+    app.screen2_layout.addWidget(app.export_evaluation_btn)
+    
     # Navegação entre telas
     nav_layout = QHBoxLayout()
     prev_btn = QPushButton("Anterior")
@@ -0,0 +1,74 @@
+# ui/workers.py
+import logging
+from PyQt5.QtCore import QThread, pyqtSignal
+from csv_loader import ProgressiveCsvReader
+
+logger = logging.getLogger(__name__)
+
+class FunctionWorker(QThread):
+    """Executa uma função numa thread em segundo plano e emite o resultado."""
+    
+    result_ready = pyqtSignal(object)  # Emitido com o valor devolvido pela função
+    failed = pyqtSignal(str)  # Emitido com a mensagem de erro
+    
+    def __init__(self, function, *args, **kwargs):
+        """Inicializa o worker com a função e os seus argumentos.
+        
+        Args:
+            function: Função a executar em segundo plano.
+            *args: Argumentos posicionais da função.
+            **kwargs: Argumentos nomeados da função.
+        """
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+    
+    def run(self):
+        """Executa a função e emite result_ready ou failed."""
+        try:
+            self.result_ready.emit(self.function(*self.args, **self.kwargs))
+        except Exception as e:
+            logger.error(f"Erro na tarefa em segundo plano: {str(e)}")
+            self.failed.emit(str(e))
+
+class CsvLoadWorker(QThread):
+    """Lê um CSV por blocos em segundo plano, emitindo o primeiro bloco, o progresso e o resultado."""
+    
+    first_chunk = pyqtSignal(object)  # Emitido com o primeiro bloco, para pré-visualização imediata
+    progress = pyqtSignal(float, int, object)  # Fracção lida, linhas lidas e resumo das colunas
+    loaded = pyqtSignal(object, object)  # Emitido com o DataFrame completo e os resumos por coluna
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+    
+    def __init__(self, file_name, **reader_options):
+        """Inicializa o worker.
+        
+        Args:
+            file_name: Caminho do ficheiro CSV.
+            **reader_options: Opções de ProgressiveCsvReader (ex.: chunksize).
+        """
+        super().__init__()
+        self.file_name = file_name
+        self.reader_options = reader_options
+    
+    def run(self):
+        """Lê o ficheiro; pára entre blocos se for pedida a interrupção (requestInterruption)."""
+        reader = ProgressiveCsvReader(self.file_name, **self.reader_options)
+        try:
+            for i, chunk in enumerate(reader):
+                if self.isInterruptionRequested():
+                    break
+                if i == 0:
+                    self.first_chunk.emit(chunk)
+                self.progress.emit(reader.progress(), reader.rows, reader.summary())
+            if self.isInterruptionRequested():
+                reader.close()  # Liberta já os blocos lidos; nada é emitido com eles
+                self.cancelled.emit()
+                return
+            self.loaded.emit(reader.result(), reader.sketches)
+        except Exception as e:
+            logger.error(f"Erro ao carregar o CSV em segundo plano: {str(e)}")
+            self.failed.emit(str(e))
+        finally:
+            reader.close()
\ No newline at end of file